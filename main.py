@@ -296,9 +296,9 @@
 
 
 import os
+import sys
+
 import django
-import pandas as pd
-import re
 
 # ==============================
 # DJANGO SETUP
@@ -307,82 +307,10 @@ import re
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "s_r_a_a_b.settings")
 django.setup()
 
-from survey_app.models import State, District, SubDistrict, Town
-
-# ==============================
-# FILE PATH
-# ==============================
-
-file_path = r"C:\Users\Dell Pc\Downloads\survey (1)\survey\s_r_a_a_b\Priority 1_CORS Densification (5).xlsx"
-
-# ==============================
-# READ EXCEL
-# ==============================
-
-df = pd.read_excel(file_path)
-df.columns = df.columns.str.strip()
-df = df.where(pd.notnull(df), None)
-
-print("Columns detected:", df.columns.tolist())
-
-# ==============================
-# IMPORT DATA
-# ==============================
-
-for _, row in df.iterrows():
-
-    state_name = str(row["STATE_UT"]).strip()
-    district_name = str(row["DISTRICT"]).strip()
-    subdistrict_name = str(row["SUBDISTRICT"]).strip()
-    town_name = str(row["TOWN"]).strip()
-
-    town_lat = row["Lat"]
-    town_lon = row["Long"]
-
-    # 1️⃣ STATE (No numbering)
-    state_obj, _ = State.objects.get_or_create(name=state_name)
-
-    # 2️⃣ DISTRICT (No numbering)
-    district_obj, _ = District.objects.get_or_create(
-        state=state_obj,
-        name=district_name
-    )
-
-    # 3️⃣ SUBDISTRICT
-    subdistrict_obj, _ = SubDistrict.objects.get_or_create(
-        district=district_obj,
-        name=subdistrict_name
-    )
-
-    # 4️⃣ TOWN NUMBERING (GENERIC FOR ANY RANDOM NAME)
-
-    base_name = town_name
-
-    # Find all towns with same base name in same subdistrict
-    existing_names = Town.objects.filter(
-        subdistrict=subdistrict_obj,
-        name__startswith=base_name
-    ).values_list("name", flat=True)
-
-    numbers = []
-
-    for name in existing_names:
-        match = re.match(rf"^{re.escape(base_name)}(?: (\d+))?$", name)
-        if match:
-            num = match.group(1)
-            numbers.append(int(num) if num else 0)
-
-    if numbers:
-        next_number = max(numbers) + 1
-        final_name = f"{base_name} {next_number}"
-    else:
-        final_name = base_name
+from django.core.management import call_command
 
-    Town.objects.create(
-        subdistrict=subdistrict_obj,
-        name=final_name,
-        latitude=town_lat,
-        longitude=town_lon
-    )
+# The row-by-row import above was replaced by a bulk management command:
+#     python manage.py import_geography [path/to/workbook.xlsx]
 
-print("✅ Import completed with automatic town duplicate numbering")
\ No newline at end of file
+if __name__ == "__main__":
+    call_command("import_geography", *sys.argv[1:])
@@ -97,6 +97,18 @@ DATABASES = {
 AUTH_USER_MODEL = 'survey_app.User'
 
 
+# Cache
+# Shared by all workers on the host (versioned geography snapshot etc.).
+# Point this at Redis/Memcached when running on more than one host.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / ".django_cache",
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -142,6 +154,12 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# hash multipart uploads while they stream in (survey_app/storage.py)
+FILE_UPLOAD_HANDLERS = [
+    'survey_app.storage.HashingMemoryFileUploadHandler',
+    'survey_app.storage.HashingTemporaryFileUploadHandler',
+]
+
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -152,6 +170,41 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Keyset pagination for survey list APIs (?page_size=)
+SURVEY_PAGE_SIZE = 50
+SURVEY_MAX_PAGE_SIZE = 200
+
+# Delta feed (/api/survey/changes/) re-reads this many seconds before the
+# client's sync token to catch transactions that committed late; a row
+# committed later than this after its updated_at is missed (see sync.py)
+SYNC_OVERLAP_SECONDS = 30
+# rows per delta feed page; the client follows sync_token while has_more
+SYNC_PAGE_SIZE = 500
+
+# Admin statistics (/api/admin/statistics/) are recomputed after writes;
+# this caps how stale they get when a write bypasses the invalidation
+STATS_CACHE_SECONDS = 5 * 60
+
+# Bulk reviewer decisions (/api/<level>/subsites/decisions/)
+BULK_DECISION_MAX_ITEMS = 500
+
+# Chunked RINEX uploads (/api/rinex/uploads/)
+RINEX_MAX_UPLOAD_BYTES = 2 * 1024 ** 3
+RINEX_MAX_CHUNK_BYTES = 64 * 1024 ** 2
+# how long a chunk write may hold the upload before another request can take over
+RINEX_CHUNK_LEASE_SECONDS = 15 * 60
+
+# Background tasks (survey_app/tasks.py, python manage.py run_tasks).
+# TASKS_EAGER runs them in-process after commit instead of in a worker.
+TASKS_EAGER = False
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_BASE_SECONDS = 30
+TASK_RETRY_MAX_SECONDS = 60 * 60
+# RUNNING longer than this: the worker is assumed dead, task re-queued
+TASK_LOCK_TIMEOUT_SECONDS = 15 * 60
+# run_tasks --purge removes succeeded tasks older than this
+TASK_KEEP_DAYS = 14
+
 
 # EMAIL CONFIGURATION (GMAIL)
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
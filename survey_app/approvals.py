@@ -0,0 +1,69 @@
+from django.utils import timezone
+
+from .models import Survey, SurveyApproval, SurveySubSite
+
+
+# ------------------------------------------------
+# DENORMALIZED APPROVAL SUMMARY
+# ------------------------------------------------
+
+def summary_entry(approval):
+
+    user = approval.approved_by
+
+    return {
+        "decision": approval.decision,
+        "approver_id": str(user.id),
+        "approver_username": user.username,
+        "approver_name": user.name,
+        "at": approval.approved_at.isoformat(),
+    }
+
+
+# Saves unsaved SurveyApproval objects and merges them into the summary on
+# their survey (and subsite): one INSERT, then one locked read and one bulk
+# UPDATE of the summaries per model. Call it inside the decision's
+# transaction (workflow.py does).
+def record_approvals(approvals):
+
+    if not approvals:
+        return approvals
+
+    SurveyApproval.objects.bulk_create(approvals, batch_size=500)
+
+    survey_entries, subsite_entries = {}, {}
+
+    # in list order, so the last decision per level wins
+    for approval in approvals:
+
+        level = str(approval.approval_level)
+        entry = summary_entry(approval)
+
+        survey_entries.setdefault(approval.survey_id, {})[level] = entry
+
+        if approval.subsite_id:
+            subsite_entries.setdefault(approval.subsite_id, {})[level] = entry
+
+    now = timezone.now()
+
+    for model, entries in ((Survey, survey_entries), (SurveySubSite, subsite_entries)):
+
+        if not entries:
+            continue
+
+        current = dict(
+            model.objects.select_for_update().filter(
+                id__in=list(entries)
+            ).values_list("id", "approval_summary")
+        )
+
+        model.objects.bulk_update(
+            [
+                model(id=obj_id, approval_summary={**(current.get(obj_id) or {}), **entry}, updated_at=now)
+                for obj_id, entry in entries.items()
+            ],
+            ["approval_summary", "updated_at"],
+            batch_size=500
+        )
+
+    return approvals
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SurveyAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "survey_app"
+
+    def ready(self):
+        from . import signals  # noqa: F401
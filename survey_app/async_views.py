@@ -0,0 +1,233 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse, JsonResponse
+from rest_framework import serializers
+from rest_framework.authtoken.models import Token
+
+from .cache import etag_matches
+from .exports import amap_rows, astream_map_data, map_locations
+from .geography import (
+    districts_lookup,
+    get_snapshot,
+    states_lookup,
+    subdistricts_lookup,
+    towns_lookup,
+    tree_lookup,
+)
+from .images import wants_originals
+from .listings import (
+    SUBSITE_LISTS,
+    hierarchy_fields,
+    hierarchy_queryset,
+    hierarchy_surveys,
+    subsite_list_surveys,
+    wants_subsites,
+)
+from .pagination import KeysetPaginator
+from .serializers import FullHierarchySurveySerializer
+from .spatial import nearest_stations_for
+
+
+# ------------------------------------------------
+# ASYNC READ ENDPOINTS (ASGI)
+# ------------------------------------------------
+# Async twins of the dashboard reads under /api/async/..., same query
+# parameters and response bodies as the APIViews in views.py. Served by
+# an ASGI server (uvicorn / daphne on s_r_a_a_b.asgi) a waiting query does
+# not hold a worker thread, so many dashboards polling at once share one
+# process. Under WSGI they still work, one request per thread.
+#
+# DRF views are sync only, so these are plain Django async views: token
+# auth (and session auth for the map) is done here with the async ORM;
+# querysets come from listings.py / exports.py and are evaluated with
+# async iteration. Serializers only read prefetched rows and run in the
+# event loop; the few sync helpers that may hit the database on a cold
+# cache (geography snapshot, station index) go through sync_to_async.
+
+async def _authenticate(request, session=False):
+
+    keyword, _, key = request.headers.get("Authorization", "").partition(" ")
+
+    if keyword == "Token" and key.strip():
+        token = await Token.objects.select_related("user").filter(key=key.strip()).afirst()
+        return token.user if token and token.user.is_active else None
+
+    if session:
+        user = await request.auser()
+        return user if user.is_authenticated else None
+
+    return None
+
+
+def async_api(session=False):
+
+    def decorator(view):
+
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+
+            if request.method not in ("GET", "HEAD"):
+                return JsonResponse(
+                    {"detail": f'Method "{request.method}" not allowed.'},
+                    status=405
+                )
+
+            user = await _authenticate(request, session)
+
+            if user is None:
+                return JsonResponse(
+                    {"detail": "Authentication credentials were not provided."},
+                    status=401
+                )
+
+            request.user = user
+
+            try:
+                return await view(request, *args, **kwargs)
+            except serializers.ValidationError as e:
+                return JsonResponse(e.detail, status=400, safe=False)
+            except Http404:
+                return JsonResponse({"detail": "Not found."}, status=404)
+
+        return wrapper
+
+    return decorator
+
+
+# -------------------------
+# HIERARCHY / ROLE LISTS
+# -------------------------
+
+@async_api()
+async def hierarchy_sites(request):
+
+    surveys = hierarchy_surveys(request.user)
+
+    if surveys is None:
+        return JsonResponse({"error": "You are not allowed"}, status=403)
+
+    fields, invalid = hierarchy_fields(request.GET.get("fields"))
+
+    if invalid:
+        return JsonResponse(
+            {"error": f"Invalid field(s): {invalid}. Allowed: {FullHierarchySurveySerializer.Meta.fields}"},
+            status=400
+        )
+
+    paginator = KeysetPaginator(request)
+    page = await paginator.apaginate(hierarchy_queryset(surveys, fields))
+
+    context = {"request": request}
+
+    if wants_subsites(fields):
+        context["nearest_stations"] = await sync_to_async(nearest_stations_for)(
+            [subsite for survey in page for subsite in survey.subsites.all()]
+        )
+
+    serializer = FullHierarchySurveySerializer(
+        page,
+        many=True,
+        fields=fields,
+        context=context
+    )
+
+    # a bare list unless the client asked for pages
+    return JsonResponse(paginator.get_response_data(serializer.data), safe=False)
+
+
+def _subsite_list(role):
+
+    _, serializer_class = SUBSITE_LISTS[role]
+
+    @async_api()
+    async def view(request):
+
+        if request.user.role != role:
+            return JsonResponse({"error": "Unauthorized"}, status=403)
+
+        surveys = [survey async for survey in subsite_list_surveys(role)]
+
+        serializer = serializer_class(
+            surveys,
+            many=True,
+            context={"originals": wants_originals(request)}
+        )
+
+        return JsonResponse(serializer.data, safe=False)
+
+    return view
+
+
+director_subsites = _subsite_list("DIRECTOR")
+zonal_subsites = _subsite_list("ZONAL_CHIEF")
+gnrb_subsites = _subsite_list("GNRB")
+
+
+# -------------------------
+# MAP DATA
+# -------------------------
+
+@async_api(session=True)
+async def map_data(request):
+
+    locations = map_locations(request.GET)
+
+    export = request.GET.get("export")
+
+    if export in ["geojson", "csv"]:
+        return astream_map_data(locations, export)
+
+    if export:
+        return JsonResponse({"error": "export must be geojson or csv"}, status=400)
+
+    return JsonResponse([row async for row in amap_rows(locations)], safe=False)
+
+
+# -------------------------
+# GEOGRAPHY LOOKUPS
+# -------------------------
+
+async def _geography_response(request, resource, build):
+
+    version, snapshot = await sync_to_async(get_snapshot)()
+    etag = f'"geo-{version}-{resource}"'
+
+    if etag_matches(request, etag):
+        response = HttpResponse(status=304)
+    else:
+        response = JsonResponse(build(snapshot), safe=False)
+
+    response["ETag"] = etag
+    response["Cache-Control"] = "no-cache"
+
+    return response
+
+
+@async_api()
+async def states(request, state_id=None):
+    return await _geography_response(request, *states_lookup(state_id))
+
+
+@async_api()
+async def districts(request, state_id):
+    return await _geography_response(request, *districts_lookup(state_id))
+
+
+@async_api()
+async def subdistricts(request, district_id):
+    return await _geography_response(request, *subdistricts_lookup(district_id))
+
+
+@async_api()
+async def towns(request, subdistrict_id):
+    return await _geography_response(request, *towns_lookup(subdistrict_id))
+
+
+@async_api()
+async def location_tree(request):
+
+    return await _geography_response(request, *tree_lookup(
+        state_id=request.GET.get("state_id"),
+        district_id=request.GET.get("district_id")
+    ))
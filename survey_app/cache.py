@@ -0,0 +1,57 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+# ------------------------------------------------
+# VERSION COUNTERS
+# ------------------------------------------------
+# Cached data is keyed by a per-namespace version number. Writes bump the
+# version (see signals.py), which makes every older cache entry unreachable
+# instead of deleting keys one by one.
+#
+# A missing counter (first use, eviction, cache restart) starts from the
+# current time so it never repeats a version handed out earlier.
+
+def _key(namespace):
+    return f"version:{namespace}"
+
+
+def get_version(namespace):
+
+    version = cache.get(_key(namespace))
+
+    if version is None:
+        cache.add(_key(namespace), time.time_ns() // 1000, timeout=None)
+        version = cache.get(_key(namespace))
+
+    return version
+
+
+def bump_version(namespace):
+
+    try:
+        return cache.incr(_key(namespace))
+    except ValueError:
+        cache.add(_key(namespace), time.time_ns() // 1000, timeout=None)
+        return cache.get(_key(namespace))
+
+
+# Bump once the current transaction commits (at once outside one). Bumping
+# earlier lets a concurrent read rebuild from the old rows and cache them
+# under the new version, where they would stay until the next write.
+def bump_on_commit(namespace):
+    transaction.on_commit(lambda: bump_version(namespace))
+
+
+def etag_matches(request, etag):
+
+    header = request.META.get("HTTP_IF_NONE_MATCH")
+
+    if not header:
+        return False
+
+    tags = [t.strip() for t in header.split(",")]
+
+    return "*" in tags or etag in tags
@@ -0,0 +1,122 @@
+from django.db.models import Case, Exists, F, OuterRef, Value, When
+from django.utils import timezone
+
+from .models import (
+    SurveyConnectivity,
+    SurveyLocation,
+    SurveyMonument,
+    SurveyPhoto,
+    SurveyPower,
+    SurveySkyVisibility,
+    SurveySubSite,
+)
+
+
+# ------------------------------------------------
+# SUBSITE COMPLETENESS BITMASK
+# ------------------------------------------------
+# SurveySubSite.completeness has one bit per section the surveyor fills in.
+# The section APIs set / clear their bit with a single UPDATE using a
+# bitwise OR / AND on the column, so concurrent writes to different
+# sections of the same subsite cannot undo each other. The photos bit
+# means all four directional photos are present. Bulk writes (sync.py)
+# recompute the mask from the section tables instead.
+#
+# "Incomplete" is completeness < COMPLETE; a partial index covers exactly
+# those rows.
+
+LOCATION = 1
+MONUMENT = 2
+SKY_VISIBILITY = 4
+POWER = 8
+CONNECTIVITY = 16
+PHOTOS = 32
+
+COMPLETE = LOCATION | MONUMENT | SKY_VISIBILITY | POWER | CONNECTIVITY | PHOTOS
+
+# name -> bit, in form order
+SECTIONS = {
+    "location": LOCATION,
+    "monument": MONUMENT,
+    "sky_visibility": SKY_VISIBILITY,
+    "power": POWER,
+    "connectivity": CONNECTIVITY,
+    "photos": PHOTOS,
+}
+
+SECTION_MODELS = {
+    SurveyLocation: LOCATION,
+    SurveyMonument: MONUMENT,
+    SurveySkyVisibility: SKY_VISIBILITY,
+    SurveyPower: POWER,
+    SurveyConnectivity: CONNECTIVITY,
+}
+
+PHOTO_SIDES = ["north_photo", "east_photo", "south_photo", "west_photo"]
+
+
+def set_section(subsite_id, bit, present=True):
+
+    mask = F("completeness").bitor(bit) if present else F("completeness").bitand(COMPLETE & ~bit)
+
+    SurveySubSite.objects.filter(id=subsite_id).update(
+        completeness=mask,
+        updated_at=timezone.now()
+    )
+
+
+def photos_complete(photo):
+    return all(getattr(photo, side) for side in PHOTO_SIDES)
+
+
+def set_photos(subsite_id, photo=None):
+    set_section(subsite_id, PHOTOS, photo is not None and photos_complete(photo))
+
+
+# EXISTS subqueries on a SurveySubSite queryset (also readiness.py)
+def section_exists(model):
+    return Exists(model.objects.filter(survey=OuterRef("pk")))
+
+
+def photos_exist(all_sides=False):
+
+    photos = SurveyPhoto.objects.filter(sub_site=OuterRef("pk"))
+
+    if all_sides:
+        for side in PHOTO_SIDES:
+            photos = photos.exclude(**{side: ""})
+
+    return Exists(photos)
+
+
+def completeness_expression():
+
+    parts = [
+        (section_exists(model), bit)
+        for model, bit in SECTION_MODELS.items()
+    ] + [(photos_exist(all_sides=True), PHOTOS)]
+
+    expression = Value(0)
+
+    for exists, bit in parts:
+        expression = expression + Case(When(exists, then=Value(bit)), default=Value(0))
+
+    return expression
+
+
+# recompute from the section tables (bulk writes, backfill)
+def refresh_completeness(subsite_ids):
+
+    if subsite_ids:
+        SurveySubSite.objects.filter(id__in=subsite_ids).update(
+            completeness=completeness_expression(),
+            updated_at=timezone.now()
+        )
+
+
+def sections_done(completeness):
+    return {name: bool(completeness & bit) for name, bit in SECTIONS.items()}
+
+
+def missing_sections(completeness):
+    return [name for name, bit in SECTIONS.items() if not completeness & bit]
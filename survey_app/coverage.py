@@ -0,0 +1,131 @@
+import numpy as np
+from django.db import transaction
+
+from .models import SurveyLocation, Town, TownCoverage
+from .spatial import PointIndex, haversine_km, station_index
+from .timing import Timer
+
+
+# subsites that count as covering a town
+APPROVED_STATUS = "FINAL_APPROVED"
+
+UPDATE_FIELDS = [
+    "nearest_station",
+    "station_distance_km",
+    "nearest_survey",
+    "survey_distance_km",
+    "gap_km",
+    "computed_at",
+]
+
+
+# ------------------------------------------------
+# DENSIFICATION COVERAGE ENGINE
+# ------------------------------------------------
+# For every Town with coordinates: distance to the nearest Stationdb station
+# and to the nearest FINAL_APPROVED SurveyLocation. Both lookups run as one
+# grid-bucketed, vectorized pass (PointIndex.nearest_arrays) over arrays of
+# all towns. Results are upserted into TownCoverage.
+
+def load_towns():
+
+    rows = list(
+        Town.objects.filter(
+            latitude__isnull=False,
+            longitude__isnull=False
+        ).order_by("id").values_list("id", "latitude", "longitude")
+    )
+
+    ids = np.array([r[0] for r in rows], dtype=np.int64)
+    lats = np.array([r[1] for r in rows], dtype=float)
+    lons = np.array([r[2] for r in rows], dtype=float)
+
+    return ids, lats, lons
+
+
+def approved_survey_index():
+
+    return PointIndex(
+        SurveyLocation.objects.filter(
+            survey__status=APPROVED_STATUS
+        ).values_list("survey_id", "survey__location", "latitude", "longitude")
+    )
+
+
+def _or_none(ids, i):
+    return ids[i] if i >= 0 else None
+
+
+def _km(d):
+    return round(float(d), 3) if np.isfinite(d) else None
+
+
+def compute_coverage(save=True, timer=None):
+
+    timer = timer or Timer()
+
+    with timer("load_towns"):
+        town_ids, lats, lons = load_towns()
+
+    with timer("build_indexes"):
+        stations = station_index()
+        surveys = approved_survey_index()
+
+    with timer("nearest_station"):
+        st_idx, st_dist = stations.nearest_arrays(lats, lons)
+
+    with timer("nearest_survey"):
+        sv_idx, sv_dist = surveys.nearest_arrays(lats, lons)
+
+    gap = np.minimum(st_dist, sv_dist)
+
+    rows = [
+        TownCoverage(
+            town_id=int(town_ids[n]),
+            nearest_station_id=_or_none(stations.ids, st_idx[n]),
+            station_distance_km=_km(st_dist[n]),
+            nearest_survey_id=_or_none(surveys.ids, sv_idx[n]),
+            survey_distance_km=_km(sv_dist[n]),
+            gap_km=_km(gap[n]),
+        )
+        for n in range(len(town_ids))
+    ]
+
+    if save:
+        with timer("save"), transaction.atomic():
+
+            TownCoverage.objects.bulk_create(
+                rows,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=["town"],
+                update_fields=UPDATE_FIELDS,
+            )
+
+            # towns that lost their coordinates
+            TownCoverage.objects.exclude(town_id__in=town_ids.tolist()).delete()
+
+    return {
+        "towns": len(rows),
+        "stations": len(stations),
+        "approved_surveys": len(surveys),
+        "timings": timer.phases,
+    }
+
+
+# brute force (every town x every station) for the benchmark only
+def brute_force_nearest(index, lats, lons, block=512):
+
+    best_idx = np.full(len(lats), -1)
+    best_dist = np.full(len(lats), np.inf)
+
+    if not len(index):
+        return best_idx, best_dist
+
+    for start in range(0, len(lats), block):
+        part = slice(start, start + block)
+        dist = haversine_km(lats[part, None], lons[part, None], index.lat[None, :], index.lon[None, :])
+        best_idx[part] = dist.argmin(axis=1)
+        best_dist[part] = dist.min(axis=1)
+
+    return best_idx, best_dist
@@ -0,0 +1,196 @@
+import csv
+import json
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import StreamingHttpResponse
+from rest_framework import serializers
+
+from .models import SurveyLocation
+
+
+# ------------------------------------------------
+# MAP DATA EXPORT (streamed)
+# ------------------------------------------------
+# Rows are read with .iterator(chunk_size) and written out one feature at a
+# time, so memory stays flat however many sites there are.
+
+CHUNK_SIZE = 2000
+
+PHOTO_SIDES = ["north", "east", "south", "west"]
+
+CSV_COLUMNS = [
+    "id", "lat", "lon", "status", "location", "address", "city", "district", "state",
+    *[f"{side}_photo" for side in PHOTO_SIDES],
+]
+
+
+def parse_bbox(value):
+
+    try:
+        min_lon, min_lat, max_lon, max_lat = [float(v) for v in value.split(",")]
+    except ValueError:
+        raise serializers.ValidationError({
+            "bbox": "Expected min_lon,min_lat,max_lon,max_lat"
+        })
+
+    if min_lon > max_lon or min_lat > max_lat:
+        raise serializers.ValidationError({"bbox": "Min must not exceed max"})
+
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def map_locations(params):
+
+    locations = SurveyLocation.objects.select_related("survey__photos")
+
+    if params.get("bbox"):
+        min_lon, min_lat, max_lon, max_lat = parse_bbox(params["bbox"])
+        locations = locations.filter(
+            latitude__range=(min_lat, max_lat),
+            longitude__range=(min_lon, max_lon)
+        )
+
+    if params.get("status"):
+        locations = locations.filter(survey__status__in=params["status"].split(","))
+
+    if params.get("zone"):
+        locations = locations.filter(survey__survey__surveyor__zone=params["zone"])
+
+    return locations.order_by("id")
+
+
+def map_row(loc):
+
+    subsite = loc.survey
+
+    try:
+        photos = subsite.photos
+    except ObjectDoesNotExist:
+        photos = None
+
+    return {
+        "id": str(subsite.id),
+        "lat": float(loc.latitude),
+        "lon": float(loc.longitude),
+        "status": subsite.status,
+        "location": subsite.location,
+        "address": loc.address,
+        "city": loc.city,
+        "district": loc.district,
+        "state": loc.state,
+        "photos": {
+            side: getattr(photos, f"{side}_photo").url
+            if photos and getattr(photos, f"{side}_photo") else None
+            for side in PHOTO_SIDES
+        }
+    }
+
+
+def map_rows(locations):
+
+    for loc in locations.iterator(chunk_size=CHUNK_SIZE):
+        yield map_row(loc)
+
+
+# async ORM variant for async_views.py
+async def amap_rows(locations):
+
+    async for loc in locations.aiterator(chunk_size=CHUNK_SIZE):
+        yield map_row(loc)
+
+
+def _feature(row):
+
+    lon, lat = row.pop("lon"), row.pop("lat")
+
+    return json.dumps({
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [lon, lat]},
+        "properties": row,
+    })
+
+
+def _geojson_chunks(rows):
+
+    yield '{"type": "FeatureCollection", "features": ['
+
+    for i, row in enumerate(rows):
+        yield ("," if i else "") + _feature(row)
+
+    yield "]}"
+
+
+async def _ageojson_chunks(rows):
+
+    yield '{"type": "FeatureCollection", "features": ['
+
+    first = True
+
+    async for row in rows:
+        yield ("" if first else ",") + _feature(row)
+        first = False
+
+    yield "]}"
+
+
+# csv.writer needs a file; this one hands each line straight back
+class _Echo:
+
+    def write(self, value):
+        return value
+
+
+def _csv_line(writer, row):
+
+    photos = row.pop("photos")
+
+    return writer.writerow(
+        [row[c] for c in CSV_COLUMNS[:-len(PHOTO_SIDES)]] +
+        [photos[side] for side in PHOTO_SIDES]
+    )
+
+
+def _csv_chunks(rows):
+
+    writer = csv.writer(_Echo())
+
+    yield writer.writerow(CSV_COLUMNS)
+
+    for row in rows:
+        yield _csv_line(writer, row)
+
+
+async def _acsv_chunks(rows):
+
+    writer = csv.writer(_Echo())
+
+    yield writer.writerow(CSV_COLUMNS)
+
+    async for row in rows:
+        yield _csv_line(writer, row)
+
+
+def _streaming_response(chunks, fmt):
+
+    if fmt == "geojson":
+        return StreamingHttpResponse(chunks, content_type="application/geo+json")
+
+    response = StreamingHttpResponse(chunks, content_type="text/csv")
+    response["Content-Disposition"] = 'attachment; filename="survey_sites.csv"'
+
+    return response
+
+
+def stream_map_data(locations, fmt):
+
+    chunks = _geojson_chunks if fmt == "geojson" else _csv_chunks
+
+    return _streaming_response(chunks(map_rows(locations)), fmt)
+
+
+# async iterator body, served without a thread under ASGI
+def astream_map_data(locations, fmt):
+
+    chunks = _ageojson_chunks if fmt == "geojson" else _acsv_chunks
+
+    return _streaming_response(chunks(amap_rows(locations)), fmt)
@@ -0,0 +1,248 @@
+from django.core.cache import cache
+from django.http import Http404
+
+from .cache import get_version
+from .models import State, District, SubDistrict, Town
+
+
+GEOGRAPHY_NAMESPACE = "geography"
+
+# process-local copy so a request does not unpickle the whole tree
+_local = {"version": None, "snapshot": None}
+
+
+# ------------------------------------------------
+# LOCATION HIERARCHY SNAPSHOT
+# ------------------------------------------------
+# State -> District -> SubDistrict -> Town built with one query per level.
+#
+# snapshot["states"]       nested tree, ordered by name
+# snapshot["state"][id]    state node (with "districts")
+# snapshot["district"][id] district node (with "state_id", "subdistricts")
+# snapshot["subdistrict"][id] subdistrict node (with "district_id", "towns")
+
+def build_snapshot():
+
+    states = list(State.objects.order_by("name").values("id", "name"))
+    districts = list(District.objects.order_by("name").values("id", "name", "state_id"))
+    subdistricts = list(SubDistrict.objects.order_by("name").values("id", "name", "district_id"))
+    towns = list(
+        Town.objects.order_by("name").values("id", "name", "latitude", "longitude", "subdistrict_id")
+    )
+
+    state_index = {}
+    district_index = {}
+    subdistrict_index = {}
+
+    for s in states:
+        state_index[s["id"]] = {"id": s["id"], "name": s["name"], "districts": []}
+
+    for d in districts:
+        node = {"id": d["id"], "name": d["name"], "state_id": d["state_id"], "subdistricts": []}
+        district_index[d["id"]] = node
+        state_index[d["state_id"]]["districts"].append(node)
+
+    for sd in subdistricts:
+        node = {"id": sd["id"], "name": sd["name"], "district_id": sd["district_id"], "towns": []}
+        subdistrict_index[sd["id"]] = node
+        district_index[sd["district_id"]]["subdistricts"].append(node)
+
+    for t in towns:
+        subdistrict_index[t["subdistrict_id"]]["towns"].append({
+            "id": t["id"],
+            "name": t["name"],
+            "latitude": t["latitude"],
+            "longitude": t["longitude"],
+        })
+
+    return {
+        "states": list(state_index.values()),
+        "state": state_index,
+        "district": district_index,
+        "subdistrict": subdistrict_index,
+    }
+
+
+def get_snapshot():
+
+    version = get_version(GEOGRAPHY_NAMESPACE)
+
+    if _local["version"] == version:
+        return version, _local["snapshot"]
+
+    key = f"geography:snapshot:{version}"
+    snapshot = cache.get(key)
+
+    if snapshot is None:
+        snapshot = build_snapshot()
+        cache.set(key, snapshot, timeout=None)
+
+    _local["version"] = version
+    _local["snapshot"] = snapshot
+
+    return version, snapshot
+
+
+# ------------------------------------------------
+# LOOKUP PAYLOADS
+# ------------------------------------------------
+# Each *_lookup() returns (resource, build): the ETag resource name and a
+# function building the response body from a snapshot. Shared by the
+# lookup APIs in views.py and async_views.py.
+
+def snapshot_node(snapshot, level, node_id):
+
+    node = snapshot[level].get(node_id)
+
+    if node is None:
+        raise Http404
+
+    return node
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def states_lookup(state_id=None):
+
+    # 🔹 If specific state requested
+    if state_id:
+        def build(snapshot):
+            state = snapshot_node(snapshot, "state", state_id)
+            return {
+                "id": state["id"],
+                "name": state["name"],
+            }
+
+        return f"state-{state_id}", build
+
+    # 🔹 If no state_id → return all states
+    def build(snapshot):
+        return [
+            {
+                "id": s["id"],
+                "name": s["name"],
+            }
+            for s in snapshot["states"]
+        ]
+
+    return "states", build
+
+
+def districts_lookup(state_id):
+
+    def build(snapshot):
+
+        state = snapshot_node(snapshot, "state", state_id)
+
+        return {
+            "state_id": state["id"],
+            "state_name": state["name"],
+            "district_count": len(state["districts"]),
+            "districts": [
+                {
+                    "district_id": d["id"],
+                    "district_name": d["name"]
+                }
+                for d in state["districts"]
+            ]
+        }
+
+    return f"state-{state_id}-districts", build
+
+
+def subdistricts_lookup(district_id):
+
+    def build(snapshot):
+
+        district = snapshot_node(snapshot, "district", district_id)
+        state = snapshot["state"][district["state_id"]]
+
+        return {
+            "state_id": state["id"],
+            "state_name": state["name"],
+            "district_id": district["id"],
+            "district_name": district["name"],
+            "subdistrict_count": len(district["subdistricts"]),
+            "subdistricts": [
+                {
+                    "subdistrict_id": s["id"],
+                    "subdistrict_name": s["name"]
+                }
+                for s in district["subdistricts"]
+            ]
+        }
+
+    return f"district-{district_id}-subdistricts", build
+
+
+def towns_lookup(subdistrict_id):
+
+    def build(snapshot):
+
+        subdistrict = snapshot_node(snapshot, "subdistrict", subdistrict_id)
+        district = snapshot["district"][subdistrict["district_id"]]
+        state = snapshot["state"][district["state_id"]]
+
+        return {
+            "state_id": state["id"],
+            "state_name": state["name"],
+
+            "district_id": district["id"],
+            "district_name": district["name"],
+
+            "subdistrict_id": subdistrict["id"],
+            "subdistrict_name": subdistrict["name"],
+
+            "town_count": len(subdistrict["towns"]),
+            "towns": [
+                {
+                    "town_id": t["id"],
+                    "town_name": t["name"],
+                    "latitude": t["latitude"],
+                    "longitude": t["longitude"]
+                }
+                for t in subdistrict["towns"]
+            ]
+        }
+
+    return f"subdistrict-{subdistrict_id}-towns", build
+
+
+# ?district_id= / ?state_id= query values, unparsed
+def tree_lookup(state_id=None, district_id=None):
+
+    # 🔹 If district_id provided
+    if district_id:
+        district_id = _int_or_none(district_id)
+
+        def build(snapshot):
+            district = snapshot["district"].get(district_id)
+            if not district:
+                return {"error": "District not found"}
+            return {
+                "id": district["id"],
+                "name": district["name"],
+                "subdistricts": district["subdistricts"],
+            }
+
+        return f"tree-district-{district_id}", build
+
+    # 🔹 If state_id provided
+    if state_id:
+        state_id = _int_or_none(state_id)
+
+        def build(snapshot):
+            state = snapshot["state"].get(state_id)
+            if not state:
+                return {"error": "State not found"}
+            return state
+
+        return f"tree-state-{state_id}", build
+
+    # 🔹 If nothing provided → return all
+    return "tree", lambda snapshot: snapshot["states"]
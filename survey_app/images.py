@@ -0,0 +1,221 @@
+import hashlib
+from datetime import datetime
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import ImageMetadata, SurveyPhoto, SurveySkyVisibility
+from .storage import cas, digest_of
+
+
+# longest side in pixels
+RENDITION_SIZES = {
+    "preview": 1024,
+    "thumb": 256,
+}
+
+WEBP_QUALITY = 80
+
+RENDITION_DIR = "renditions"
+
+# kind -> image field, per model
+PHOTO_FIELDS = {
+    "north": "north_photo",
+    "east": "east_photo",
+    "south": "south_photo",
+    "west": "west_photo",
+}
+
+SKY_FIELDS = {
+    "polar_chart": "polar_chart_image",
+}
+
+EXIF_IFD = 0x8769
+GPS_IFD = 0x8825
+DATETIME = 306
+DATETIME_ORIGINAL = 36867
+OFFSET_TIME_ORIGINAL = 36881
+
+
+# ------------------------------------------------
+# IMAGE RENDITIONS (site photos, polar charts)
+# ------------------------------------------------
+# Every original gets a WebP thumbnail and a medium preview, re-encoded
+# without EXIF. Rendition names are derived from the original's name
+# (its sha256 for content-addressed files), so serializers build the URLs
+# without a query. GPS position and capture time from the original's EXIF
+# go into ImageMetadata (indexed); the originals themselves are unchanged.
+
+renditions = FileSystemStorage(allow_overwrite=True)
+
+
+def _key(source_name):
+    return digest_of(source_name) or hashlib.sha256(source_name.encode()).hexdigest()
+
+
+def rendition_name(source_name, size):
+
+    key = _key(source_name)
+
+    return f"{RENDITION_DIR}/{key[:2]}/{key}-{size}.webp"
+
+
+def rendition_url(source_name, size):
+    return renditions.url(rendition_name(source_name, size))
+
+
+def _degrees(values, ref):
+
+    if not values or len(values) != 3:
+        return None
+
+    d, m, s = (float(v) for v in values)
+    value = d + m / 60 + s / 3600
+
+    return -value if ref in ("S", "W") else value
+
+
+def read_exif(img):
+
+    exif = img.getexif()
+    gps = exif.get_ifd(GPS_IFD)
+    detail = exif.get_ifd(EXIF_IFD)
+
+    taken_at = None
+    stamp = detail.get(DATETIME_ORIGINAL) or exif.get(DATETIME)
+
+    if stamp:
+        offset = detail.get(OFFSET_TIME_ORIGINAL)
+
+        try:
+            if offset:
+                taken_at = datetime.strptime(f"{stamp.strip()}{offset.strip()}", "%Y:%m:%d %H:%M:%S%z")
+            else:
+                taken_at = timezone.make_aware(datetime.strptime(stamp.strip(), "%Y:%m:%d %H:%M:%S"))
+        except (ValueError, TypeError):
+            taken_at = None
+
+    try:
+        latitude = _degrees(gps.get(2), gps.get(1))
+        longitude = _degrees(gps.get(4), gps.get(3))
+    except (TypeError, ValueError, ZeroDivisionError):
+        latitude = longitude = None
+
+    return {"taken_at": taken_at, "latitude": latitude, "longitude": longitude}
+
+
+def _webp(img, size):
+
+    copy = img.copy()
+    copy.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+    if copy.mode not in ("RGB", "RGBA"):
+        copy = copy.convert("RGBA" if "A" in copy.getbands() else "RGB")
+
+    out = BytesIO()
+    copy.save(out, "WEBP", quality=WEBP_QUALITY)
+
+    return out.getvalue()
+
+
+def build_renditions(source_name):
+
+    with cas.open(source_name, "rb") as f, Image.open(f) as img:
+
+        info = read_exif(img)
+        info["width"], info["height"] = img.size
+
+        # JPEG: decode at reduced scale, much faster than a full decode
+        largest = max(RENDITION_SIZES.values())
+        img.draft("RGB", (largest, largest))
+
+        img = ImageOps.exif_transpose(img)
+
+        for size_name, size in RENDITION_SIZES.items():
+            renditions.save(rendition_name(source_name, size_name), ContentFile(_webp(img, size)))
+
+    return info
+
+
+def process_image(subsite_id, kind, source_name):
+
+    try:
+        fields = build_renditions(source_name)
+        fields["error"] = ""
+    except (OSError, UnidentifiedImageError, ValueError, Image.DecompressionBombError) as e:
+        fields = {
+            "error": str(e)[:1000],
+            "width": None,
+            "height": None,
+            "taken_at": None,
+            "latitude": None,
+            "longitude": None,
+        }
+
+    fields.update(source_name=source_name, processed_at=timezone.now())
+
+    metadata, _ = ImageMetadata.objects.update_or_create(
+        subsite_id=subsite_id,
+        kind=kind,
+        defaults=fields
+    )
+
+    return metadata
+
+
+def _sources(instance):
+
+    if isinstance(instance, SurveyPhoto):
+        fields, subsite_id = PHOTO_FIELDS, instance.sub_site_id
+    else:
+        fields, subsite_id = SKY_FIELDS, instance.survey_id
+
+    for kind, field in fields.items():
+        name = getattr(instance, field).name
+        if name:
+            yield subsite_id, kind, name
+
+
+# process the images of one SurveyPhoto / SurveySkyVisibility whose
+# original changed since the last run
+def process_instance(instance, force=False):
+
+    sources = list(_sources(instance))
+
+    done = set() if force else set(
+        ImageMetadata.objects.filter(
+            subsite_id__in={s[0] for s in sources}
+        ).values_list("subsite_id", "kind", "source_name")
+    )
+
+    return [process_image(*source) for source in sources if source not in done]
+
+
+def process_pending(force=False, limit=None):
+
+    done = set() if force else set(
+        ImageMetadata.objects.values_list("subsite_id", "kind", "source_name")
+    )
+
+    pending = [
+        source
+        for model in (SurveyPhoto, SurveySkyVisibility)
+        for instance in model.objects.iterator()
+        for source in _sources(instance)
+        if source not in done
+    ][:limit]
+
+    return [process_image(*source) for source in pending]
+
+
+def wants_originals(request):
+
+    if request is None:
+        return False
+
+    params = getattr(request, "query_params", request.GET)
+
+    return params.get("originals", "").lower() in ("1", "true", "yes")
@@ -0,0 +1,406 @@
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+
+from .cache import bump_on_commit
+from .geography import GEOGRAPHY_NAMESPACE
+from .models import State, District, SubDistrict, Town, Statedb, Districtdb, Stationdb, Survey
+from .source_cache import load_source
+from .tiles import MAP_NAMESPACE
+from .timing import Timer
+
+
+GEOGRAPHY_SOURCE = settings.BASE_DIR / "Priority 1_CORS Densification (5).xlsx"
+STATIONS_SOURCE = settings.BASE_DIR / "CORS_COMPILED_DATA (1).xlsx"
+
+BATCH_SIZE = 1000
+
+
+# ------------------------------------------------
+# BULK SPREADSHEET IMPORT
+# ------------------------------------------------
+# Replaces the row-by-row get_or_create scripts (main.py, main2.py,
+# script.py). Each level is inserted with one bulk_create and parents are
+# resolved through {natural key: id} dicts, so the number of queries
+# depends on the number of levels, not rows. Rows already in the database
+# (same natural key) are left alone, so re-running an import is harmless.
+#
+# Duplicate names inside a parent are numbered like the old scripts did:
+# first "KODUR", then "KODUR 1", "KODUR 2", ... skipping any number that
+# is already a real name in the same parent.
+#
+# sync=True turns the leaf level (Town / Stationdb) into an upsert: every
+# source row is hashed (source_hash column) and only rows whose hash
+# changed are updated; delete=True also removes rows missing from the
+# source. Statedb / Districtdb carry coordinates too, so sync also
+# corrects those (compared field by field). Parent names are the natural
+# key: a renamed parent comes in as a new row and the old one is kept,
+# since deleting it would cascade to its children. dry_run=True does all
+# of it inside a transaction that is rolled back, so the returned counts
+# are exact but nothing is written.
+
+def parse_workbook(path):
+
+    df = pd.read_excel(path)
+    df.columns = df.columns.str.strip()
+
+    for col in df.select_dtypes(include="object"):
+        df[col] = df[col].map(lambda v: v.strip() if isinstance(v, str) else v)
+
+    return df
+
+
+# the parsed workbook is kept as a memory-mapped snapshot (source_cache.py)
+def read_source(path, cache=True):
+
+    if not cache:
+        return parse_workbook(path)
+
+    return load_source(path, parse_workbook)
+
+
+def number_duplicates(df, group_cols, name_col):
+
+    seq = df.groupby(group_cols + [name_col], sort=False).cumcount()
+    names = df[name_col].where(seq == 0, df[name_col] + " " + seq.astype(str))
+
+    if not df[group_cols].assign(_name=names).duplicated().any():
+        return names
+
+    # a generated "KODUR 1" collides with a source row really named
+    # "KODUR 1": skip numbers already used in the parent
+    groups = list(zip(*(df[col] for col in group_cols)))
+    taken = {group + (name,) for group, name in zip(groups, df[name_col])}
+    kept = set()
+    counters = {}
+    numbered = []
+
+    for group, name in zip(groups, df[name_col]):
+
+        key = group + (name,)
+
+        if key not in kept:
+            kept.add(key)
+            numbered.append(name)
+            continue
+
+        n = counters.get(key, 0) + 1
+        while group + (f"{name} {n}",) in taken:
+            n += 1
+
+        counters[key] = n
+        taken.add(group + (f"{name} {n}",))
+        numbered.append(f"{name} {n}")
+
+    return pd.Series(numbered, index=df.index)
+
+
+def row_hash(df, columns):
+
+    return pd.util.hash_pandas_object(df[columns], index=False).map("{:016x}".format)
+
+
+def _none(value):
+    return None if pd.isna(value) else value
+
+
+def _create_missing(model, existing, rows, batch_size):
+
+    # existing: {key: id}; rows: {key: field dict}
+    missing = [model(**fields) for k, fields in rows.items() if k not in existing]
+
+    model.objects.bulk_create(missing, batch_size=batch_size)
+
+    return {"created": len(missing)}
+
+
+# parent levels without a source_hash: create missing rows and, with
+# sync, update the ones whose update_fields differ from the source
+def _sync_parents(model, key_fields, rows, update_fields, batch_size, sync=False):
+
+    n = len(key_fields)
+
+    # {key: (id, *update_fields)}, keyed like _id_map
+    existing = {
+        (row[:n] if n > 1 else row[0]): row[n:]
+        for row in model.objects.values_list(*key_fields, "id", *update_fields)
+    }
+
+    creates = [model(**fields) for key, fields in rows.items() if key not in existing]
+
+    updates = [
+        model(id=existing[key][0], **fields)
+        for key, fields in rows.items()
+        if sync and key in existing
+        and existing[key][1:] != tuple(fields[f] for f in update_fields)
+    ]
+
+    model.objects.bulk_create(creates, batch_size=batch_size)
+    model.objects.bulk_update(updates, update_fields, batch_size=batch_size)
+
+    return {
+        "created": len(creates),
+        "updated": len(updates),
+        "unchanged": len(rows) - len(creates) - len(updates),
+    }
+
+
+# rows: {natural key: field dict incl. source_hash}; keep_ids are never deleted
+def _sync_rows(model, key_fields, rows, update_fields, batch_size, sync=False, delete=False, keep_ids=()):
+
+    existing = {
+        tuple(row[:-2]): (row[-2], row[-1])
+        for row in model.objects.values_list(*key_fields, "id", "source_hash")
+    }
+
+    creates = [model(**fields) for key, fields in rows.items() if key not in existing]
+
+    updates = [
+        model(id=existing[key][0], **fields)
+        for key, fields in rows.items()
+        if sync and key in existing and existing[key][1] != fields["source_hash"]
+    ]
+
+    stale = [
+        pk for key, (pk, _) in existing.items()
+        if sync and delete and key not in rows and pk not in keep_ids
+    ]
+
+    model.objects.bulk_create(creates, batch_size=batch_size)
+    model.objects.bulk_update(updates, update_fields + ["source_hash"], batch_size=batch_size)
+    model.objects.filter(id__in=stale).delete()
+
+    return {
+        "created": len(creates),
+        "updated": len(updates),
+        "deleted": len(stale),
+        "unchanged": len(rows) - len(creates) - len(updates),
+    }
+
+
+def _changed(changes):
+
+    return any(
+        level.get(kind) for level in changes.values() for kind in ["created", "updated", "deleted"]
+    )
+
+
+def format_changes(changes):
+
+    return "; ".join(
+        f"{level}: " + ", ".join(f"{kind}={count}" for kind, count in counts.items())
+        for level, counts in changes.items()
+    )
+
+
+def _id_map(queryset, *key_fields):
+
+    if len(key_fields) == 1:
+        return dict(queryset.values_list(key_fields[0], "id"))
+
+    return {
+        tuple(row[:-1]): row[-1]
+        for row in queryset.values_list(*key_fields, "id")
+    }
+
+
+# ------------------------------------------------
+# Town master: State -> District -> SubDistrict -> Town
+# ------------------------------------------------
+
+def import_geography(path=GEOGRAPHY_SOURCE, batch_size=BATCH_SIZE, timer=None,
+                     sync=False, delete=False, dry_run=False, cache=True):
+
+    timer = timer or Timer()
+    changes = {}
+
+    with timer("read"):
+        df = read_source(path, cache=cache)
+
+    with timer("prepare"):
+        df = df.dropna(subset=["STATE_UT", "DISTRICT", "SUBDISTRICT", "TOWN"])
+        df = df.astype({"STATE_UT": str, "DISTRICT": str, "SUBDISTRICT": str, "TOWN": str})
+        df["town_name"] = number_duplicates(df, ["STATE_UT", "DISTRICT", "SUBDISTRICT"], "TOWN")
+        df["source_hash"] = row_hash(df, ["STATE_UT", "DISTRICT", "SUBDISTRICT", "town_name", "Lat", "Long"])
+
+    with transaction.atomic():
+
+        with timer("states"):
+            states = _id_map(State.objects, "name")
+            changes["states"] = _create_missing(
+                State, states,
+                {name: {"name": name} for name in df["STATE_UT"].unique()},
+                batch_size
+            )
+            states = _id_map(State.objects, "name")
+
+        with timer("districts"):
+            df["state_id"] = df["STATE_UT"].map(states)
+
+            districts = _id_map(District.objects, "state_id", "name")
+            changes["districts"] = _create_missing(
+                District, districts,
+                {
+                    (s, d): {"state_id": s, "name": d}
+                    for s, d in df[["state_id", "DISTRICT"]].drop_duplicates().itertuples(index=False)
+                },
+                batch_size
+            )
+            districts = _id_map(District.objects, "state_id", "name")
+
+        with timer("subdistricts"):
+            df["district_id"] = [
+                districts[k] for k in zip(df["state_id"], df["DISTRICT"])
+            ]
+
+            subdistricts = _id_map(SubDistrict.objects, "district_id", "name")
+            changes["subdistricts"] = _create_missing(
+                SubDistrict, subdistricts,
+                {
+                    (d, s): {"district_id": d, "name": s}
+                    for d, s in df[["district_id", "SUBDISTRICT"]].drop_duplicates().itertuples(index=False)
+                },
+                batch_size
+            )
+            subdistricts = _id_map(SubDistrict.objects, "district_id", "name")
+
+        with timer("towns"):
+            df["subdistrict_id"] = [
+                subdistricts[k] for k in zip(df["district_id"], df["SUBDISTRICT"])
+            ]
+
+            changes["towns"] = _sync_rows(
+                Town,
+                ["subdistrict_id", "name"],
+                {
+                    (sd, name): {
+                        "subdistrict_id": sd,
+                        "name": name,
+                        "latitude": _none(lat),
+                        "longitude": _none(lon),
+                        "source_hash": source_hash,
+                    }
+                    for sd, name, lat, lon, source_hash in df[
+                        ["subdistrict_id", "town_name", "Lat", "Long", "source_hash"]
+                    ].itertuples(index=False)
+                },
+                ["latitude", "longitude"],
+                batch_size,
+                sync=sync,
+                delete=delete,
+                # deleting a town would cascade to its surveys
+                keep_ids=set(Survey.objects.values_list("station_id", flat=True))
+            )
+
+        if dry_run:
+            transaction.set_rollback(True)
+
+    # bulk writes do not send the signals that invalidate the snapshot
+    if not dry_run and _changed(changes):
+        bump_on_commit(GEOGRAPHY_NAMESPACE)
+
+    return {"rows": len(df), "changes": changes, "timings": timer.phases}
+
+
+# ------------------------------------------------
+# CORS stations: Statedb -> Districtdb -> Stationdb
+# ------------------------------------------------
+
+def import_stations(path=STATIONS_SOURCE, batch_size=BATCH_SIZE, timer=None,
+                    sync=False, delete=False, dry_run=False, cache=True):
+
+    timer = timer or Timer()
+    changes = {}
+
+    with timer("read"):
+        df = read_source(path, cache=cache)
+
+    with timer("prepare"):
+        df = df.dropna(subset=["NAME", "STATE", "DISTRICT"])
+        df = df.astype({"NAME": str, "STATE": str, "DISTRICT": str})
+
+        for col in ["LATITUDE", "LONGITUDE", "E_HEIGHT", "Sl_No_"]:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+
+        # station latitude/longitude are required columns
+        skipped = int(df[["LATITUDE", "LONGITUDE"]].isna().any(axis=1).sum())
+        df = df.dropna(subset=["LATITUDE", "LONGITUDE"])
+
+        df["station_name"] = number_duplicates(df, ["STATE", "DISTRICT"], "NAME")
+        df["source_hash"] = row_hash(
+            df, ["STATE", "DISTRICT", "station_name", "Sl_No_", "CODE", "LATITUDE", "LONGITUDE", "E_HEIGHT"]
+        )
+
+        # first station of a state / district gives its coordinates
+        state_coords = df.groupby("STATE", sort=False)[["LATITUDE", "LONGITUDE"]].first()
+        district_coords = df.groupby(["STATE", "DISTRICT"], sort=False)[["LATITUDE", "LONGITUDE"]].first()
+
+    with transaction.atomic():
+
+        with timer("states"):
+            changes["states"] = _sync_parents(
+                Statedb,
+                ["name"],
+                {
+                    name: {"name": name, "latitude": lat, "longitude": lon}
+                    for name, (lat, lon) in state_coords.iterrows()
+                },
+                ["latitude", "longitude"],
+                batch_size,
+                sync=sync
+            )
+            states = _id_map(Statedb.objects, "name")
+
+        with timer("districts"):
+            df["state_id"] = df["STATE"].map(states)
+
+            changes["districts"] = _sync_parents(
+                Districtdb,
+                ["state_id", "name"],
+                {
+                    (states[s], d): {"state_id": states[s], "name": d, "latitude": lat, "longitude": lon}
+                    for (s, d), (lat, lon) in district_coords.iterrows()
+                },
+                ["latitude", "longitude"],
+                batch_size,
+                sync=sync
+            )
+            districts = _id_map(Districtdb.objects, "state_id", "name")
+
+        with timer("stations"):
+            df["district_id"] = [
+                districts[k] for k in zip(df["state_id"], df["DISTRICT"])
+            ]
+
+            changes["stations"] = _sync_rows(
+                Stationdb,
+                ["district_id", "name"],
+                {
+                    (district_id, name): {
+                        "district_id": district_id,
+                        "sl_no": None if pd.isna(sl_no) else int(sl_no),
+                        "name": name,
+                        "code": _none(code),
+                        "latitude": lat,
+                        "longitude": lon,
+                        "height": _none(height),
+                        "source_hash": source_hash,
+                    }
+                    for district_id, name, sl_no, code, lat, lon, height, source_hash in df[
+                        ["district_id", "station_name", "Sl_No_", "CODE", "LATITUDE", "LONGITUDE", "E_HEIGHT", "source_hash"]
+                    ].itertuples(index=False)
+                },
+                ["sl_no", "code", "latitude", "longitude", "height"],
+                batch_size,
+                sync=sync,
+                delete=delete
+            )
+
+        if dry_run:
+            transaction.set_rollback(True)
+
+    # tiles and the nearest-station index are keyed on the map version
+    if not dry_run and _changed(changes):
+        bump_on_commit(MAP_NAMESPACE)
+
+    return {"rows": len(df), "skipped": skipped, "changes": changes, "timings": timer.phases}
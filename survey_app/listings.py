@@ -0,0 +1,142 @@
+from django.db.models import Prefetch
+
+from .models import Survey, SurveySubSite
+from .serializers import (
+    DirectorSurveySerializer,
+    FullHierarchySurveySerializer,
+    GNRBSurveySerializer,
+    ZonalSurveySerializer,
+)
+
+
+# ------------------------------------------------
+# DASHBOARD LIST QUERIES
+# ------------------------------------------------
+# Querysets behind the hierarchy list and the Director / Zonal / GNRB
+# subsite lists. Built here and evaluated by the sync APIViews (views.py)
+# or, with the async ORM, by their async variants (async_views.py).
+
+SECTIONS = [
+    "surveylocation",
+    "surveymonument",
+    "surveyskyvisibility",
+    "surveypower",
+    "surveyconnectivity",
+    "photos",
+]
+
+# survey status each approver sees in the hierarchy list (own zone)
+HIERARCHY_STATUS = {
+    "SUPERVISOR": "SUBMITTED",
+    "DIRECTOR": "SUPERVISOR_APPROVED",
+    "ZONAL_CHIEF": "DIRECTOR_APPROVED",
+    "GNRB": "ZONAL_CHIEF_APPROVED",
+}
+
+# role -> (subsite statuses listed, serializer)
+SUBSITE_LISTS = {
+    "DIRECTOR": (
+        [
+            "SUPERVISOR_APPROVED",
+            "DIRECTOR_APPROVED",
+            "SENT_TO_ZONAL",
+            "SENT_TO_GNRB",
+            "FINAL_APPROVED",
+            "REJECTED_BY_DIRECTOR",
+            "REJECTED_BY_ZONAL",
+            "REJECTED_BY_GNRB"
+        ],
+        DirectorSurveySerializer
+    ),
+    "ZONAL_CHIEF": (
+        [
+            "DIRECTOR_APPROVED",
+            "SENT_TO_ZONAL",
+            "REJECTED_BY_ZONAL",
+            "SENT_TO_GNRB",
+            "FINAL_APPROVED",
+            "REJECTED_BY_GNRB",
+        ],
+        ZonalSurveySerializer
+    ),
+    "GNRB": (
+        [
+            "SENT_TO_GNRB",
+            "FINAL_APPROVED",
+            "REJECTED_BY_GNRB"
+        ],
+        GNRBSurveySerializer
+    ),
+}
+
+
+# None: the role may not use the hierarchy list
+def hierarchy_surveys(user):
+
+    if user.role == "SURVEYOR":
+        return Survey.objects.filter(surveyor=user)
+
+    if user.role in HIERARCHY_STATUS:
+        return Survey.objects.filter(
+            surveyor__zone=user.zone,
+            status=HIERARCHY_STATUS[user.role]
+        )
+
+    if user.role == "ADMIN":
+        return Survey.objects.all()
+
+    return None
+
+
+# ?fields= projection; returns (fields or None, invalid names)
+def hierarchy_fields(value):
+
+    if not value:
+        return None, []
+
+    fields = [f.strip() for f in value.split(",") if f.strip()]
+    allowed = FullHierarchySurveySerializer.Meta.fields
+
+    return fields or None, [f for f in fields if f not in allowed]
+
+
+def wants_subsites(fields):
+    return not fields or "subsites" in fields
+
+
+def hierarchy_queryset(surveys, fields=None):
+
+    surveys = surveys.select_related(
+        "surveyor",
+        "state",
+        "district",
+        "subdistrict",
+        "station"
+    )
+
+    # nested sections only when the client asks for subsites
+    if wants_subsites(fields):
+        surveys = surveys.prefetch_related(
+            *[f"subsites__{section}" for section in SECTIONS]
+        )
+
+    return surveys
+
+
+def subsite_list_surveys(role):
+
+    allowed_status, _ = SUBSITE_LISTS[role]
+
+    return Survey.objects.filter(
+        subsites__status__in=allowed_status
+    ).distinct().select_related(
+        "station",
+        "surveyor"
+    ).prefetch_related(
+        Prefetch(
+            "subsites",
+            queryset=SurveySubSite.objects.filter(
+                status__in=allowed_status
+            ).prefetch_related(*SECTIONS)
+        )
+    )
@@ -0,0 +1,179 @@
+import asyncio
+import http.client
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+
+
+# ------------------------------------------------
+# READ ENDPOINT LOAD TEST (sync WSGI vs async ASGI)
+# ------------------------------------------------
+# N clients request one endpoint back to back for a fixed time; the result
+# is throughput and latency percentiles. Each endpoint is run twice: the
+# sync APIView under /api/... and its async twin under /api/async/...
+#
+# Against real servers the clients are threads with one keep-alive
+# connection each; start the project under a WSGI server (gunicorn
+# s_r_a_a_b.wsgi) and an ASGI server (uvicorn s_r_a_a_b.asgi) with the
+# same worker count and point --sync-url / --async-url at them.
+# Without a URL the requests go through Django's test clients in-process
+# (threads for sync, asyncio tasks for async): no network, but the same
+# views, middleware and database.
+
+ENDPOINTS = {
+    "hierarchy": "hierarchy/sites/",
+    "director": "director/subsites/",
+    "zonal": "zonal/subsites/",
+    "gnrb": "gnrb/subsites/",
+    "map": "survey/map/",
+    "states": "states/",
+    "tree": "location/",
+}
+
+SYNC_PREFIX = "/api/"
+ASYNC_PREFIX = "/api/async/"
+
+
+def percentile(values, q):
+
+    if not values:
+        return None
+
+    values = sorted(values)
+
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def summarize(latencies, errors, elapsed):
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": (percentile(latencies, 50) or 0) * 1000,
+        "p99_ms": (percentile(latencies, 99) or 0) * 1000,
+        "max_ms": max(latencies, default=0) * 1000,
+    }
+
+
+def _ok(status_code):
+    return 200 <= status_code < 300 or status_code == 304
+
+
+def _run_threads(request_once, concurrency, duration, setup=None, teardown=None):
+
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+
+        state = setup() if setup else None
+        mine, failed = [], 0
+
+        try:
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    ok = request_once(state)
+                except (OSError, http.client.HTTPException):
+                    ok = False
+                mine.append(time.perf_counter() - start)
+                failed += not ok
+        finally:
+            if teardown:
+                teardown(state)
+
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    started = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+
+    return summarize(latencies, errors[0], time.monotonic() - started)
+
+
+def run_http(url, token, concurrency, duration):
+
+    parts = urlsplit(url)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    headers = {"Authorization": f"Token {token}"} if token else {}
+
+    def setup():
+        return connection_class(parts.netloc, timeout=60)
+
+    def request_once(conn):
+        conn.request("GET", path, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        return _ok(response.status)
+
+    return _run_threads(request_once, concurrency, duration, setup, lambda conn: conn.close())
+
+
+def run_sync_client(path, token, concurrency, duration):
+
+    def setup():
+        return Client(headers={"Authorization": f"Token {token}"})
+
+    def request_once(client):
+        return _ok(client.get(path).status_code)
+
+    # each thread has its own database connection
+    return _run_threads(request_once, concurrency, duration, setup, lambda client: connection.close())
+
+
+async def run_async_client(path, token, concurrency, duration):
+
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    headers = {"Authorization": f"Token {token}"}
+
+    async def client():
+
+        nonlocal errors
+        c = AsyncClient()
+
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            # per request: AsyncClient(headers=...) sends them under HTTP_* names
+            response = await c.get(path, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            errors += not _ok(response.status_code)
+
+    started = time.monotonic()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+
+    return summarize(latencies, errors, time.monotonic() - started)
+
+
+def compare(endpoint, token, concurrency, duration, sync_url=None, async_url=None, query=""):
+
+    path = ENDPOINTS[endpoint] + (f"?{query}" if query else "")
+
+    if sync_url or async_url:
+        results = {}
+        if sync_url:
+            results["sync"] = run_http(sync_url.rstrip("/") + SYNC_PREFIX + path, token, concurrency, duration)
+        if async_url:
+            results["async"] = run_http(async_url.rstrip("/") + ASYNC_PREFIX + path, token, concurrency, duration)
+        return results
+
+    # the test clients send "Host: testserver", as under the test runner
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+        return {
+            "sync": run_sync_client(SYNC_PREFIX + path, token, concurrency, duration),
+            "async": asyncio.run(run_async_client(ASYNC_PREFIX + path, token, concurrency, duration)),
+        }
@@ -0,0 +1,91 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from survey_app.approvals import summary_entry
+from survey_app.models import Survey, SurveyApproval, SurveySubSite
+
+
+# Latest decision per level of every survey / subsite in survey_ids, from
+# the SurveyApproval history, in one query.
+def summaries_from_history(survey_ids):
+
+    survey_summaries = {}
+    subsite_summaries = {}
+
+    approvals = SurveyApproval.objects.filter(
+        survey_id__in=survey_ids
+    ).select_related(
+        "approved_by"
+    ).order_by("approved_at")
+
+    # oldest -> newest so the latest decision wins
+    for approval in approvals:
+
+        level = str(approval.approval_level)
+        entry = summary_entry(approval)
+
+        survey_summaries.setdefault(approval.survey_id, {})[level] = entry
+
+        if approval.subsite_id:
+            subsite_summaries.setdefault(approval.subsite_id, {})[level] = entry
+
+    return survey_summaries, subsite_summaries
+
+
+class Command(BaseCommand):
+
+    help = "Rebuild Survey/SurveySubSite approval_summary from SurveyApproval history"
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+
+        batch_size = options["batch_size"]
+
+        survey_ids = list(
+            Survey.objects.order_by("created_at").values_list("id", flat=True)
+        )
+
+        surveys_done = 0
+        subsites_done = 0
+
+        for start in range(0, len(survey_ids), batch_size):
+
+            batch_ids = survey_ids[start:start + batch_size]
+
+            with transaction.atomic():
+
+                surveys = list(
+                    Survey.objects.select_for_update().filter(id__in=batch_ids)
+                )
+                subsites = list(
+                    SurveySubSite.objects.select_for_update().filter(survey_id__in=batch_ids)
+                )
+
+                survey_summaries, subsite_summaries = summaries_from_history(batch_ids)
+
+                # bulk_update skips auto_now; the delta feed and ETags key on updated_at
+                now = timezone.now()
+
+                for survey in surveys:
+                    survey.approval_summary = survey_summaries.get(survey.id, {})
+                    survey.updated_at = now
+
+                for subsite in subsites:
+                    subsite.approval_summary = subsite_summaries.get(subsite.id, {})
+                    subsite.updated_at = now
+
+                fields = ["approval_summary", "updated_at"]
+
+                Survey.objects.bulk_update(surveys, fields, batch_size=batch_size)
+                SurveySubSite.objects.bulk_update(subsites, fields, batch_size=batch_size)
+
+            surveys_done += len(surveys)
+            subsites_done += len(subsites)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Approval summary rebuilt for {surveys_done} surveys and {subsites_done} subsites"
+        ))
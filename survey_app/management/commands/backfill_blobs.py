@@ -0,0 +1,115 @@
+import os
+import shutil
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from survey_app.models import RinexFile, RinexMetadata
+from survey_app.signals import CAS_FIELDS
+from survey_app.storage import CAS_DIR, cas, digest_of
+from survey_app.uploads import _file_sha256
+
+
+# {stored name outside cas/: [(model, field, pk), ...]} over every CAS field
+def legacy_references():
+
+    references = {}
+
+    for model, fields in CAS_FIELDS.items():
+        for field in fields:
+
+            rows = model.objects.exclude(**{field: ""}).exclude(**{f"{field}__isnull": True})
+
+            for pk, name in rows.values_list("pk", field):
+                if not digest_of(name):
+                    references.setdefault(name, []).append((model, field, pk))
+
+    return references
+
+
+# Move one legacy file into the store and point every row holding it at the
+# blob (one reference each). The old file goes once the transaction commits.
+def adopt(name, references):
+
+    digest = _file_sha256(cas.path(name))
+
+    # store_path moves its input; the legacy file stays until commit
+    tmp = cas.path(f"{CAS_DIR}/tmp/{uuid.uuid4().hex}")
+    os.makedirs(os.path.dirname(tmp), exist_ok=True)
+    shutil.copyfile(cas.path(name), tmp)
+
+    with transaction.atomic():
+
+        blob = cas.store_path(tmp, digest, os.path.splitext(name)[1])
+
+        for _ in references[1:]:
+            cas.add_reference(blob)
+
+        now = timezone.now()
+
+        for model, field, pk in references:
+
+            fields = {field: blob}
+
+            # the delta feed / ETags key on updated_at
+            if any(f.name == "updated_at" for f in model._meta.fields):
+                fields["updated_at"] = now
+
+            if model is RinexFile:
+                fields["digest"] = digest
+
+            model.objects.filter(pk=pk).update(**fields)
+
+        # keep the parse: metadata is looked up by stored name
+        if not RinexMetadata.objects.filter(source_name=blob).exists():
+            RinexMetadata.objects.filter(source_name=name).update(source_name=blob)
+
+        transaction.on_commit(lambda: cas.delete(name))
+
+    return blob
+
+
+class Command(BaseCommand):
+
+    help = "Hash media stored before content addressing and move it into the blob store"
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--limit", type=int, default=None)
+
+    def handle(self, *args, **options):
+
+        references = legacy_references()
+        names = sorted(references)[:options["limit"]]
+
+        moved = 0
+        missing = []
+
+        for name in names:
+
+            if not cas.exists(name):
+                missing.append(name)
+                continue
+
+            adopt(name, references[name])
+            moved += 1
+
+        # RinexFiles already in cas/ from before the digest column
+        digests = 0
+
+        for pk, name in RinexFile.objects.filter(digest="").values_list("pk", "file"):
+            if digest_of(name):
+                digests += RinexFile.objects.filter(pk=pk).update(digest=digest_of(name))
+
+        for name in missing:
+            self.stdout.write(self.style.WARNING(f"{name}: file is missing"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {moved} files into the blob store ({len(missing)} missing), "
+            f"set {digests} RinexFile digests"
+        ))
+
+        if moved:
+            self.stdout.write("Run process_images to rebuild renditions of moved photos")
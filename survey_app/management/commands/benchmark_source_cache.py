@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+
+from survey_app.importers import GEOGRAPHY_SOURCE, STATIONS_SOURCE, parse_workbook
+from survey_app.source_cache import clear_snapshots, file_digest, load_source
+from survey_app.timing import Timer
+
+
+class Command(BaseCommand):
+
+    help = "Compare cold (parse XLSX + write snapshot) and warm (memory-mapped snapshot) source loads"
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("paths", nargs="*", default=[str(GEOGRAPHY_SOURCE), str(STATIONS_SOURCE)])
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+
+        for path in options["paths"]:
+
+            timer = Timer()
+
+            clear_snapshots(path)
+
+            with timer("cold"):
+                cold = load_source(path, parse_workbook)
+
+            with timer("digest"):
+                file_digest(path)
+
+            warm_runs = []
+
+            for _ in range(options["repeat"]):
+                run = Timer()
+
+                with run("warm"):
+                    warm = load_source(path, parse_workbook)
+
+                warm_runs.append(run.phases["warm"])
+
+            timer.phases["warm (best)"] = min(warm_runs)
+
+            self.stdout.write(f"{path} ({len(cold)} rows)")
+            timer.report(self.stdout)
+
+            speedup = timer.phases["cold"] / timer.phases["warm (best)"]
+
+            if cold.equals(warm):
+                self.stdout.write(self.style.SUCCESS(f"  warm load {speedup:.0f}x faster, same frame"))
+            else:
+                self.stdout.write(self.style.WARNING("  cached frame differs from the parsed workbook"))
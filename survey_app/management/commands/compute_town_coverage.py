@@ -0,0 +1,77 @@
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from survey_app.coverage import brute_force_nearest, compute_coverage, load_towns
+from survey_app.spatial import station_index
+from survey_app.timing import Timer
+
+
+class Command(BaseCommand):
+
+    help = "Compute nearest station / approved survey distance for every Town (TownCoverage)"
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            "--benchmark",
+            action="store_true",
+            help="Time each phase without saving and compare with a brute-force scan"
+        )
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+
+        if options["benchmark"]:
+            return self.benchmark(options["repeat"])
+
+        result = compute_coverage()
+
+        self.report(result)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Coverage saved for {result['towns']} towns"
+        ))
+
+    def report(self, result):
+
+        self.stdout.write(
+            f"towns={result['towns']} stations={result['stations']} "
+            f"approved_surveys={result['approved_surveys']}"
+        )
+
+        for phase, seconds in result["timings"].items():
+            self.stdout.write(f"  {phase:<16} {seconds * 1000:10.1f} ms")
+
+    def benchmark(self, repeat):
+
+        # warm up (loads the station index once)
+        compute_coverage(save=False)
+
+        runs = [compute_coverage(save=False, timer=Timer()) for _ in range(repeat)]
+        best = min(runs, key=lambda r: sum(r["timings"].values()))
+
+        self.report(best)
+
+        _, lats, lons = load_towns()
+        stations = station_index()
+
+        timer = Timer()
+
+        with timer("grid"):
+            grid_idx, _ = stations.nearest_arrays(lats, lons)
+
+        with timer("brute_force"):
+            brute_idx, _ = brute_force_nearest(stations, lats, lons)
+
+        grid_ms = timer.phases["grid"] * 1000
+        brute_ms = timer.phases["brute_force"] * 1000
+
+        self.stdout.write(
+            f"nearest station, {len(lats)} towns x {len(stations)} stations: "
+            f"grid {grid_ms:.1f} ms, brute force {brute_ms:.1f} ms"
+        )
+
+        if not np.array_equal(grid_idx, brute_idx):
+            self.stdout.write(self.style.WARNING("Grid and brute force results differ"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Grid and brute force agree"))
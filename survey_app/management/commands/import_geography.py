@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from survey_app.importers import BATCH_SIZE, GEOGRAPHY_SOURCE, format_changes, import_geography
+from survey_app.timing import Timer
+
+
+class Command(BaseCommand):
+
+    help = "Bulk import State/District/SubDistrict/Town from the CORS densification workbook"
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("path", nargs="?", default=str(GEOGRAPHY_SOURCE))
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--sync", action="store_true",
+                            help="Update rows whose source data changed (by row hash)")
+        parser.add_argument("--delete", action="store_true",
+                            help="With --sync, delete rows that are no longer in the source")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Report what would change and roll everything back")
+        parser.add_argument("--no-cache", action="store_true",
+                            help="Parse the workbook instead of using the cached snapshot")
+
+    def handle(self, *args, **options):
+
+        if options["delete"] and not options["sync"]:
+            raise CommandError("--delete requires --sync")
+
+        timer = Timer()
+
+        result = import_geography(
+            options["path"],
+            batch_size=options["batch_size"],
+            timer=timer,
+            sync=options["sync"],
+            delete=options["delete"],
+            dry_run=options["dry_run"],
+            cache=not options["no_cache"]
+        )
+
+        timer.report(self.stdout)
+
+        changes = format_changes(result["changes"])
+        prefix = "[dry run] " if options["dry_run"] else ""
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Imported {result['rows']} rows ({changes})"
+        ))
@@ -0,0 +1,73 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from survey_app.loadtest import ENDPOINTS, compare
+
+
+class Command(BaseCommand):
+
+    help = "Compare throughput and p99 latency of the sync and async read endpoints under concurrent clients"
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("endpoints", nargs="*", default=list(ENDPOINTS),
+                            help=f"Any of: {', '.join(ENDPOINTS)}")
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument("--duration", type=float, default=10.0,
+                            help="Seconds per endpoint and mode")
+        parser.add_argument("--query", default="",
+                            help="Query string added to every request, e.g. page_size=50")
+        parser.add_argument("--sync-url",
+                            help="Base URL of a WSGI server, e.g. http://127.0.0.1:8000")
+        parser.add_argument("--async-url",
+                            help="Base URL of an ASGI server, e.g. http://127.0.0.1:8001")
+        parser.add_argument("--token", help="API token (with --sync-url / --async-url)")
+        parser.add_argument("--username",
+                            help="Request as this user (in-process runs; token created if missing)")
+
+    def handle(self, *args, **options):
+
+        unknown = [e for e in options["endpoints"] if e not in ENDPOINTS]
+
+        if unknown:
+            raise CommandError(f"Unknown endpoint(s): {unknown}. Choose from {list(ENDPOINTS)}")
+
+        token = options["token"]
+
+        if not token:
+            if not options["username"]:
+                raise CommandError("Give --token or --username")
+
+            user = get_user_model().objects.filter(username=options["username"]).first()
+
+            if user is None:
+                raise CommandError(f"No user {options['username']!r}")
+
+            token = Token.objects.get_or_create(user=user)[0].key
+
+        mode = "HTTP" if options["sync_url"] or options["async_url"] else "in-process"
+
+        self.stdout.write(
+            f"{mode}, {options['concurrency']} clients, {options['duration']:g}s per run\n"
+            f"{'endpoint':<12}{'mode':<7}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+        )
+
+        for endpoint in options["endpoints"]:
+
+            results = compare(
+                endpoint,
+                token,
+                options["concurrency"],
+                options["duration"],
+                sync_url=options["sync_url"],
+                async_url=options["async_url"],
+                query=options["query"]
+            )
+
+            for name, r in results.items():
+                line = (
+                    f"{endpoint:<12}{name:<7}{r['requests']:>9}{r['errors']:>8}"
+                    f"{r['rps']:>9.1f}{r['p50_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['max_ms']:>9.1f}"
+                )
+                self.stdout.write(self.style.WARNING(line) if r["errors"] else line)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from survey_app.rinex import parse_pending
+
+
+class Command(BaseCommand):
+
+    help = "Parse headers and epochs of RINEX files that have no RinexMetadata yet"
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--retry-failed", action="store_true",
+                            help="Parse files whose earlier parse failed again")
+        parser.add_argument("--limit", type=int, default=None)
+
+    def handle(self, *args, **options):
+
+        results = parse_pending(
+            retry_failed=options["retry_failed"],
+            limit=options["limit"]
+        )
+
+        if not results:
+            self.stdout.write("Nothing to parse")
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            ", ".join(f"{state.lower()}={count}" for state, count in results.items())
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from survey_app.images import process_pending
+
+
+class Command(BaseCommand):
+
+    help = "Build WebP thumbnails / previews and EXIF metadata for site photos and polar charts"
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--force", action="store_true",
+                            help="Rebuild images that were already processed")
+        parser.add_argument("--limit", type=int, default=None)
+
+    def handle(self, *args, **options):
+
+        results = process_pending(force=options["force"], limit=options["limit"])
+
+        failed = [m for m in results if m.error]
+
+        for metadata in failed:
+            self.stdout.write(self.style.WARNING(
+                f"{metadata.source_name}: {metadata.error}"
+            ))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {len(results) - len(failed)} images ({len(failed)} failed)"
+        ))
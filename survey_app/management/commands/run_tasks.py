@@ -0,0 +1,53 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from survey_app.tasks import purge_finished, work, worker_name
+
+
+class Command(BaseCommand):
+
+    help = "Run queued background tasks (OTP mail, image renditions, RINEX parsing)"
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--burst", action="store_true",
+                            help="Exit once no task is due instead of polling")
+        parser.add_argument("--max-tasks", type=int, default=None,
+                            help="Exit after running this many tasks")
+        parser.add_argument("--sleep", type=float, default=1.0,
+                            help="Seconds to wait between polls of an empty queue")
+        parser.add_argument("--purge", action="store_true",
+                            help="First delete succeeded tasks older than TASK_KEEP_DAYS")
+
+    def handle(self, *args, **options):
+
+        if options["purge"]:
+            deleted = purge_finished(settings.TASK_KEEP_DAYS)
+            self.stdout.write(f"Purged {deleted} finished tasks")
+
+        stopping = []
+
+        # finish the running task, then exit
+        def stop(signum, frame):
+            stopping.append(signum)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        worker = worker_name()
+        self.stdout.write(f"Worker {worker} started")
+
+        results = work(
+            worker=worker,
+            burst=options["burst"],
+            max_tasks=options["max_tasks"],
+            sleep=options["sleep"],
+            should_stop=lambda: bool(stopping)
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            ", ".join(f"{state.lower()}={count}" for state, count in results.items())
+            or "No tasks run"
+        ))
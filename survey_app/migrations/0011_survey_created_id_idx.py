@@ -0,0 +1,19 @@
+# Generated by Django 5.2.11 on 2026-10-18 13:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("survey_app", "0010_surveysubsite_noc_surveysubsite_remarks_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="survey",
+            index=models.Index(
+                fields=["-created_at", "id"], name="survey_created_id_idx"
+            ),
+        ),
+    ]
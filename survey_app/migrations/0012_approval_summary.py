@@ -0,0 +1,23 @@
+# Generated by Django 5.2.11 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("survey_app", "0011_survey_created_id_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="survey",
+            name="approval_summary",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name="surveysubsite",
+            name="approval_summary",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
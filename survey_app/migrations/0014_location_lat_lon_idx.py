@@ -0,0 +1,19 @@
+# Generated by Django 5.2.11 on 2026-10-18 13:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("survey_app", "0013_sync_delta_feed"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="surveylocation",
+            index=models.Index(
+                fields=["latitude", "longitude"], name="location_lat_lon_idx"
+            ),
+        ),
+    ]
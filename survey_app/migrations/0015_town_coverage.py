@@ -0,0 +1,53 @@
+# Generated by Django 5.2.11 on 2026-10-18 13:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("survey_app", "0014_location_lat_lon_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TownCoverage",
+            fields=[
+                (
+                    "town",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="coverage",
+                        serialize=False,
+                        to="survey_app.town",
+                    ),
+                ),
+                ("station_distance_km", models.FloatField(blank=True, null=True)),
+                ("survey_distance_km", models.FloatField(blank=True, null=True)),
+                ("gap_km", models.FloatField(blank=True, db_index=True, null=True)),
+                ("computed_at", models.DateTimeField(auto_now=True)),
+                (
+                    "nearest_station",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="survey_app.stationdb",
+                    ),
+                ),
+                (
+                    "nearest_survey",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="survey_app.surveysubsite",
+                    ),
+                ),
+            ],
+        ),
+    ]
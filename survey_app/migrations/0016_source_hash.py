@@ -0,0 +1,23 @@
+# Generated by Django 5.2.11 on 2026-10-18 13:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("survey_app", "0015_town_coverage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stationdb",
+            name="source_hash",
+            field=models.CharField(blank=True, default="", max_length=16),
+        ),
+        migrations.AddField(
+            model_name="town",
+            name="source_hash",
+            field=models.CharField(blank=True, default="", max_length=16),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.11 on 2026-10-18 13:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("survey_app", "0017_rinex_upload"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RinexMetadata",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("source_name", models.CharField(max_length=255, unique=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "Pending"),
+                            ("PARSED", "Parsed"),
+                            ("FAILED", "Failed"),
+                        ],
+                        default="PENDING",
+                        max_length=20,
+                    ),
+                ),
+                ("error", models.TextField(blank=True)),
+                ("version", models.FloatField(blank=True, null=True)),
+                ("file_type", models.CharField(blank=True, max_length=1)),
+                (
+                    "marker_name",
+                    models.CharField(blank=True, db_index=True, max_length=60),
+                ),
+                ("approx_x", models.FloatField(blank=True, null=True)),
+                ("approx_y", models.FloatField(blank=True, null=True)),
+                ("approx_z", models.FloatField(blank=True, null=True)),
+                ("latitude", models.FloatField(blank=True, null=True)),
+                ("longitude", models.FloatField(blank=True, null=True)),
+                ("height", models.FloatField(blank=True, null=True)),
+                ("receiver_type", models.CharField(blank=True, max_length=20)),
+                ("receiver_number", models.CharField(blank=True, max_length=20)),
+                ("antenna_type", models.CharField(blank=True, max_length=20)),
+                ("antenna_number", models.CharField(blank=True, max_length=20)),
+                ("obs_types", models.JSONField(blank=True, default=dict)),
+                (
+                    "first_epoch",
+                    models.DateTimeField(blank=True, db_index=True, null=True),
+                ),
+                ("last_epoch", models.DateTimeField(blank=True, null=True)),
+                ("interval", models.FloatField(blank=True, null=True)),
+                ("epoch_count", models.IntegerField(default=0)),
+                ("gap_count", models.IntegerField(default=0)),
+                ("gap_seconds", models.FloatField(default=0)),
+                ("max_gap_seconds", models.FloatField(blank=True, null=True)),
+                ("parsed_at", models.DateTimeField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "rinex_file",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="metadata",
+                        to="survey_app.rinexfile",
+                    ),
+                ),
+                (
+                    "subsite",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="rinex_metadata",
+                        to="survey_app.surveysubsite",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.2.11 on 2026-10-18 13:44
+
+import survey_app.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("survey_app", "0018_rinex_metadata"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StoredBlob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("digest", models.CharField(max_length=64, unique=True)),
+                ("name", models.CharField(max_length=255)),
+                ("size", models.BigIntegerField()),
+                ("ref_count", models.IntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="rinexfile",
+            name="digest",
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name="rinexfile",
+            name="file",
+            field=models.FileField(
+                blank=True,
+                null=True,
+                storage=survey_app.storage.cas_storage,
+                upload_to="rinex_files/",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="surveyphoto",
+            name="east_photo",
+            field=models.ImageField(
+                storage=survey_app.storage.cas_storage, upload_to="survey_photos/"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="surveyphoto",
+            name="north_photo",
+            field=models.ImageField(
+                storage=survey_app.storage.cas_storage, upload_to="survey_photos/"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="surveyphoto",
+            name="south_photo",
+            field=models.ImageField(
+                storage=survey_app.storage.cas_storage, upload_to="survey_photos/"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="surveyphoto",
+            name="west_photo",
+            field=models.ImageField(
+                storage=survey_app.storage.cas_storage, upload_to="survey_photos/"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="surveyskyvisibility",
+            name="polar_chart_image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=survey_app.storage.cas_storage,
+                upload_to="sky_visibility/",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="surveysubsite",
+            name="rinex_file",
+            field=models.FileField(
+                blank=True,
+                null=True,
+                storage=survey_app.storage.cas_storage,
+                upload_to="rinex_files/",
+            ),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.11 on 2026-10-18 13:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("survey_app", "0019_content_addressed_storage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImageMetadata",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("north", "North photo"),
+                            ("east", "East photo"),
+                            ("south", "South photo"),
+                            ("west", "West photo"),
+                            ("polar_chart", "Polar chart"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("source_name", models.CharField(max_length=255)),
+                ("width", models.IntegerField(blank=True, null=True)),
+                ("height", models.IntegerField(blank=True, null=True)),
+                (
+                    "taken_at",
+                    models.DateTimeField(blank=True, db_index=True, null=True),
+                ),
+                ("latitude", models.FloatField(blank=True, null=True)),
+                ("longitude", models.FloatField(blank=True, null=True)),
+                ("error", models.TextField(blank=True)),
+                ("processed_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "subsite",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="image_metadata",
+                        to="survey_app.surveysubsite",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["latitude", "longitude"], name="image_lat_lon_idx"
+                    )
+                ],
+                "unique_together": {("subsite", "kind")},
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.11 on 2026-10-18 13:59
+
+from django.db import migrations, models
+from django.db.models import Case, Exists, OuterRef, Value, When
+
+
+# same bits as survey_app/completeness.py, frozen for this migration
+SECTION_BITS = [
+    ("SurveyLocation", 1),
+    ("SurveyMonument", 2),
+    ("SurveySkyVisibility", 4),
+    ("SurveyPower", 8),
+    ("SurveyConnectivity", 16),
+]
+PHOTOS = 32
+PHOTO_SIDES = ["north_photo", "east_photo", "south_photo", "west_photo"]
+
+
+def backfill_completeness(apps, schema_editor):
+
+    SurveySubSite = apps.get_model("survey_app", "SurveySubSite")
+    SurveyPhoto = apps.get_model("survey_app", "SurveyPhoto")
+
+    photos = SurveyPhoto.objects.filter(sub_site=OuterRef("pk"))
+
+    for side in PHOTO_SIDES:
+        photos = photos.exclude(**{side: ""})
+
+    parts = [
+        (Exists(apps.get_model("survey_app", name).objects.filter(survey=OuterRef("pk"))), bit)
+        for name, bit in SECTION_BITS
+    ] + [(Exists(photos), PHOTOS)]
+
+    expression = Value(0)
+
+    for exists, bit in parts:
+        expression = expression + Case(When(exists, then=Value(bit)), default=Value(0))
+
+    SurveySubSite.objects.update(completeness=expression)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("survey_app", "0021_task_queue"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="surveysubsite",
+            name="completeness",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_completeness, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="surveysubsite",
+            index=models.Index(
+                condition=models.Q(("completeness__lt", 63)),
+                fields=["survey"],
+                name="subsite_incomplete_idx",
+            ),
+        ),
+    ]
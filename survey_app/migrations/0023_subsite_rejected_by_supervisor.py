@@ -0,0 +1,35 @@
+# Generated by Django 5.2.11 on 2026-10-18 14:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("survey_app", "0022_subsite_completeness"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="surveysubsite",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("DRAFT", "Draft"),
+                    ("SUBMITTED", "Submitted"),
+                    ("SUPERVISOR_APPROVED", "Supervisor Approved"),
+                    ("REJECTED_BY_SUPERVISOR", "Rejected by Supervisor"),
+                    ("DIRECTOR_APPROVED", "Director Approved"),
+                    ("REJECTED_BY_DIRECTOR", "Rejected by Director"),
+                    ("SENT_TO_ZONAL", "Sent to Zonal Chief"),
+                    ("REJECTED_BY_ZONAL", "Rejected by Zonal Chief"),
+                    ("ZONAL_APPROVED", "Zonal Chief Approved"),
+                    ("SENT_TO_GNRB", "Sent to GNRB"),
+                    ("REJECTED_BY_GNRB", "Rejected by GNRB"),
+                    ("FINAL_APPROVED", "Final Approved"),
+                ],
+                default="DRAFT",
+                max_length=30,
+            ),
+        ),
+    ]
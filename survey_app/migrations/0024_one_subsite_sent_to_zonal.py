@@ -0,0 +1,62 @@
+# Generated by Django 5.2.11 on 2026-10-18 14:06
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+# Before this constraint two concurrent "send to zonal" requests could both
+# succeed. Which of the two subsites the director meant cannot be decided
+# here, so the migration stops and lists them; move the extra ones back to
+# DIRECTOR_APPROVED and run it again.
+def check_single_sent_to_zonal(apps, schema_editor):
+
+    SurveySubSite = apps.get_model("survey_app", "SurveySubSite")
+
+    surveys = list(
+        SurveySubSite.objects.filter(status="SENT_TO_ZONAL")
+        .values("survey_id")
+        .annotate(n=Count("id"))
+        .filter(n__gt=1)
+        .values_list("survey_id", flat=True)
+    )
+
+    if not surveys:
+        return
+
+    duplicates = {}
+
+    for survey_id, subsite_id, priority in SurveySubSite.objects.filter(
+        survey_id__in=surveys,
+        status="SENT_TO_ZONAL"
+    ).order_by("survey_id", "priority").values_list("survey_id", "id", "priority"):
+        duplicates.setdefault(survey_id, []).append(f"{subsite_id} (priority {priority})")
+
+    lines = "\n".join(
+        f"  survey {survey_id}: {', '.join(subsites)}"
+        for survey_id, subsites in duplicates.items()
+    )
+
+    raise RuntimeError(
+        "Surveys with more than one subsite in SENT_TO_ZONAL:\n"
+        f"{lines}\n"
+        "Set all but one of them back to DIRECTOR_APPROVED, then migrate again."
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("survey_app", "0023_subsite_rejected_by_supervisor"),
+    ]
+
+    operations = [
+        migrations.RunPython(check_single_sent_to_zonal, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="surveysubsite",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status", "SENT_TO_ZONAL")),
+                fields=("survey",),
+                name="one_subsite_sent_to_zonal",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-18 14:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("survey_app", "0024_one_subsite_sent_to_zonal"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="rinexupload",
+            name="writing_until",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.11 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+# one metadata row per blob: link every RinexFile / subsite using it
+def link_by_name(apps, schema_editor):
+
+    RinexMetadata = apps.get_model("survey_app", "RinexMetadata")
+    RinexFile = apps.get_model("survey_app", "RinexFile")
+    SurveySubSite = apps.get_model("survey_app", "SurveySubSite")
+
+    ids = dict(RinexMetadata.objects.values_list("source_name", "id"))
+
+    RinexMetadata.rinex_files.through.objects.bulk_create([
+        RinexMetadata.rinex_files.through(rinexmetadata_id=ids[name], rinexfile_id=pk)
+        for pk, name in RinexFile.objects.filter(file__in=list(ids)).values_list("id", "file")
+    ], batch_size=1000)
+
+    RinexMetadata.subsites.through.objects.bulk_create([
+        RinexMetadata.subsites.through(rinexmetadata_id=ids[name], surveysubsite_id=pk)
+        for pk, name in SurveySubSite.objects.filter(rinex_file__in=list(ids)).values_list("id", "rinex_file")
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("survey_app", "0025_rinex_upload_writing_until"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="rinexmetadata",
+            name="rinex_file",
+        ),
+        migrations.RemoveField(
+            model_name="rinexmetadata",
+            name="subsite",
+        ),
+        migrations.AddField(
+            model_name="rinexmetadata",
+            name="rinex_files",
+            field=models.ManyToManyField(blank=True, related_name="rinex_metadata", to="survey_app.rinexfile"),
+        ),
+        migrations.AddField(
+            model_name="rinexmetadata",
+            name="subsites",
+            field=models.ManyToManyField(blank=True, related_name="rinex_metadata", to="survey_app.surveysubsite"),
+        ),
+        migrations.RunPython(link_by_name, migrations.RunPython.noop),
+    ]
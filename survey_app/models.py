@@ -60,6 +60,8 @@ import uuid
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 
+from .storage import cas_storage
+
 
 class User(AbstractUser):
     ROLE_CHOICES = [
@@ -148,6 +150,9 @@ class Town(models.Model):
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
 
+    # hash of the source spreadsheet row (see importers.py)
+    source_hash = models.CharField(max_length=16, blank=True, default="")
+
     class Meta:
         unique_together = ("subdistrict", "name")
 
@@ -188,8 +193,18 @@ class Survey(models.Model):
     status = models.CharField(max_length=30, choices=STATUS_CHOICES, default="DRAFT")
     remarks = models.TextField(blank=True, null=True)
 
+    # latest decision per approval level, kept in sync by approvals.record_approvals
+    # {"1": {"decision", "approver_id", "approver_username", "approver_name", "at"}}
+    approval_summary = models.JSONField(default=dict, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # keyset pagination order (-created_at, id)
+            models.Index(fields=["-created_at", "id"], name="survey_created_id_idx"),
+        ]
 
     def __str__(self):
         return f"{self.station.name} - {self.status}"
@@ -221,6 +236,7 @@ class SurveySubSite(models.Model):
     ("DRAFT", "Draft"),
     ("SUBMITTED", "Submitted"),
     ("SUPERVISOR_APPROVED", "Supervisor Approved"),
+    ("REJECTED_BY_SUPERVISOR", "Rejected by Supervisor"),
     ("DIRECTOR_APPROVED", "Director Approved"),
     ("REJECTED_BY_DIRECTOR", "Rejected by Director"),
     ("SENT_TO_ZONAL", "Sent to Zonal Chief"),
@@ -239,6 +255,7 @@ class SurveySubSite(models.Model):
 
     rinex_file = models.FileField(
         upload_to="rinex_files/",
+        storage=cas_storage,
         null=True,
         blank=True
     )
@@ -247,10 +264,33 @@ class SurveySubSite(models.Model):
     remarks = models.TextField(blank=True,  null=True)
     noc  = models.FileField(upload_to="noc_documents/", null=True, blank=True)
 
+    # same shape as Survey.approval_summary, for decisions on this subsite
+    approval_summary = models.JSONField(default=dict, blank=True)
+
+    # one bit per finished section (see completeness.py); 63 = all done
+    completeness = models.PositiveSmallIntegerField(default=0)
+
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ["priority", "created_at"]
+        constraints = [
+            # a survey has at most one subsite with the zonal chief
+            models.UniqueConstraint(
+                fields=["survey"],
+                condition=models.Q(status="SENT_TO_ZONAL"),
+                name="one_subsite_sent_to_zonal"
+            ),
+        ]
+        indexes = [
+            # only subsites with sections still missing
+            models.Index(
+                fields=["survey"],
+                condition=models.Q(completeness__lt=63),
+                name="subsite_incomplete_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.location} (Priority {self.priority})"
@@ -311,6 +351,14 @@ class SurveyLocation(models.Model):
     district = models.CharField(max_length=100)
     state = models.CharField(max_length=100)
     
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # bbox filter of the map export
+            models.Index(fields=["latitude", "longitude"], name="location_lat_lon_idx"),
+        ]
+
     def __str__(self):
         return f"Location for {self.survey.location}"
 
@@ -358,6 +406,8 @@ class SurveyMonument(models.Model):
         blank=True
     )
 
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
     def __str__(self):
         return f"Monument for {self.survey.location}"
 
@@ -395,6 +445,7 @@ class SurveySkyVisibility(models.Model):
 
     polar_chart_image = models.ImageField(
         upload_to="sky_visibility/",
+        storage=cas_storage,
         null=True,
         blank=True
     )
@@ -414,6 +465,8 @@ class SurveySkyVisibility(models.Model):
 
     remarks = models.TextField(blank=True)
 
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
     def __str__(self):
         return f"Sky Visibility for {self.survey.location}"
 
@@ -439,6 +492,8 @@ class SurveyPower(models.Model):
 
     solar_exposure_hours = models.IntegerField()
 
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
     def __str__(self):
         return f"Power Details for {self.survey.location}"
 
@@ -480,6 +535,8 @@ class SurveyConnectivity(models.Model):
 
     remarks = models.TextField(blank=True)
 
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
     def __str__(self):
         return f"Connectivity Details for {self.survey.location}"
 
@@ -491,15 +548,57 @@ class SurveyPhoto(models.Model):
         on_delete=models.CASCADE,
         related_name="photos"
     )
-    north_photo = models.ImageField(upload_to="survey_photos/" )
-    east_photo = models.ImageField(upload_to="survey_photos/" )
-    south_photo = models.ImageField(upload_to="survey_photos/" )
-    west_photo = models.ImageField(upload_to="survey_photos/")
+    north_photo = models.ImageField(upload_to="survey_photos/", storage=cas_storage)
+    east_photo = models.ImageField(upload_to="survey_photos/", storage=cas_storage)
+    south_photo = models.ImageField(upload_to="survey_photos/", storage=cas_storage)
+    west_photo = models.ImageField(upload_to="survey_photos/", storage=cas_storage)
     captured_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def  __str__(self):
         return f"Photos of {self.sub_site.location}"
 
+
+# per-image EXIF summary; thumbnails / previews live in renditions/ (see images.py)
+class ImageMetadata(models.Model):
+
+    KIND_CHOICES = [
+        ("north", "North photo"),
+        ("east", "East photo"),
+        ("south", "South photo"),
+        ("west", "West photo"),
+        ("polar_chart", "Polar chart"),
+    ]
+
+    subsite = models.ForeignKey(
+        SurveySubSite,
+        on_delete=models.CASCADE,
+        related_name="image_metadata"
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+
+    # storage name of the original the renditions were made from
+    source_name = models.CharField(max_length=255)
+
+    width = models.IntegerField(null=True, blank=True)
+    height = models.IntegerField(null=True, blank=True)
+
+    taken_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+
+    error = models.TextField(blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ("subsite", "kind")
+        indexes = [
+            models.Index(fields=["latitude", "longitude"], name="image_lat_lon_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} of {self.subsite_id}"
+
 class SurveyApproval(models.Model):
 
     LEVEL_CHOICES = [
@@ -536,7 +635,25 @@ class SurveyApproval(models.Model):
 
     remarks = models.TextField()
 
-    approved_at = models.DateTimeField(auto_now_add=True)
+    approved_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+# Row deleted from the survey tree, kept so the delta feed can tell
+# clients what to drop. survey/surveyor/zone are copied at delete time
+# because the parent rows may be gone by the time the feed is read.
+class SyncTombstone(models.Model):
+
+    model = models.CharField(max_length=30)
+    object_id = models.CharField(max_length=64)
+
+    survey_id = models.UUIDField(null=True, blank=True)
+    surveyor_id = models.UUIDField(null=True, blank=True)
+    zone = models.CharField(max_length=20, blank=True)
+
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.model} {self.object_id} deleted"
 
 
 
@@ -545,10 +662,14 @@ class RinexFile(models.Model):
 
     file = models.FileField(
         upload_to="rinex_files/",
+        storage=cas_storage,
         null=True,
         blank=True
     )
 
+    # sha256 of the file, for duplicate checks
+    digest = models.CharField(max_length=64, blank=True, db_index=True)
+
     uploaded_by = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -562,6 +683,139 @@ class RinexFile(models.Model):
         return f"RINEX File {self.id}"
 
 
+# one stored file per sha256, shared by every FileField that saved it (see storage.py)
+class StoredBlob(models.Model):
+    digest = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} (x{self.ref_count})"
+
+
+# chunked / resumable upload in progress (see uploads.py)
+class RinexUpload(models.Model):
+
+    STATUS_CHOICES = [
+        ("UPLOADING", "Uploading"),
+        ("COMPLETED", "Completed"),
+        ("FAILED", "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    uploaded_by = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="rinex_uploads"
+    )
+
+    # optional: commit also sets subsite.rinex_file
+    subsite = models.ForeignKey(
+        SurveySubSite,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="rinex_uploads"
+    )
+
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+
+    # bytes received so far; the next chunk must start here
+    offset = models.BigIntegerField(default=0)
+
+    # set while a request is writing a chunk (see uploads.append_chunk);
+    # a lease that has run out belongs to a request that died
+    writing_until = models.DateTimeField(null=True, blank=True)
+
+    # storage name of the partial file, then of the committed file
+    path = models.CharField(max_length=255)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="UPLOADING")
+
+    rinex_file = models.OneToOneField(
+        RinexFile,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="upload"
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+
+# header / epoch summary of a stored RINEX file (see rinex.py)
+class RinexMetadata(models.Model):
+
+    STATUS_CHOICES = [
+        ("PENDING", "Pending"),
+        ("PARSED", "Parsed"),
+        ("FAILED", "Failed"),
+    ]
+
+    # storage name of the parsed file; content-addressed, so one blob
+    source_name = models.CharField(max_length=255, unique=True)
+
+    # every RinexFile / subsite currently pointing at that blob
+    rinex_files = models.ManyToManyField(
+        RinexFile,
+        blank=True,
+        related_name="rinex_metadata"
+    )
+
+    subsites = models.ManyToManyField(
+        SurveySubSite,
+        blank=True,
+        related_name="rinex_metadata"
+    )
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="PENDING")
+    error = models.TextField(blank=True)
+
+    version = models.FloatField(null=True, blank=True)
+    file_type = models.CharField(max_length=1, blank=True)
+
+    marker_name = models.CharField(max_length=60, blank=True, db_index=True)
+
+    approx_x = models.FloatField(null=True, blank=True)
+    approx_y = models.FloatField(null=True, blank=True)
+    approx_z = models.FloatField(null=True, blank=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    height = models.FloatField(null=True, blank=True)
+
+    receiver_type = models.CharField(max_length=20, blank=True)
+    receiver_number = models.CharField(max_length=20, blank=True)
+    antenna_type = models.CharField(max_length=20, blank=True)
+    antenna_number = models.CharField(max_length=20, blank=True)
+
+    # {"G": ["C1C", "L1C", ...], ...}
+    obs_types = models.JSONField(default=dict, blank=True)
+
+    first_epoch = models.DateTimeField(null=True, blank=True, db_index=True)
+    last_epoch = models.DateTimeField(null=True, blank=True)
+    interval = models.FloatField(null=True, blank=True)
+    epoch_count = models.IntegerField(default=0)
+
+    gap_count = models.IntegerField(default=0)
+    gap_seconds = models.FloatField(default=0)
+    max_gap_seconds = models.FloatField(null=True, blank=True)
+
+    parsed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.marker_name or self.source_name} ({self.status})"
+
+
 
 
 
@@ -619,6 +873,9 @@ class Stationdb(models.Model):
     longitude = models.FloatField()
     height = models.FloatField(null=True, blank=True)
 
+    # hash of the source spreadsheet row (see importers.py)
+    source_hash = models.CharField(max_length=16, blank=True, default="")
+
     class Meta:
         unique_together = ("district", "name")
         db_table = "station"
@@ -628,6 +885,46 @@ class Stationdb(models.Model):
 
 
 
+# --------------------
+# Densification coverage (see coverage.py)
+# --------------------
+
+class TownCoverage(models.Model):
+
+    town = models.OneToOneField(
+        Town,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="coverage"
+    )
+
+    nearest_station = models.ForeignKey(
+        Stationdb,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+"
+    )
+    station_distance_km = models.FloatField(null=True, blank=True)
+
+    nearest_survey = models.ForeignKey(
+        SurveySubSite,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+"
+    )
+    survey_distance_km = models.FloatField(null=True, blank=True)
+
+    # distance to the nearest of the two; larger = bigger gap
+    gap_km = models.FloatField(null=True, blank=True, db_index=True)
+
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Coverage for {self.town.name}: {self.gap_km} km"
+
+
 import random
 from django.utils import timezone
 from datetime import timedelta
@@ -639,7 +936,58 @@ class PasswordResetOTP(models.Model):
 
     def is_expired(self):
         return self.created_at < timezone.now() - timedelta(minutes=10)
-    
+
+
+# background job run by "python manage.py run_tasks" (see tasks.py)
+class Task(models.Model):
+
+    STATUS_CHOICES = [
+        ("QUEUED", "Queued"),
+        ("RUNNING", "Running"),
+        ("SUCCEEDED", "Succeeded"),
+        ("FAILED", "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    # dotted path of the task function, e.g. "survey_app.tasks.send_otp_mail"
+    name = models.CharField(max_length=200)
+    kwargs = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="QUEUED")
+
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+
+    # not picked up before this; pushed back after each failed attempt
+    run_after = models.DateTimeField(default=timezone.now)
+
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    # worker holding the task while RUNNING
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="tasks"
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_after"], name="task_status_run_after_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
     
 # class  Noc(models.Model):
 #     survey = models.ForeignKey(Survey, on_delete=models.CASCADE)
@@ -0,0 +1,132 @@
+import base64
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework import serializers
+
+
+# ------------------------------------------------
+# KEYSET (CURSOR) PAGINATION
+# ------------------------------------------------
+# Orders on (-created_at, id) and continues from the last row of the
+# previous page instead of using OFFSET, so page N costs the same as page 1.
+#
+# Opt-in: only requests with page_size or cursor get pages and the
+# {page_size, next_cursor, next, results} envelope. Without either the
+# response stays the original bare list of every row, so existing clients
+# keep working until they move to cursors.
+
+class KeysetPaginator:
+
+    ordering = ("-created_at", "id")
+
+    def __init__(self, request, default_size=None, max_size=None):
+
+        self.request = request
+        # DRF Request or a plain HttpRequest (async_views.py)
+        self.params = getattr(request, "query_params", request.GET)
+        self.default_size = default_size or getattr(settings, "SURVEY_PAGE_SIZE", 50)
+        self.max_size = max_size or getattr(settings, "SURVEY_MAX_PAGE_SIZE", 200)
+
+        self.enabled = "page_size" in self.params or "cursor" in self.params
+
+        self.page_size = self._page_size()
+        self.cursor = self._decode(self.params.get("cursor"))
+
+    def _page_size(self):
+
+        value = self.params.get("page_size")
+
+        if value is None:
+            return self.default_size
+
+        try:
+            value = int(value)
+        except ValueError:
+            raise serializers.ValidationError({"page_size": "Must be integer"})
+
+        if value <= 0:
+            raise serializers.ValidationError({"page_size": "Must be greater than 0"})
+
+        return min(value, self.max_size)
+
+    @staticmethod
+    def encode(obj):
+
+        raw = json.dumps({
+            "c": obj.created_at.isoformat(),
+            "i": str(obj.id),
+        })
+
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def _decode(token):
+
+        if not token:
+            return None
+
+        try:
+            raw = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+            return datetime.fromisoformat(raw["c"]), raw["i"]
+        except (ValueError, KeyError, TypeError):
+            raise serializers.ValidationError({"cursor": "Invalid cursor"})
+
+    def _window(self, queryset):
+
+        queryset = queryset.order_by(*self.ordering)
+
+        if not self.enabled:
+            return queryset
+
+        if self.cursor:
+            created_at, last_id = self.cursor
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) |
+                Q(created_at=created_at, id__gt=last_id)
+            )
+
+        # fetch one extra row to know if there is a next page
+        return queryset[:self.page_size + 1]
+
+    def _page(self, rows):
+
+        if not self.enabled:
+            self.has_next, self.next_cursor = False, None
+            return rows
+
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        self.next_cursor = self.encode(rows[-1]) if self.has_next else None
+
+        return rows
+
+    def paginate(self, queryset):
+        return self._page(list(self._window(queryset)))
+
+    async def apaginate(self, queryset):
+        return self._page([row async for row in self._window(queryset)])
+
+    def get_response_data(self, results):
+
+        if not self.enabled:
+            return results
+
+        next_url = None
+
+        if self.next_cursor:
+            params = self.params.copy()
+            params["cursor"] = self.next_cursor
+            next_url = self.request.build_absolute_uri(
+                f"{self.request.path}?{params.urlencode()}"
+            )
+
+        return {
+            "page_size": self.page_size,
+            "next_cursor": self.next_cursor,
+            "next": next_url,
+            "results": results,
+        }
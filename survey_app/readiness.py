@@ -0,0 +1,93 @@
+from collections import Counter
+
+from .completeness import photos_exist, section_exists
+from .models import (
+    SurveyConnectivity,
+    SurveyLocation,
+    SurveyMonument,
+    SurveyPower,
+    SurveySkyVisibility,
+    SurveySubSite,
+)
+
+
+# ------------------------------------------------
+# SUBMIT READINESS
+# ------------------------------------------------
+# Which sections each subsite of a survey still lacks, plus duplicate
+# priorities, read with one query: the subsites annotated with an EXISTS
+# subquery per one-to-one section (the same subqueries that recompute the
+# completeness mask, completeness.py). Used by the readiness endpoint and by
+# SurveySubmitAPI before it changes any status.
+
+# annotation -> (section model, label in "missing")
+SECTIONS = {
+    "has_location": (SurveyLocation, "Location"),
+    "has_monument": (SurveyMonument, "Monument"),
+    "has_sky_visibility": (SurveySkyVisibility, "Sky Visibility"),
+    "has_power": (SurveyPower, "Power"),
+    "has_connectivity": (SurveyConnectivity, "Connectivity"),
+}
+
+def readiness_rows(survey):
+
+    return SurveySubSite.objects.filter(survey=survey).annotate(
+        **{name: section_exists(model) for name, (model, _) in SECTIONS.items()},
+        has_photos=photos_exist(),
+        has_all_photos=photos_exist(all_sides=True),
+    ).order_by("priority", "created_at").values(
+        "id", "location", "priority", *SECTIONS, "has_photos", "has_all_photos"
+    )
+
+
+def _missing(row):
+
+    missing = [label for name, (_, label) in SECTIONS.items() if not row[name]]
+
+    if not row["has_photos"]:
+        missing.append("Photos")
+    elif not row["has_all_photos"]:
+        missing.append("All 4 directional photos required")
+
+    return missing
+
+
+def survey_readiness(survey):
+
+    rows = list(readiness_rows(survey))
+
+    priorities = Counter(row["priority"] for row in rows)
+
+    subsites = []
+
+    for row in rows:
+
+        missing = _missing(row)
+
+        subsites.append({
+            "subsite_id": str(row["id"]),
+            "subsite_name": row["location"],
+            "priority": row["priority"],
+            "sections": {
+                name[len("has_"):]: row[name]
+                for name in [*SECTIONS, "has_photos", "has_all_photos"]
+            },
+            "missing": missing,
+            "ready": not missing,
+        })
+
+    duplicates = sorted(p for p, count in priorities.items() if count > 1)
+    incomplete = [
+        {key: s[key] for key in ("subsite_id", "subsite_name", "missing")}
+        for s in subsites if not s["ready"]
+    ]
+
+    return {
+        "survey_id": str(survey.id),
+        "status": survey.status,
+        "ready": bool(rows) and not duplicates and not incomplete,
+        "subsite_count": len(rows),
+        "duplicate_priorities": duplicates,
+        "incomplete_subsites": incomplete,
+        "subsites": subsites,
+    }
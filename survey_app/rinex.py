@@ -0,0 +1,381 @@
+import gzip
+import math
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import RinexFile, RinexMetadata, SurveySubSite
+
+
+# a step longer than this many intervals counts as a gap
+GAP_FACTOR = 1.5
+
+WGS84_A = 6378137.0
+WGS84_E2 = 6.69437999014e-3
+
+
+class RinexError(ValueError):
+    pass
+
+
+# ------------------------------------------------
+# STREAMING RINEX PARSER (v2.x / v3.x)
+# ------------------------------------------------
+# Reads line by line: the header is parsed by its column 61-80 labels, then
+# observation files are scanned epoch by epoch without keeping the records.
+# Epoch steps are counted in a Counter (a few distinct values), so interval
+# and gap statistics need no list of epochs. Navigation/meteo files only
+# get their header parsed.
+
+def _label(line):
+    return line[60:80].strip()
+
+
+def _float(text):
+
+    try:
+        return float(text.replace("D", "E"))
+    except ValueError:
+        return None
+
+
+def _int(text, default=0):
+
+    try:
+        return int(text)
+    except ValueError:
+        return default
+
+
+def _epoch(year, month, day, hour, minute, second):
+
+    if year < 100:
+        year += 2000 if year < 80 else 1900
+
+    return datetime(year, month, day, hour, minute, tzinfo=dt_timezone.utc) + timedelta(seconds=second)
+
+
+def _header_time(line):
+
+    parts = line[:43].split()
+
+    if len(parts) < 6:
+        return None
+
+    return _epoch(
+        int(parts[0]), int(parts[1]), int(parts[2]),
+        int(parts[3]), int(parts[4]), float(parts[5])
+    )
+
+
+def ecef_to_geodetic(x, y, z):
+
+    lon = math.atan2(y, x)
+    p = math.hypot(x, y)
+    lat = math.atan2(z, p * (1 - WGS84_E2))
+
+    for _ in range(5):
+        n = WGS84_A / math.sqrt(1 - WGS84_E2 * math.sin(lat) ** 2)
+        height = p / math.cos(lat) - n
+        lat = math.atan2(z, p * (1 - WGS84_E2 * n / (n + height)))
+
+    return math.degrees(lat), math.degrees(lon), height
+
+
+def _read_header(lines):
+
+    header = {"obs_types": {}}
+    obs_system = None
+
+    first = next(lines, "")
+
+    if _label(first) != "RINEX VERSION / TYPE":
+        raise RinexError("Not a RINEX file (no RINEX VERSION / TYPE line)")
+
+    header["version"] = _float(first[:9].strip())
+    header["file_type"] = first[20:21]
+    header["system"] = first[40:41].strip() or "G"
+
+    if header["version"] is None:
+        raise RinexError("Unreadable RINEX version")
+
+    for line in lines:
+
+        label = _label(line)
+
+        if label == "END OF HEADER":
+            return header
+
+        if label == "MARKER NAME":
+            header["marker_name"] = line[:60].strip()
+
+        elif label == "APPROX POSITION XYZ":
+            header["approx_position"] = [_float(line[i:i + 14]) for i in (0, 14, 28)]
+
+        elif label == "REC # / TYPE / VERS":
+            header["receiver_number"] = line[:20].strip()
+            header["receiver_type"] = line[20:40].strip()
+            header["receiver_version"] = line[40:60].strip()
+
+        elif label == "ANT # / TYPE":
+            header["antenna_number"] = line[:20].strip()
+            header["antenna_type"] = line[20:40].strip()
+
+        elif label == "# / TYPES OF OBSERV":
+            # v2: one list for every system, 9 types per line
+            types = header["obs_types"].setdefault(header["system"], [])
+            types.extend(line[6:60].split())
+
+        elif label == "SYS / # / OBS TYPES":
+            # v3: per system, continuation lines leave the system blank
+            if line[0] != " ":
+                obs_system = line[0]
+            types = header["obs_types"].setdefault(obs_system, [])
+            types.extend(line[7:60].split())
+
+        elif label == "INTERVAL":
+            header["interval"] = _float(line[:10].strip())
+
+        elif label == "TIME OF FIRST OBS":
+            header["time_of_first_obs"] = _header_time(line)
+
+        elif label == "TIME OF LAST OBS":
+            header["time_of_last_obs"] = _header_time(line)
+
+    raise RinexError("Missing END OF HEADER")
+
+
+def _epochs_v3(lines):
+
+    for line in lines:
+
+        if not line.startswith(">"):
+            continue
+
+        # flags 2-5 are events and 6 cycle slips; the records after them do
+        # not start with ">"
+        if _int(line[31:32]) > 1:
+            continue
+
+        yield _epoch(
+            int(line[2:6]), int(line[7:9]), int(line[10:12]),
+            int(line[13:15]), int(line[16:18]), float(line[18:29])
+        )
+
+
+def _epochs_v2(lines, obs_count):
+
+    # observation lines per satellite (5 observations per 80-column line)
+    per_sat = max(1, math.ceil(obs_count / 5))
+
+    for line in lines:
+
+        flag = _int(line[28:29])
+        count = _int(line[29:32])
+
+        if 1 < flag < 6:
+            # special records: the next `count` lines are header lines
+            for _ in range(count):
+                next(lines, None)
+            continue
+
+        if not line[:26].strip():
+            continue
+
+        # satellite list continues on extra lines after 12 satellites
+        extra = max(0, math.ceil(count / 12) - 1) + count * per_sat
+
+        for _ in range(extra):
+            next(lines, None)
+
+        # flag 6: cycle slips of an epoch already read, in observation format
+        if flag == 6:
+            continue
+
+        yield _epoch(
+            int(line[1:3]), int(line[4:6]), int(line[7:9]),
+            int(line[10:12]), int(line[13:15]), float(line[15:26])
+        )
+
+
+def _open_lines(path):
+
+    opener = gzip.open if str(path).endswith(".gz") else open
+
+    f = opener(path, "rt", encoding="latin-1", newline=None)
+
+    return f, (line.rstrip("\r\n") for line in f)
+
+
+def parse_rinex(path):
+
+    f, lines = _open_lines(path)
+
+    with f:
+        header = _read_header(lines)
+
+        stats = {
+            "first_epoch": None,
+            "last_epoch": None,
+            "epoch_count": 0,
+        }
+        steps = Counter()
+
+        if header["file_type"] == "O":
+
+            if header["version"] >= 3:
+                epochs = _epochs_v3(lines)
+            else:
+                types = header["obs_types"].get(header["system"], [])
+                epochs = _epochs_v2(lines, len(types))
+
+            previous = None
+
+            for epoch in epochs:
+
+                if previous is not None:
+                    steps[round((epoch - previous).total_seconds(), 3)] += 1
+                else:
+                    stats["first_epoch"] = epoch
+
+                previous = epoch
+                stats["epoch_count"] += 1
+
+            stats["last_epoch"] = previous
+
+    # the header interval wins; otherwise the most common step
+    interval = header.get("interval")
+    positive = {step: n for step, n in steps.items() if step > 0}
+
+    if not interval and positive:
+        interval = max(positive, key=lambda step: (positive[step], -step))
+
+    gaps = {
+        step: n for step, n in positive.items()
+        if interval and step > interval * GAP_FACTOR
+    }
+
+    stats.update({
+        "interval": interval,
+        "gap_count": sum(gaps.values()),
+        "gap_seconds": sum((step - interval) * n for step, n in gaps.items()) if gaps else 0.0,
+        "max_gap_seconds": max(gaps) if gaps else None,
+    })
+
+    header.update(stats)
+
+    if stats["first_epoch"] is None:
+        header["first_epoch"] = header.get("time_of_first_obs")
+        header["last_epoch"] = header.get("time_of_last_obs")
+
+    return header
+
+
+# ------------------------------------------------
+# METADATA INDEX
+# ------------------------------------------------
+# One RinexMetadata row per stored file (source_name = storage name). Files
+# are content-addressed (storage.py), so several RinexFiles and subsites can
+# share a name; all of them are linked (rinex_files / subsites, kept current
+# by signals.py). Parsing runs outside the request path:
+# python manage.py parse_rinex
+
+def _fields(parsed):
+
+    position = parsed.get("approx_position") or [None, None, None]
+    lat = lon = height = None
+
+    if None not in position and any(position):
+        lat, lon, height = ecef_to_geodetic(*position)
+
+    return {
+        "version": parsed["version"],
+        "file_type": parsed["file_type"],
+        "marker_name": parsed.get("marker_name", ""),
+        "approx_x": position[0],
+        "approx_y": position[1],
+        "approx_z": position[2],
+        "latitude": lat,
+        "longitude": lon,
+        "height": height,
+        "receiver_type": parsed.get("receiver_type", ""),
+        "receiver_number": parsed.get("receiver_number", ""),
+        "antenna_type": parsed.get("antenna_type", ""),
+        "antenna_number": parsed.get("antenna_number", ""),
+        "obs_types": parsed["obs_types"],
+        "first_epoch": parsed["first_epoch"],
+        "last_epoch": parsed["last_epoch"],
+        "interval": parsed["interval"],
+        "epoch_count": parsed["epoch_count"],
+        "gap_count": parsed["gap_count"],
+        "gap_seconds": parsed["gap_seconds"],
+        "max_gap_seconds": parsed["max_gap_seconds"],
+    }
+
+
+def pending_names(retry_failed=False, limit=None):
+
+    indexed = RinexMetadata.objects.all()
+
+    if retry_failed:
+        indexed = indexed.exclude(status="FAILED")
+
+    indexed = set(indexed.values_list("source_name", flat=True))
+
+    names = set(RinexFile.objects.exclude(file="").exclude(file__isnull=True).values_list("file", flat=True))
+    names |= set(SurveySubSite.objects.exclude(rinex_file="").exclude(rinex_file__isnull=True).values_list("rinex_file", flat=True))
+
+    pending = sorted(names - indexed)
+
+    return pending[:limit] if limit else pending
+
+
+def index_file(name):
+
+    metadata, _ = RinexMetadata.objects.get_or_create(source_name=name)
+
+    metadata.rinex_files.set(RinexFile.objects.filter(file=name))
+    metadata.subsites.set(SurveySubSite.objects.filter(rinex_file=name))
+
+    try:
+        parsed = parse_rinex(default_storage.path(name))
+    except (OSError, RinexError, ValueError) as e:
+        metadata.status = "FAILED"
+        metadata.error = str(e)[:1000]
+    else:
+        for field, value in _fields(parsed).items():
+            setattr(metadata, field, value)
+        metadata.status = "PARSED"
+        metadata.error = ""
+
+    metadata.parsed_at = timezone.now()
+    metadata.save()
+
+    return metadata
+
+
+def parse_pending(retry_failed=False, limit=None):
+
+    results = Counter()
+
+    for name in pending_names(retry_failed, limit):
+        results[index_file(name).status] += 1
+
+    return dict(results)
+
+
+def metadata_scope(user):
+
+    if user.role == "ADMIN":
+        return Q()
+
+    if user.role == "SURVEYOR":
+        return Q(rinex_files__uploaded_by=user) | Q(subsites__survey__surveyor=user)
+
+    if user.role in ["SUPERVISOR", "DIRECTOR", "ZONAL_CHIEF", "GNRB"]:
+        return Q(subsites__survey__surveyor__zone=user.zone) | Q(rinex_files__uploaded_by__zone=user.zone)
+
+    return None
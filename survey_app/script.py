@@ -61,70 +61,21 @@
 
 # print("✅ All data imported successfully with duplicate numbering")
 import os
+import sys
+
 import django
-import pandas as pd
+
+# ==============================
+# DJANGO SETUP
+# ==============================
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "s_r_a_a_b.settings")
 django.setup()
 
-from survey_app.models import State, District, SubDistrict, Town
-
-file_path = r"C:\Users\dell\Downloads\survey\Priority 1_CORS Densification.xlsx"
-
-df = pd.read_excel(file_path)
-df.columns = df.columns.str.strip()
-
-for _, row in df.iterrows():
-
-    state_name = str(row["STATE_UT"]).strip()
-    district_name = str(row["DISTRICT"]).strip()
-    subdistrict_name = str(row["SUBDISTRICT"]).strip()
-    town_name = str(row["TOWN"]).strip()
-
-    town_lat = row["Lat"]
-    town_lon = row["Long"]
-
-    # 1️⃣ State
-    state_obj, _ = State.objects.get_or_create(name=state_name)
-
-    # 2️⃣ District numbering
-    district_count = District.objects.filter(
-        state=state_obj,
-        name__startswith=district_name
-    ).count()
-
-    district_final_name = (
-        f"{district_name} {district_count + 1}"
-        if district_count > 0 else district_name
-    )
-
-    district_obj, _ = District.objects.get_or_create(
-        state=state_obj,
-        name=district_final_name
-    )
-
-    # 3️⃣ SubDistrict
-    subdistrict_obj, _ = SubDistrict.objects.get_or_create(
-        district=district_obj,
-        name=subdistrict_name
-    )
-
-    # 4️⃣ Town numbering
-    town_count = Town.objects.filter(
-        subdistrict=subdistrict_obj,
-        base_name__startswith=town_name
-    ).count()
-
-    town_final_name = (
-        f"{town_name} {town_count + 1}"
-        if town_count > 0 else town_name
-    )
+from django.core.management import call_command
 
-    Town.objects.create(
-        subdistrict=subdistrict_obj,
-        base_name=town_final_name,
-        latitude=town_lat,
-        longitude=town_lon
-    )
+# The row-by-row import above was replaced by a bulk management command:
+#     python manage.py import_geography [path/to/workbook.xlsx]
 
-print("✅ All data imported successfully with duplicate numbering")
+if __name__ == "__main__":
+    call_command("import_geography", *sys.argv[1:])
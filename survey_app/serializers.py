@@ -1,5 +1,11 @@
+import os
+
+from django.conf import settings
 from rest_framework import serializers # type: ignore
 from .models import *
+from .spatial import station_index
+from .images import rendition_url, wants_originals
+from .completeness import missing_sections, sections_done
 
 from rest_framework import serializers
 from django.contrib.auth import authenticate
@@ -253,10 +259,11 @@ class SurveySubSiteSerializer(serializers.ModelSerializer):
             "contact_details",
             "remarks",
             "noc",
+            "completeness",
             "created_at",
         ]
 
-        read_only_fields = ["id", "survey", "created_at"]
+        read_only_fields = ["id", "survey", "completeness", "created_at"]
 
         extra_kwargs = {
             "location": {"required": True},
@@ -304,6 +311,31 @@ class SurveySubSiteSerializer(serializers.ModelSerializer):
 
 
 
+# my-sites progress, read from the precomputed completeness bitmask
+class SubSiteProgressSerializer(serializers.ModelSerializer):
+
+    sections = serializers.SerializerMethodField()
+    missing = serializers.SerializerMethodField()
+
+    class Meta:
+        model = SurveySubSite
+        fields = ["id", "location", "priority", "status", "completeness", "sections", "missing"]
+
+    def get_sections(self, obj):
+        return sections_done(obj.completeness)
+
+    def get_missing(self, obj):
+        return missing_sections(obj.completeness)
+
+
+class SurveyProgressSerializer(SurveySerializer):
+
+    subsites = SubSiteProgressSerializer(many=True, read_only=True)
+
+    class Meta(SurveySerializer.Meta):
+        fields = SurveySerializer.Meta.fields + ["subsites"]
+
+
 class SurveyLocationSerializer(serializers.ModelSerializer):
     class Meta:
         model = SurveyLocation
@@ -417,7 +449,49 @@ class SurveyMonumentSerializer(serializers.ModelSerializer):
 #                     )
 
 #         return data
-class SurveySkyVisibilitySerializer(serializers.ModelSerializer):
+# ------------------------------------------------
+# IMAGE RENDITIONS
+# ------------------------------------------------
+# Image fields are returned as the WebP thumbnail URL, plus <field>_preview
+# for the medium size (images.py). ?originals=1 returns the uploaded files;
+# views without the request in context pass context["originals"].
+
+class RenditionMixin:
+
+    rendition_fields = []
+
+    def to_representation(self, instance):
+
+        data = super().to_representation(instance)
+        request = self.context.get("request")
+        originals = self.context.get("originals")
+
+        if originals is None:
+            originals = wants_originals(request)
+
+        if originals:
+            return data
+
+        for field in self.rendition_fields:
+
+            if field not in data:
+                continue
+
+            name = getattr(instance, field).name
+
+            for key, size in [(field, "thumb"), (f"{field}_preview", "preview")]:
+                url = rendition_url(name, size) if name else None
+
+                if url and request is not None:
+                    url = request.build_absolute_uri(url)
+
+                data[key] = url
+
+        return data
+
+class SurveySkyVisibilitySerializer(RenditionMixin, serializers.ModelSerializer):
+
+    rendition_fields = ["polar_chart_image"]
 
     class Meta:
         model = SurveySkyVisibility
@@ -598,7 +672,10 @@ class SurveyConnectivitySerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["id"]
 
-class SurveyPhotoSerializer(serializers.ModelSerializer):
+class SurveyPhotoSerializer(RenditionMixin, serializers.ModelSerializer):
+
+    rendition_fields = ["north_photo", "east_photo", "south_photo", "west_photo"]
+
     class Meta:
         model = SurveyPhoto
         fields =[ "id", "north_photo", "east_photo", "south_photo", "west_photo", "captured_at"]
@@ -613,8 +690,8 @@ class RinexFileSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = RinexFile
-        fields = ["id", "file", "uploaded_at"]
-        read_only_fields = ["id", "uploaded_at"]
+        fields = ["id", "file", "digest", "uploaded_at"]
+        read_only_fields = ["id", "digest", "uploaded_at"]
 
     def validate_file(self, value):
         if value and not value.name.lower().endswith(('.obs', '.nav', '.rnx')):
@@ -623,6 +700,60 @@ class RinexFileSerializer(serializers.ModelSerializer):
             )
         return value
 
+class RinexUploadSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = RinexUpload
+        fields = [
+            "id", "filename", "size", "sha256", "subsite",
+            "offset", "status", "rinex_file", "created_at", "updated_at"
+        ]
+        read_only_fields = ["id", "offset", "status", "rinex_file", "created_at", "updated_at"]
+
+    def validate_filename(self, value):
+        value = os.path.basename(value.replace("\\", "/"))
+        if not value.lower().endswith(('.obs', '.nav', '.rnx')):
+            raise serializers.ValidationError(
+                "Only RINEX files (.obs, .nav, .rnx) are allowed"
+            )
+        return value
+
+    def validate_size(self, value):
+        if value <= 0 or value > settings.RINEX_MAX_UPLOAD_BYTES:
+            raise serializers.ValidationError(
+                f"Size must be between 1 and {settings.RINEX_MAX_UPLOAD_BYTES} bytes"
+            )
+        return value
+
+    def validate_sha256(self, value):
+        value = value.lower()
+        if len(value) != 64 or any(c not in "0123456789abcdef" for c in value):
+            raise serializers.ValidationError("Expected a hex sha256 digest")
+        return value
+
+class RinexMetadataSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = RinexMetadata
+        fields = "__all__"
+
+class TaskSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Task
+        fields = [
+            "id",
+            "name",
+            "status",
+            "attempts",
+            "max_attempts",
+            "run_after",
+            "result",
+            "last_error",
+            "created_at",
+            "finished_at",
+        ]
+
 class FullSubSiteSerializer(serializers.ModelSerializer):
 
     location_details = SurveyLocationSerializer(source="surveylocation", read_only=True)
@@ -631,6 +762,7 @@ class FullSubSiteSerializer(serializers.ModelSerializer):
     power = SurveyPowerSerializer(source="surveypower", read_only=True)
     connectivity = SurveyConnectivitySerializer(source="surveyconnectivity", read_only=True)
     photos = SurveyPhotoSerializer(read_only=True)
+    nearest_station = serializers.SerializerMethodField()
 
     class Meta:
         model = SurveySubSite
@@ -645,7 +777,25 @@ class FullSubSiteSerializer(serializers.ModelSerializer):
             "power",
             "connectivity",
             "photos",
+            "nearest_station",
         ]
+
+    # list views precompute this for the whole page (context["nearest_stations"])
+    def get_nearest_station(self, obj):
+
+        nearest = self.context.get("nearest_stations")
+
+        if nearest is not None:
+            return nearest.get(obj.id)
+
+        try:
+            location = obj.surveylocation
+        except SurveyLocation.DoesNotExist:
+            return None
+
+        hits = station_index().nearest(float(location.latitude), float(location.longitude))
+
+        return hits[0] if hits else None
 class FullHierarchySurveySerializer(serializers.ModelSerializer):
 
     state = serializers.CharField(source="state.name", read_only=True)
@@ -673,6 +823,17 @@ class FullHierarchySurveySerializer(serializers.ModelSerializer):
             "subsites",
         ]
 
+    def __init__(self, *args, **kwargs):
+
+        # optional projection, e.g. fields=["id", "station", "status"]
+        fields = kwargs.pop("fields", None)
+
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
 # class FullHierarchySurveySerializer(serializers.ModelSerializer):
 
 #     subsites = FullSubSiteSerializer(many=True, read_only=True)
@@ -768,6 +929,18 @@ class StationdbSerializer(serializers.ModelSerializer):
         
         
 
+class ApprovalSummaryMixin:
+
+    # "approved by" comes from the denormalized approval_summary column,
+    # so role lists need no SurveyApproval query per row
+    def approver_username(self, level, survey=None, subsite=None):
+
+        obj = subsite if subsite is not None else survey
+        entry = (obj.approval_summary or {}).get(str(level))
+
+        return entry["approver_username"] if entry else None
+
+
 class SupervisorSubsiteSerializer(serializers.ModelSerializer):
 
     location_details = SurveyLocationSerializer(source="surveylocation", read_only=True)
@@ -788,6 +961,7 @@ class SupervisorSubsiteSerializer(serializers.ModelSerializer):
             'remarks',
             "noc",
             "contact_details",
+            "approval_summary",
             "location_details",
             "monument_details",
             "sky_visibility",
@@ -864,6 +1038,7 @@ class DirectorSubsiteSerializer(serializers.ModelSerializer):
             "remarks",
             "noc",
             "contact_details",
+            "approval_summary",
             "location_details",
             "monument_details",
             "sky_visibility",
@@ -872,7 +1047,7 @@ class DirectorSubsiteSerializer(serializers.ModelSerializer):
             "photo_details",
             "created_at"
         ]
-class DirectorSurveySerializer(serializers.ModelSerializer):
+class DirectorSurveySerializer(ApprovalSummaryMixin, serializers.ModelSerializer):
 
     site_name = serializers.CharField(source="station.name", read_only=True)
     surveyor_name = serializers.CharField(source="surveyor.username", read_only=True)
@@ -899,15 +1074,7 @@ class DirectorSurveySerializer(serializers.ModelSerializer):
 
     def get_supervisor_name(self, obj):
 
-        approval = SurveyApproval.objects.filter(
-            survey=obj,
-            approval_level=1
-        ).select_related("approved_by").first()
-
-        if approval:
-            return approval.approved_by.username
-
-        return None
+        return self.approver_username(1, survey=obj)
     
 # class ZonalSubsiteSerializer(serializers.ModelSerializer):
 
@@ -998,7 +1165,7 @@ class DirectorSurveySerializer(serializers.ModelSerializer):
 #             return approval.approved_by.username
 
 #         return None
-class ZonalSubsiteSerializer(serializers.ModelSerializer):
+class ZonalSubsiteSerializer(ApprovalSummaryMixin, serializers.ModelSerializer):
 
     # Site information
     # site_name = serializers.CharField(source="survey.station.name", read_only=True)
@@ -1039,6 +1206,7 @@ class ZonalSubsiteSerializer(serializers.ModelSerializer):
             'remarks',
             "noc",
             "contact_details",
+            "approval_summary",
             # "surveyor_name",
             # "supervisor_name",
             # "director_name",
@@ -1054,32 +1222,16 @@ class ZonalSubsiteSerializer(serializers.ModelSerializer):
     # Supervisor name get
     def get_supervisor_name(self, obj):
 
-        approval = SurveyApproval.objects.filter(
-            survey=obj.survey,
-            approval_level=1
-        ).select_related("approved_by").first()
-
-        if approval:
-            return approval.approved_by.username
-
-        return None
+        return self.approver_username(1, survey=obj.survey)
 
 
     # Director name get
     def get_director_name(self, obj):
 
-        approval = SurveyApproval.objects.filter(
-            subsite=obj,
-            approval_level=2
-        ).select_related("approved_by").first()
-
-        if approval:
-            return approval.approved_by.username
-
-        return None
+        return self.approver_username(2, subsite=obj)
     
 
-class ZonalSurveySerializer(serializers.ModelSerializer):
+class ZonalSurveySerializer(ApprovalSummaryMixin, serializers.ModelSerializer):
     # Site information
     site_name = serializers.CharField(source="station.name", read_only=True)
 
@@ -1111,30 +1263,14 @@ class ZonalSurveySerializer(serializers.ModelSerializer):
     # Supervisor name
     def get_supervisor_name(self, obj):
 
-        approval = SurveyApproval.objects.filter(
-            survey=obj,
-            approval_level=1
-        ).select_related("approved_by").first()
-
-        if approval:
-            return approval.approved_by.username
-
-        return None
+        return self.approver_username(1, survey=obj)
     # Director name
     def get_director_name(self, obj):
 
-        approval = SurveyApproval.objects.filter(
-            survey=obj,
-            approval_level=2
-        ).select_related("approved_by").first()
-
-        if approval:
-            return approval.approved_by.username
-
-        return None
+        return self.approver_username(2, survey=obj)
     
     
-class GNRBSubsiteSerializer(serializers.ModelSerializer):
+class GNRBSubsiteSerializer(ApprovalSummaryMixin, serializers.ModelSerializer):
 
     # site_name = serializers.CharField(source="survey.station.name", read_only=True)
     # latitude = serializers.CharField(source="survey.station.latitude", read_only=True)
@@ -1168,6 +1304,7 @@ class GNRBSubsiteSerializer(serializers.ModelSerializer):
             'remarks',
             "noc",
             "contact_details",
+            "approval_summary",
             # "surveyor_name",
             # "supervisor_name",
             # "director_name",
@@ -1182,32 +1319,20 @@ class GNRBSubsiteSerializer(serializers.ModelSerializer):
         ]
 
     def get_supervisor_name(self, obj):
-        approval = SurveyApproval.objects.filter(
-            survey=obj.survey,
-            approval_level=1
-        ).select_related("approved_by").first()
 
-        return approval.approved_by.username if approval else None
+        return self.approver_username(1, survey=obj.survey)
 
 
     def get_director_name(self, obj):
-        approval = SurveyApproval.objects.filter(
-            subsite=obj,
-            approval_level=2
-        ).select_related("approved_by").first()
 
-        return approval.approved_by.username if approval else None
+        return self.approver_username(2, subsite=obj)
 
 
     def get_zonal_chief_name(self, obj):
-        approval = SurveyApproval.objects.filter(
-            subsite=obj,
-            approval_level=3
-        ).select_related("approved_by").first()
 
-        return approval.approved_by.username if approval else None
+        return self.approver_username(3, subsite=obj)
     
-class GNRBSurveySerializer(serializers.ModelSerializer):
+class GNRBSurveySerializer(ApprovalSummaryMixin, serializers.ModelSerializer):
 
     site_name = serializers.CharField(source="station.name", read_only=True)
 
@@ -1241,32 +1366,17 @@ class GNRBSurveySerializer(serializers.ModelSerializer):
 
     def get_supervisor_name(self, obj):
 
-        approval = SurveyApproval.objects.filter(
-            survey=obj,
-            approval_level=1
-        ).select_related("approved_by").first()
-
-        return approval.approved_by.username if approval else None
+        return self.approver_username(1, survey=obj)
 
 
     def get_director_name(self, obj):
 
-        approval = SurveyApproval.objects.filter(
-            survey=obj,
-            approval_level=2
-        ).select_related("approved_by").first()
-
-        return approval.approved_by.username if approval else None
+        return self.approver_username(2, survey=obj)
 
 
     def get_zonal_chief_name(self, obj):
 
-        approval = SurveyApproval.objects.filter(
-            survey=obj,
-            approval_level=3
-        ).select_related("approved_by").first()
-
-        return approval.approved_by.username if approval else None
+        return self.approver_username(3, survey=obj)
 # class GNRBSubsiteSerializer(serializers.ModelSerializer):
 
 #     site_name = serializers.CharField(source="survey.station.name", read_only=True)
@@ -0,0 +1,212 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_on_commit
+from .geography import GEOGRAPHY_NAMESPACE
+from .tiles import MAP_NAMESPACE
+from .models import *
+from .stats import stats_changed
+from .storage import cas, digest_of
+from .sync import DELTA_FEED_KEYS
+from .tasks import enqueue, parse_rinex_file, process_images
+
+
+# -------------------------
+# GEOGRAPHY CACHE INVALIDATION
+# -------------------------
+# bulk_create / queryset.update() do not send these signals; callers doing
+# bulk writes must call bump_on_commit(GEOGRAPHY_NAMESPACE) themselves.
+
+@receiver([post_save, post_delete], sender=State)
+@receiver([post_save, post_delete], sender=District)
+@receiver([post_save, post_delete], sender=SubDistrict)
+@receiver([post_save, post_delete], sender=Town)
+def geography_changed(sender, **kwargs):
+    bump_on_commit(GEOGRAPHY_NAMESPACE)
+
+
+# -------------------------
+# MAP TILE CACHE INVALIDATION
+# -------------------------
+# Same caveat as above: bulk writes call bump_on_commit(MAP_NAMESPACE).
+
+@receiver([post_save, post_delete], sender=SurveyLocation)
+@receiver([post_save, post_delete], sender=Stationdb)
+def map_points_changed(sender, **kwargs):
+    bump_on_commit(MAP_NAMESPACE)
+
+
+# -------------------------
+# ADMIN STATISTICS INVALIDATION
+# -------------------------
+# Same caveat: queryset.update() of statuses calls stats_changed() itself.
+
+@receiver([post_save, post_delete], sender=Survey)
+@receiver([post_save, post_delete], sender=SurveySubSite)
+@receiver([post_save, post_delete], sender=User)
+def stats_rows_changed(sender, update_fields=None, **kwargs):
+
+    # logins save last_login only
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+
+    stats_changed()
+
+
+# -------------------------
+# DELTA SYNC TOMBSTONES
+# -------------------------
+# Every delete in the survey tree leaves a SyncTombstone so the changes
+# feed can send it to clients. The owner is looked up while the parent
+# rows still exist (cascades delete children before parents).
+
+def _survey_owner(**survey_filter):
+
+    return Survey.objects.filter(**survey_filter).values_list(
+        "id", "surveyor_id", "surveyor__zone"
+    ).first() or (None, None, "")
+
+
+@receiver(post_delete, sender=Survey)
+@receiver(post_delete, sender=SurveySubSite)
+@receiver(post_delete, sender=SurveyApproval)
+@receiver(post_delete, sender=SurveyPhoto)
+@receiver(post_delete, sender=SurveyLocation)
+@receiver(post_delete, sender=SurveyMonument)
+@receiver(post_delete, sender=SurveySkyVisibility)
+@receiver(post_delete, sender=SurveyPower)
+@receiver(post_delete, sender=SurveyConnectivity)
+def survey_tree_deleted(sender, instance, **kwargs):
+
+    if sender is Survey:
+        owner = (instance.id, instance.surveyor_id, instance.surveyor.zone)
+        object_id = instance.id
+
+    elif sender in (SurveySubSite, SurveyApproval):
+        owner = _survey_owner(id=instance.survey_id)
+        object_id = instance.id
+
+    elif sender is SurveyPhoto:
+        owner = _survey_owner(subsites__id=instance.sub_site_id)
+        object_id = instance.sub_site_id
+
+    else:
+        # sections are one-to-one with the subsite; clients key them by it
+        owner = _survey_owner(subsites__id=instance.survey_id)
+        object_id = instance.survey_id
+
+    survey_id, surveyor_id, zone = owner
+
+    SyncTombstone.objects.create(
+        model=DELTA_FEED_KEYS[sender],
+        object_id=str(object_id),
+        survey_id=survey_id,
+        surveyor_id=surveyor_id,
+        zone=zone or ""
+    )
+
+
+# -------------------------
+# CONTENT-ADDRESSED MEDIA REFERENCES
+# -------------------------
+# Each stored file name held by a deleted row, or replaced by a save (photo
+# / sky visibility / subsite PUT), gives its blob reference back
+# (storage.py). Done on commit so a rolled back delete or save keeps the
+# file. queryset.update() sends no signal, so code that replaces a stored
+# name saves the instance (uploads._complete).
+
+CAS_FIELDS = {
+    RinexFile: ["file"],
+    SurveySubSite: ["rinex_file"],
+    SurveySkyVisibility: ["polar_chart_image"],
+    SurveyPhoto: ["north_photo", "east_photo", "south_photo", "west_photo"],
+}
+
+
+@receiver(post_delete, sender=RinexFile)
+@receiver(post_delete, sender=SurveySubSite)
+@receiver(post_delete, sender=SurveySkyVisibility)
+@receiver(post_delete, sender=SurveyPhoto)
+def media_released(sender, instance, **kwargs):
+
+    for field in CAS_FIELDS[sender]:
+
+        name = getattr(instance, field).name
+
+        if digest_of(name):
+            transaction.on_commit(lambda name=name: cas.delete(name))
+
+
+@receiver(pre_save, sender=RinexFile)
+@receiver(pre_save, sender=SurveySubSite)
+@receiver(pre_save, sender=SurveySkyVisibility)
+@receiver(pre_save, sender=SurveyPhoto)
+def media_replaced(sender, instance, raw=False, update_fields=None, **kwargs):
+
+    fields = CAS_FIELDS[sender]
+
+    if update_fields is not None:
+        fields = [f for f in fields if f in update_fields]
+
+    if raw or instance._state.adding or not fields:
+        return
+
+    stored = sender.objects.filter(pk=instance.pk).values(*fields).first()
+
+    if stored is None:
+        return
+
+    for field in fields:
+
+        name = stored[field]
+
+        if digest_of(name) and name != getattr(instance, field).name:
+            transaction.on_commit(lambda name=name: cas.delete(name))
+
+
+# -------------------------
+# IMAGE RENDITIONS
+# -------------------------
+# Thumbnails / previews / EXIF columns for new or replaced originals are
+# built by the task worker (images.py, tasks.py); python manage.py
+# process_images backfills older rows.
+
+@receiver(post_save, sender=SurveyPhoto)
+@receiver(post_save, sender=SurveySkyVisibility)
+def images_saved(sender, instance, **kwargs):
+
+    model = "photo" if sender is SurveyPhoto else "sky"
+
+    enqueue(process_images, model=model, pk=str(instance.pk))
+
+
+# -------------------------
+# RINEX METADATA
+# -------------------------
+# New files and files newly attached to a subsite are parsed by the task
+# worker (rinex.py, tasks.py); python manage.py parse_rinex backfills. A
+# name that is already parsed (same blob, another upload) is only linked.
+
+def _link_rinex_metadata(instance, name):
+
+    # drops the link to a replaced file as well
+    instance.rinex_metadata.set(RinexMetadata.objects.filter(source_name=name) if name else [])
+
+    if name and not RinexMetadata.objects.filter(source_name=name, status="PARSED").exists():
+        enqueue(parse_rinex_file, name=name)
+
+
+@receiver(post_save, sender=RinexFile)
+def rinex_file_saved(sender, instance, **kwargs):
+
+    _link_rinex_metadata(instance, instance.file.name)
+
+
+@receiver(post_save, sender=SurveySubSite)
+def subsite_rinex_saved(sender, instance, update_fields=None, **kwargs):
+
+    if update_fields is not None and "rinex_file" not in update_fields:
+        return
+
+    _link_rinex_metadata(instance, instance.rinex_file.name)
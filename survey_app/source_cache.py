@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+
+CACHE_DIR = Path(getattr(settings, "SOURCE_CACHE_DIR", settings.BASE_DIR / ".source_cache"))
+
+# bump when the on-disk layout changes
+FORMAT_VERSION = 2
+
+
+# ------------------------------------------------
+# COLUMNAR SOURCE CACHE
+# ------------------------------------------------
+# A parsed workbook is stored as one .npy file per column plus a
+# manifest.json, in a directory named after the sha256 of the source file.
+# A changed workbook gets a new directory, so there is nothing to
+# invalidate. Numeric and datetime columns are memory-mapped on load.
+# Text columns are dictionary encoded: the distinct values (a small
+# fixed-width unicode array) plus memory-mapped integer codes, -1 for
+# null. They are decoded by indexing the distinct values with the codes,
+# so every row points at one of a few shared strings instead of a copy
+# of its own; decode=False leaves them as Categoricals over the mapped
+# codes. Object columns that mix text with other values are pickled (not
+# mapped).
+#
+# df = load_source(path, parse)  # parse(path) -> DataFrame, used on a miss
+
+def file_digest(path):
+
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def snapshot_dir(path, digest=None):
+
+    digest = digest or file_digest(path)
+
+    return CACHE_DIR / f"{Path(path).stem}-{digest[:16]}"
+
+
+def _is_text(values):
+
+    return all(isinstance(v, str) for v in values if not pd.isna(v))
+
+
+def write_snapshot(df, directory):
+
+    directory = Path(directory)
+    directory.parent.mkdir(parents=True, exist_ok=True)
+
+    # build next to the target and rename, so readers never see half a snapshot
+    tmp = Path(tempfile.mkdtemp(dir=directory.parent, prefix=".tmp-"))
+
+    columns = []
+
+    try:
+        for i, name in enumerate(df.columns):
+
+            series = df[name]
+            kind = "array"
+
+            if series.dtype == object and _is_text(series):
+                kind = "text"
+                text = pd.Categorical(series)
+                np.save(tmp / f"{i}.values.npy", text.categories.to_numpy(dtype=str))
+                # int8/int16/...: the dtype pandas uses, so loading does not copy
+                values = text.codes
+            elif series.dtype == object:
+                kind = "object"
+                values = series.to_numpy()
+            else:
+                values = series.to_numpy()
+
+            np.save(tmp / f"{i}.npy", values, allow_pickle=kind == "object")
+            columns.append({"name": str(name), "kind": kind})
+
+        (tmp / "manifest.json").write_text(json.dumps({
+            "format": FORMAT_VERSION,
+            "rows": len(df),
+            "columns": columns,
+        }))
+
+        os.replace(tmp, directory)
+
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+        # another process wrote the same snapshot first
+        if not (directory / "manifest.json").exists():
+            raise
+
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def _decode(codes, categories):
+
+    # one extra slot so that code -1 reads as null
+    table = np.append(categories.astype(object), np.nan)
+
+    return table[codes]
+
+
+def read_snapshot(directory, mmap=True, decode=True):
+
+    directory = Path(directory)
+    manifest = json.loads((directory / "manifest.json").read_text())
+
+    if manifest["format"] != FORMAT_VERSION:
+        return None
+
+    mode = "r" if mmap else None
+    data = {}
+
+    for i, column in enumerate(manifest["columns"]):
+
+        kind = column["kind"]
+
+        if kind == "object":
+            values = np.load(directory / f"{i}.npy", allow_pickle=True)
+        else:
+            values = np.load(directory / f"{i}.npy", mmap_mode=mode)
+
+        if kind == "text":
+            categories = np.load(directory / f"{i}.values.npy")
+
+            if decode:
+                values = _decode(values, categories)
+            else:
+                values = pd.Categorical.from_codes(values, categories=categories, validate=False)
+
+        data[column["name"]] = values
+
+    return pd.DataFrame(data, copy=False)
+
+
+def clear_snapshots(path):
+
+    if not CACHE_DIR.is_dir():
+        return
+
+    prefix = f"{Path(path).stem}-"
+
+    for directory in CACHE_DIR.iterdir():
+        # <stem>-<16 hex digits>, not another workbook sharing the prefix
+        if directory.name.startswith(prefix) and len(directory.name) == len(prefix) + 16:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def load_source(path, parse, refresh=False, mmap=True, decode=True):
+
+    directory = snapshot_dir(path)
+
+    if not refresh and (directory / "manifest.json").exists():
+        df = read_snapshot(directory, mmap=mmap, decode=decode)
+
+        if df is not None:
+            return df
+
+    df = parse(path)
+
+    # older snapshots of the same workbook are dead weight
+    clear_snapshots(path)
+    write_snapshot(df, directory)
+
+    if not decode:
+        return read_snapshot(directory, mmap=mmap, decode=False)
+
+    return df
@@ -0,0 +1,241 @@
+import math
+
+import numpy as np
+
+from .cache import get_version
+from .models import SurveyLocation, Stationdb
+from .tiles import MAP_NAMESPACE
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+# bucket size in degrees (~110 km north-south)
+CELL_DEG = 1.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2 +
+        np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+# ------------------------------------------------
+# POINT INDEX (grid buckets)
+# ------------------------------------------------
+# Points are bucketed on a CELL_DEG grid. A query scans rings of cells
+# around its own cell and stops once nothing outside the scanned square can
+# be closer than the k-th hit. Longitude does not wrap at +/-180, which is
+# fine for data inside India.
+
+class PointIndex:
+
+    def __init__(self, rows):
+
+        rows = list(rows)
+
+        self.ids = [r[0] for r in rows]
+        self.labels = [r[1] for r in rows]
+        self.lat = np.array([r[2] for r in rows], dtype=float)
+        self.lon = np.array([r[3] for r in rows], dtype=float)
+
+        self.max_abs_lat = float(np.abs(self.lat).max()) if rows else 0.0
+
+        cells = {}
+        for i, key in enumerate(zip(
+            np.floor(self.lat / CELL_DEG).astype(int).tolist(),
+            np.floor(self.lon / CELL_DEG).astype(int).tolist()
+        )):
+            cells.setdefault(key, []).append(i)
+
+        self.cells = {key: np.array(idx) for key, idx in cells.items()}
+
+        keys = np.array(list(self.cells)) if self.cells else np.zeros((0, 2), dtype=int)
+        self._cell_min = keys.min(axis=0) if len(keys) else None
+        self._cell_max = keys.max(axis=0) if len(keys) else None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _ring(self, row, col, r):
+
+        if r == 0:
+            keys = [(row, col)]
+        else:
+            keys = (
+                [(row + dr, col + dc) for dr in (-r, r) for dc in range(-r, r + 1)] +
+                [(row + dr, col + dc) for dc in (-r, r) for dr in range(-r + 1, r)]
+            )
+
+        found = [self.cells[k] for k in keys if k in self.cells]
+
+        return np.concatenate(found) if found else np.zeros(0, dtype=int)
+
+    def _lower_bound_km(self, r, lat):
+
+        # anything beyond ring r is more than r cells away in lat or lon
+        gap = math.radians(r * CELL_DEG)
+        cos_max = math.cos(math.radians(min(89.0, max(self.max_abs_lat, abs(lat)))))
+
+        return EARTH_RADIUS_KM * min(gap, 2 * math.asin(min(1.0, cos_max * math.sin(gap / 2))))
+
+    # rings needed to reach every occupied cell from (row, col)
+    def _max_ring(self, row, col):
+
+        return int(max(
+            abs(row - self._cell_min[0]), abs(row - self._cell_max[0]),
+            abs(col - self._cell_min[1]), abs(col - self._cell_max[1]),
+        ))
+
+    def nearest(self, lat, lon, k=1):
+
+        if not self.ids:
+            return []
+
+        k = min(k, len(self.ids))
+
+        row = math.floor(lat / CELL_DEG)
+        col = math.floor(lon / CELL_DEG)
+
+        idx = np.zeros(0, dtype=int)
+        dist = np.zeros(0)
+
+        for r in range(self._max_ring(row, col) + 1):
+
+            ring = self._ring(row, col, r)
+
+            if len(ring):
+                idx = np.concatenate([idx, ring])
+                dist = np.concatenate([dist, haversine_km(lat, lon, self.lat[ring], self.lon[ring])])
+
+            if len(idx) >= k and np.partition(dist, k - 1)[k - 1] <= self._lower_bound_km(r, lat):
+                break
+
+        order = np.argsort(dist)[:k]
+
+        return [self._hit(idx[i], dist[i]) for i in order]
+
+    # nearest point for many queries: queries in the same cell share the
+    # ring scan and are measured together as one (queries x ring) array.
+    # Returns (point index, distance km) arrays; index -1 if the index is empty.
+    def nearest_arrays(self, lats, lons):
+
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+
+        best_idx = np.full(len(lats), -1)
+        best_dist = np.full(len(lats), np.inf)
+
+        if not self.ids or not len(lats):
+            return best_idx, best_dist
+
+        groups = {}
+        for i, key in enumerate(zip(
+            np.floor(lats / CELL_DEG).astype(int).tolist(),
+            np.floor(lons / CELL_DEG).astype(int).tolist()
+        )):
+            groups.setdefault(key, []).append(i)
+
+        for (row, col), members in groups.items():
+
+            q = np.array(members)
+            q_lat = lats[q, None]
+            q_lon = lons[q, None]
+            group_lat = float(np.abs(lats[q]).max())
+
+            for r in range(self._max_ring(row, col) + 1):
+
+                ring = self._ring(row, col, r)
+
+                if len(ring):
+                    dist = haversine_km(q_lat, q_lon, self.lat[None, ring], self.lon[None, ring])
+                    col_min = dist.argmin(axis=1)
+                    d_min = dist[np.arange(len(q)), col_min]
+
+                    better = d_min < best_dist[q]
+                    best_dist[q[better]] = d_min[better]
+                    best_idx[q[better]] = ring[col_min[better]]
+
+                if best_dist[q].max() <= self._lower_bound_km(r, group_lat):
+                    break
+
+        return best_idx, best_dist
+
+    def nearest_many(self, lats, lons):
+
+        idx, dist = self.nearest_arrays(lats, lons)
+
+        return [self._hit(i, d) if i >= 0 else None for i, d in zip(idx, dist)]
+
+    def _hit(self, i, distance):
+
+        return {
+            "id": self.ids[i],
+            "name": self.labels[i],
+            "latitude": float(self.lat[i]),
+            "longitude": float(self.lon[i]),
+            "distance_km": round(float(distance), 3),
+        }
+
+
+# ------------------------------------------------
+# SHARED INDEXES
+# ------------------------------------------------
+# Built on first use and kept per process. Rebuilt when the "map" version
+# moves, which signals bump on every Stationdb / SurveyLocation write
+# (including StationdbCRUDAPI).
+
+_local = {}
+
+
+def _cached(name, build):
+
+    version = get_version(MAP_NAMESPACE)
+    entry = _local.get(name)
+
+    if entry is None or entry[0] != version:
+        entry = (version, build())
+        _local[name] = entry
+
+    return entry[1]
+
+
+def station_index():
+
+    return _cached("stations", lambda: PointIndex(
+        Stationdb.objects.values_list("id", "name", "latitude", "longitude")
+    ))
+
+
+def survey_point_index():
+
+    return _cached("survey_points", lambda: PointIndex(
+        (str(sid), name, lat, lon)
+        for sid, name, lat, lon in SurveyLocation.objects.values_list(
+            "survey_id", "survey__location", "latitude", "longitude"
+        )
+    ))
+
+
+# {subsite_id: nearest station} for subsites whose surveylocation is loaded
+def nearest_stations_for(subsites):
+
+    located = []
+
+    for subsite in subsites:
+        try:
+            located.append((subsite.id, subsite.surveylocation))
+        except SurveyLocation.DoesNotExist:
+            pass
+
+    hits = station_index().nearest_many(
+        [float(loc.latitude) for _, loc in located],
+        [float(loc.longitude) for _, loc in located]
+    )
+
+    return {subsite_id: hit for (subsite_id, _), hit in zip(located, hits)}
@@ -0,0 +1,171 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .cache import bump_version, get_version
+from .models import Survey, SurveySubSite, User
+
+
+STATS_NAMESPACE = "stats"
+
+APPROVED_SURVEY_STATUS = ["GNRB_APPROVED"]
+REJECTED_SURVEY_STATUS = ["REJECTED"]
+
+APPROVED_SUBSITE_STATUS = ["FINAL_APPROVED"]
+REJECTED_SUBSITE_STATUS = [
+    "REJECTED_BY_SUPERVISOR",
+    "REJECTED_BY_DIRECTOR",
+    "REJECTED_BY_ZONAL",
+    "REJECTED_BY_GNRB"
+]
+
+SURVEY_STATUSES = [s for s, _ in Survey.STATUS_CHOICES]
+SUBSITE_STATUSES = [s for s, _ in SurveySubSite.SUBSITE_STATUS_CHOICES]
+
+
+# ------------------------------------------------
+# ADMIN STATISTICS
+# ------------------------------------------------
+# Per-status counts of surveys and subsites and approval counts of users,
+# in total and per zone / state. Each model is counted with one query:
+# GROUP BY (zone, state) with a conditional COUNT per status. The result
+# is cached under a version number bumped (on commit) by signals.py and by
+# the views that change statuses with queryset.update(); the timeout is a
+# safety net for writes that bypass both.
+
+def stats_changed():
+    transaction.on_commit(lambda: bump_version(STATS_NAMESPACE))
+
+
+def _empty(statuses):
+    return {"total": 0, "by_status": dict.fromkeys(statuses, 0)}
+
+
+def _add(bucket, row, statuses):
+
+    bucket["total"] += row["total"]
+
+    for status in statuses:
+        bucket["by_status"][status] += row[status]
+
+
+def _status_counts(queryset, zone_field, state_field, statuses):
+
+    rows = queryset.order_by().values(zone_field, state_field).annotate(
+        total=Count("id"),
+        **{status: Count("id", filter=Q(status=status)) for status in statuses}
+    )
+
+    result = _empty(statuses)
+    result["by_zone"] = {}
+    result["by_state"] = {}
+
+    for row in rows:
+
+        zone = row[zone_field] or "UNASSIGNED"
+
+        _add(result, row, statuses)
+        _add(result["by_zone"].setdefault(zone, _empty(statuses)), row, statuses)
+        _add(result["by_state"].setdefault(row[state_field], _empty(statuses)), row, statuses)
+
+    return result
+
+
+def _user_counts():
+
+    rows = User.objects.order_by().values("zone", "role").annotate(
+        total=Count("id"),
+        approved=Count("id", filter=Q(is_approved=True)),
+        pending=Count("id", filter=Q(is_approved=False)),
+        rejected=Count("id", filter=Q(is_active=False)),
+    )
+
+    keys = ["total", "approved", "pending", "rejected"]
+
+    result = dict.fromkeys(keys, 0)
+    result["by_role"] = {}
+    result["by_zone"] = {}
+
+    for row in rows:
+
+        zone = row["zone"] or "UNASSIGNED"
+
+        for bucket in (
+            result,
+            result["by_role"].setdefault(row["role"], dict.fromkeys(keys, 0)),
+            result["by_zone"].setdefault(zone, dict.fromkeys(keys, 0)),
+        ):
+            for key in keys:
+                bucket[key] += row[key]
+
+    return result
+
+
+def compute_stats():
+
+    return {
+        "surveys": _status_counts(
+            Survey.objects.all(), "surveyor__zone", "state__name", SURVEY_STATUSES
+        ),
+        "subsites": _status_counts(
+            SurveySubSite.objects.all(), "survey__surveyor__zone", "survey__state__name", SUBSITE_STATUSES
+        ),
+        "users": _user_counts(),
+        "generated_at": timezone.now().isoformat(),
+    }
+
+
+def get_stats():
+
+    version = get_version(STATS_NAMESPACE)
+    key = f"stats:{version}"
+
+    stats = cache.get(key)
+
+    if stats is None:
+        stats = compute_stats()
+        cache.set(key, stats, timeout=settings.STATS_CACHE_SECONDS)
+
+    return version, stats
+
+
+# -------- shapes used by the admin list APIs --------
+
+def _sum(by_status, statuses):
+    return sum(by_status.get(status, 0) for status in statuses)
+
+
+def site_statistics(stats):
+
+    surveys = stats["surveys"]
+
+    return {
+        "total_sites": surveys["total"],
+        "approved_sites": _sum(surveys["by_status"], APPROVED_SURVEY_STATUS),
+        "rejected_sites": _sum(surveys["by_status"], REJECTED_SURVEY_STATUS)
+    }
+
+
+def subsite_statistics(stats):
+
+    subsites = stats["subsites"]
+
+    return {
+        "total_subsites": subsites["total"],
+        "approved_subsites": _sum(subsites["by_status"], APPROVED_SUBSITE_STATUS),
+        "rejected_subsites": _sum(subsites["by_status"], REJECTED_SUBSITE_STATUS)
+    }
+
+
+def user_statistics(stats):
+
+    users = stats["users"]
+
+    return {
+        "total_users": users["total"],
+        "approved_users": users["approved"],
+        "pending_users": users["pending"],
+        "rejected_users": users["rejected"]
+    }
@@ -0,0 +1,174 @@
+import hashlib
+import os
+import re
+import uuid
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import transaction
+from django.db.models import F
+
+
+CAS_DIR = "cas"
+
+CAS_NAME = re.compile(rf"^{CAS_DIR}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/(?P<digest>[0-9a-f]{{64}})")
+
+
+# ------------------------------------------------
+# CONTENT-ADDRESSED MEDIA STORAGE
+# ------------------------------------------------
+# Files are stored once per sha256 under cas/ab/cd/<digest><ext>. A
+# StoredBlob row (unique digest) counts the references; saving the same
+# bytes again only bumps the count, and delete() removes the file when the
+# last reference goes. Names outside cas/ (files stored before this) keep
+# the plain FileSystemStorage behaviour.
+#
+# The upload handlers below hash multipart uploads while Django receives
+# them and leave the digest on the UploadedFile (.sha256), so the storage
+# does not read the file again.
+
+def _hashing(handler_class):
+
+    class Handler(handler_class):
+
+        def new_file(self, *args, **kwargs):
+            # before super(): the memory handler raises StopFutureHandlers
+            self._sha256 = hashlib.sha256()
+            super().new_file(*args, **kwargs)
+
+        def receive_data_chunk(self, raw_data, start):
+            # the memory handler passes large files on to the next handler
+            if getattr(self, "activated", True):
+                self._sha256.update(raw_data)
+            return super().receive_data_chunk(raw_data, start)
+
+        def file_complete(self, file_size):
+            file = super().file_complete(file_size)
+            if file is not None:
+                file.sha256 = self._sha256.hexdigest()
+            return file
+
+    Handler.__name__ = f"Hashing{handler_class.__name__}"
+
+    return Handler
+
+
+HashingMemoryFileUploadHandler = _hashing(MemoryFileUploadHandler)
+HashingTemporaryFileUploadHandler = _hashing(TemporaryFileUploadHandler)
+
+
+def blob_name(digest, ext=""):
+    return f"{CAS_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{ext.lower()}"
+
+
+def digest_of(name):
+
+    match = CAS_NAME.match(name or "")
+
+    return match.group("digest") if match else None
+
+
+def _blobs():
+    return apps.get_model("survey_app", "StoredBlob").objects
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def _save(self, name, content):
+
+        ext = os.path.splitext(name)[1]
+        digest = getattr(content, "sha256", None)
+
+        if digest:
+            return self._acquire(digest, ext, content.size, lambda target: FileSystemStorage._save(self, target, content))
+
+        # not hashed on the way in: hash while copying to a temp file
+        tmp = self.path(f"{CAS_DIR}/tmp/{uuid.uuid4().hex}")
+        os.makedirs(os.path.dirname(tmp), exist_ok=True)
+
+        try:
+            sha256 = hashlib.sha256()
+            size = 0
+
+            with open(tmp, "wb") as f:
+                for chunk in content.chunks():
+                    sha256.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+
+            return self.store_path(tmp, sha256.hexdigest(), ext, size)
+
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    # move an already written file (digest known) into the store
+    def store_path(self, path, digest, ext="", size=None):
+
+        def move(target):
+            os.makedirs(os.path.dirname(self.path(target)), exist_ok=True)
+            os.replace(path, self.path(target))
+            return target
+
+        name = self._acquire(digest, ext, size if size is not None else os.path.getsize(path), move)
+
+        if os.path.exists(path):
+            os.remove(path)
+
+        return name
+
+    def _acquire(self, digest, ext, size, write):
+
+        with transaction.atomic():
+
+            blob, created = _blobs().select_for_update().get_or_create(
+                digest=digest,
+                defaults={"name": blob_name(digest, ext), "size": size, "ref_count": 1}
+            )
+
+            if not created:
+                _blobs().filter(pk=blob.pk).update(ref_count=F("ref_count") + 1)
+
+            # a missing file (crash, manual cleanup) is written again
+            if created or not self.exists(blob.name):
+                stored = write(blob.name)
+
+                # FileSystemStorage picks another name if one appeared in
+                # the meantime; same digest, same bytes, so take its place
+                if stored != blob.name:
+                    os.replace(self.path(stored), self.path(blob.name))
+
+        return blob.name
+
+    def add_reference(self, name):
+
+        if digest_of(name):
+            _blobs().filter(name=name).update(ref_count=F("ref_count") + 1)
+
+    def delete(self, name):
+
+        if not digest_of(name):
+            return super().delete(name)
+
+        with transaction.atomic():
+
+            blob = _blobs().select_for_update().filter(name=name).first()
+
+            if blob is None:
+                return
+
+            if blob.ref_count > 1:
+                _blobs().filter(pk=blob.pk).update(ref_count=F("ref_count") - 1)
+                return
+
+            blob.delete()
+            super().delete(name)
+
+
+cas = ContentAddressedStorage()
+
+
+# FileField(storage=cas_storage); a callable keeps migrations free of the instance
+def cas_storage():
+    return cas
@@ -0,0 +1,472 @@
+import base64
+import json
+import uuid
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import serializers
+
+from .cache import bump_on_commit
+from .completeness import refresh_completeness
+from .models import *
+from .serializers import (
+    SurveySerializer,
+    SurveySubSiteSerializer,
+    SurveyLocationSerializer,
+    SurveyMonumentSerializer,
+    SurveySkyVisibilitySerializer,
+    SurveyPowerSerializer,
+    SurveyConnectivitySerializer,
+    SurveyPhotoSerializer,
+    SurveyApprovalSerializer,
+)
+from .stats import stats_changed
+from .tiles import MAP_NAMESPACE
+
+
+# ------------------------------------------------
+# OFFLINE BULK SYNC
+# ------------------------------------------------
+# A device sends one survey with all its subsites and sections. Survey and
+# subsite ids are generated on the device (UUID primary keys), so sending
+# the same payload again updates the same rows instead of duplicating them.
+# Sections are one-to-one with their subsite and are matched through it.
+#
+# Items that fail validation are reported and skipped; everything valid is
+# written in one transaction with bulk_create / bulk_update. Each item is
+# sent whole (no partial updates). Files (rinex, noc, photos, polar chart)
+# still go through their upload APIs, and status is owned by the approval
+# flow, so those fields are ignored here.
+
+# payload key, model, serializer, reverse accessor on SurveySubSite
+SYNC_SECTIONS = [
+    ("location_details", SurveyLocation, SurveyLocationSerializer, "surveylocation"),
+    ("monument", SurveyMonument, SurveyMonumentSerializer, "surveymonument"),
+    ("sky_visibility", SurveySkyVisibility, SurveySkyVisibilitySerializer, "surveyskyvisibility"),
+    ("power", SurveyPower, SurveyPowerSerializer, "surveypower"),
+    ("connectivity", SurveyConnectivity, SurveyConnectivitySerializer, "surveyconnectivity"),
+]
+
+EDITABLE_SURVEY_STATUS = ["DRAFT", "REJECTED"]
+
+IGNORED_SUBSITE_FIELDS = ["status", "rinex_file", "noc"]
+
+
+class SyncError(Exception):
+
+    def __init__(self, detail, status_code=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+def _client_uuid(value):
+
+    try:
+        return uuid.UUID(str(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _related_or_none(obj, attr):
+
+    try:
+        return getattr(obj, attr)
+    except ObjectDoesNotExist:
+        return None
+
+
+def _bulk_write(model, creates, updates):
+
+    if creates:
+        model.objects.bulk_create(creates, batch_size=500)
+
+    # bulk_update skips auto_now, the delta feed relies on updated_at
+    now = timezone.now()
+
+    # group updates by the set of fields that actually changed
+    by_fields = {}
+    for obj, fields in updates:
+        obj.updated_at = now
+        by_fields.setdefault(tuple(sorted([*fields, "updated_at"])), []).append(obj)
+
+    for fields, objs in by_fields.items():
+        model.objects.bulk_update(objs, list(fields), batch_size=500)
+
+    # bulk writes send no signals
+    if model is SurveySubSite and (creates or updates):
+        stats_changed()
+
+
+def _sync_survey(user, payload):
+
+    survey_id = _client_uuid(payload.get("id"))
+
+    if not survey_id:
+        raise SyncError({"id": "Client generated UUID required"})
+
+    survey = Survey.objects.filter(id=survey_id).first()
+
+    if survey and survey.surveyor_id != user.id:
+        raise SyncError({"error": "Survey belongs to another user"}, status_code=403)
+
+    if survey and survey.status not in EDITABLE_SURVEY_STATUS:
+        raise SyncError({
+            "error": f"Survey cannot be edited in current state ({survey.status})"
+        })
+
+    serializer = SurveySerializer(survey, data=payload)
+
+    if not serializer.is_valid():
+        raise SyncError({"survey": serializer.errors})
+
+    if survey:
+        serializer.save()
+        return survey, "updated"
+
+    return serializer.save(id=survey_id, surveyor=user), "created"
+
+
+def apply_survey_sync(user, payload):
+
+    items = payload.get("subsites", [])
+
+    if not isinstance(items, list):
+        raise SyncError({"subsites": "Must be a list"})
+
+    with transaction.atomic():
+
+        survey, survey_result = _sync_survey(user, payload)
+
+        # -------- EXISTING ROWS (one query) --------
+        ids = [_client_uuid(item.get("id")) for item in items]
+
+        existing = {
+            s.id: s
+            for s in SurveySubSite.objects.filter(
+                id__in=[i for i in ids if i]
+            ).select_related(*[accessor for _, _, _, accessor in SYNC_SECTIONS])
+        }
+
+        results = []
+        subsite_creates, subsite_updates = [], []
+        section_writes = {model: ([], []) for _, model, _, _ in SYNC_SECTIONS}
+
+        seen_locations, seen_priorities = set(), set()
+
+        for item, subsite_id in zip(items, ids):
+
+            result = {"id": item.get("id")}
+            results.append(result)
+
+            if not subsite_id:
+                result.update(status="error", errors={"id": "Client generated UUID required"})
+                continue
+
+            subsite = existing.get(subsite_id)
+
+            if subsite and subsite.survey_id != survey.id:
+                result.update(status="error", errors={"id": "Subsite belongs to another survey"})
+                continue
+
+            # -------- SUBSITE --------
+            serializer = SurveySubSiteSerializer(
+                subsite,
+                data=item,
+                context={"survey": survey}
+            )
+
+            if not serializer.is_valid():
+                result.update(status="error", errors=serializer.errors)
+                continue
+
+            data = {
+                field: value
+                for field, value in serializer.validated_data.items()
+                if field not in IGNORED_SUBSITE_FIELDS
+            }
+
+            # duplicates inside the payload itself
+            if data["location"] in seen_locations or data["priority"] in seen_priorities:
+                result.update(status="error", errors={
+                    "non_field_errors": ["Duplicate location or priority in payload"]
+                })
+                continue
+
+            seen_locations.add(data["location"])
+            seen_priorities.add(data["priority"])
+
+            if subsite:
+                for field, value in data.items():
+                    setattr(subsite, field, value)
+                subsite_updates.append((subsite, data.keys()))
+                result["status"] = "updated"
+            else:
+                subsite = SurveySubSite(id=subsite_id, survey=survey, **data)
+                subsite_creates.append(subsite)
+                result["status"] = "created"
+
+            # -------- SECTIONS --------
+            result["sections"] = {}
+
+            for key, model, serializer_class, accessor in SYNC_SECTIONS:
+
+                if key not in item or item[key] is None:
+                    continue
+
+                instance = _related_or_none(subsite, accessor) if result["status"] == "updated" else None
+
+                section = serializer_class(instance, data=item[key])
+
+                if not section.is_valid():
+                    result["sections"][key] = {"status": "error", "errors": section.errors}
+                    continue
+
+                creates, updates = section_writes[model]
+
+                if instance:
+                    for field, value in section.validated_data.items():
+                        setattr(instance, field, value)
+                    updates.append((instance, section.validated_data.keys()))
+                    result["sections"][key] = {"status": "updated"}
+                else:
+                    creates.append(model(survey=subsite, **section.validated_data))
+                    result["sections"][key] = {"status": "created"}
+
+        # -------- WRITE (parents first) --------
+        _bulk_write(SurveySubSite, subsite_creates, subsite_updates)
+
+        for model, (creates, updates) in section_writes.items():
+            _bulk_write(model, creates, updates)
+
+        # a section can only appear here (sync never deletes one)
+        refresh_completeness({
+            section.survey_id
+            for creates, _ in section_writes.values()
+            for section in creates
+        })
+
+        # bulk writes skip the signals that invalidate the map tiles
+        if any(section_writes[SurveyLocation]):
+            bump_on_commit(MAP_NAMESPACE)
+
+    return {
+        "survey": {"id": str(survey.id), "status": survey_result},
+        "subsites": results,
+    }
+
+
+# ------------------------------------------------
+# DELTA FEED ("changes since")
+# ------------------------------------------------
+# Returns rows of the survey tree created or updated after the client's
+# sync token, plus tombstones for deleted rows. The token is the server
+# time at which the previous feed was read. Rows are matched from a little
+# before that time (SYNC_OVERLAP_SECONDS) so that transactions which
+# committed late are not missed; clients upsert by id, so repeats are
+# harmless.
+#
+# Limit: a row whose transaction commits more than SYNC_OVERLAP_SECONDS
+# after its timestamp was set (a long transaction, a stalled worker) can
+# fall before the next window and is then only sent when it changes
+# again. Raise the setting if writes can run that long.
+#
+# The feed is paged: at most SYNC_PAGE_SIZE rows per response, walking
+# the feeds in order and each feed by (timestamp, id). While has_more is
+# true the returned sync_token is a continuation token; the client calls
+# again with it until has_more is false, and keeps that last token for
+# the next sync. Every page of one pass uses the same window, ending at
+# the moment the first page was read.
+
+# feed key, model, serializer, timestamp field, path to Survey, subsite key
+DELTA_FEEDS = [
+    ("surveys", Survey, SurveySerializer, "updated_at", "", None),
+    ("subsites", SurveySubSite, SurveySubSiteSerializer, "updated_at", "survey__", None),
+    *[
+        (key, model, serializer_class, "updated_at", "survey__survey__", "survey_id")
+        for key, model, serializer_class, _ in SYNC_SECTIONS
+    ],
+    ("photos", SurveyPhoto, SurveyPhotoSerializer, "updated_at", "sub_site__survey__", "sub_site_id"),
+    ("approvals", SurveyApproval, SurveyApprovalSerializer, "approved_at", "survey__", None),
+]
+
+DELTA_FEED_KEYS = {model: key for key, model, _, _, _, _ in DELTA_FEEDS}
+
+# tombstones are paged as the last feed
+DELETED_FEED = len(DELTA_FEEDS)
+
+
+def _iso(moment):
+    return moment.isoformat() if moment else None
+
+
+def _moment(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def encode_sync_token(moment, until=None, feed=None, after=None):
+
+    if until is None:
+        raw = {"t": _iso(moment)}
+    else:
+        raw = {
+            "s": _iso(moment),
+            "u": _iso(until),
+            "f": feed,
+            "c": _iso(after[0]) if after else None,
+            "i": str(after[1]) if after else None,
+        }
+
+    return base64.urlsafe_b64encode(json.dumps(raw).encode()).decode()
+
+
+# -> (since, until, feed, after); until is None for a finished pass
+def decode_sync_token(token):
+
+    if not token:
+        return None, None, 0, None
+
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+
+        if "u" not in raw:
+            return datetime.fromisoformat(raw["t"]), None, 0, None
+
+        feed = int(raw["f"])
+
+        if not 0 <= feed <= DELETED_FEED:
+            raise ValueError(feed)
+
+        after = (datetime.fromisoformat(raw["c"]), raw["i"]) if raw["c"] else None
+
+        return _moment(raw["s"]), datetime.fromisoformat(raw["u"]), feed, after
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise serializers.ValidationError({"since": "Invalid sync token"})
+
+
+# Filter on the survey owner for the user's role, or None if not allowed
+def _scope(user, prefix):
+
+    if user.role == "SURVEYOR":
+        return {f"{prefix}surveyor": user}
+
+    if user.role == "ADMIN":
+        return {}
+
+    if user.role in ["SUPERVISOR", "DIRECTOR", "ZONAL_CHIEF", "GNRB"]:
+        return {f"{prefix}surveyor__zone": user.zone}
+
+    return None
+
+
+def _tombstone_scope(user):
+
+    if user.role == "SURVEYOR":
+        return {"surveyor_id": user.id}
+
+    if user.role == "ADMIN":
+        return {}
+
+    return {"zone": user.zone}
+
+
+def _feed_rows(rows, time_field, start, until, after):
+
+    rows = rows.filter(**{f"{time_field}__lte": until})
+
+    if start:
+        rows = rows.filter(**{f"{time_field}__gt": start})
+
+    if after:
+        moment, last_id = after
+        rows = rows.filter(
+            Q(**{f"{time_field}__gt": moment}) |
+            Q(**{time_field: moment, "id__gt": last_id})
+        )
+
+    return rows.order_by(time_field, "id")
+
+
+def changes_since(user, token, context=None):
+
+    scope = _scope(user, "")
+
+    if scope is None:
+        return None
+
+    since, until, feed, after = decode_sync_token(token)
+
+    # a new pass: the window ends now, taken before reading so nothing
+    # written during the read is skipped
+    if until is None:
+        until = timezone.now()
+
+    start = since - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS) if since else None
+
+    data = {key: [] for key, *_ in DELTA_FEEDS}
+    data["deleted"] = []
+
+    remaining = settings.SYNC_PAGE_SIZE
+    next_position = None
+
+    for index in range(feed, DELETED_FEED + 1):
+
+        position_after = after if index == feed else None
+
+        if index == DELETED_FEED:
+            key, time_field = "deleted", "deleted_at"
+            rows = SyncTombstone.objects.filter(**_tombstone_scope(user))
+        else:
+            key, model, serializer_class, time_field, prefix, subsite_attr = DELTA_FEEDS[index]
+            rows = model.objects.filter(**_scope(user, prefix))
+
+            if model is Survey:
+                rows = rows.select_related("state", "district", "subdistrict", "station")
+
+        # one extra row tells whether this feed continues on the next page
+        rows = list(_feed_rows(rows, time_field, start, until, position_after)[:remaining + 1])
+
+        more = len(rows) > remaining
+        rows = rows[:remaining]
+        remaining -= len(rows)
+
+        if index == DELETED_FEED:
+            data[key] = [
+                {"model": row.model, "id": row.object_id, "deleted_at": row.deleted_at}
+                for row in rows
+            ]
+        else:
+            items = serializer_class(rows, many=True, context=context or {}).data
+
+            if subsite_attr:
+                items = [
+                    {"subsite": str(getattr(row, subsite_attr)), **item}
+                    for row, item in zip(rows, items)
+                ]
+
+            data[key] = items
+
+        if more:
+            last = rows[-1] if rows else None
+            next_position = (
+                index,
+                (getattr(last, time_field), last.pk) if last else position_after
+            )
+            break
+
+        if not remaining and index < DELETED_FEED:
+            next_position = (index + 1, None)
+            break
+
+    if next_position:
+        data["sync_token"] = encode_sync_token(since, until, *next_position)
+        data["has_more"] = True
+    else:
+        data["sync_token"] = encode_sync_token(until)
+        data["has_more"] = False
+
+    return data
@@ -0,0 +1,271 @@
+import os
+import random
+import socket
+import time
+import traceback
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .images import process_instance
+from .models import PasswordResetOTP, SurveyPhoto, SurveySkyVisibility, Task
+from .rinex import index_file
+
+
+# ------------------------------------------------
+# BACKGROUND TASK QUEUE (DB-backed)
+# ------------------------------------------------
+# enqueue(func, **kwargs) stores a Task row naming the function by dotted
+# path; "python manage.py run_tasks" claims due rows and runs them. The row
+# is written in the caller's transaction, so a rolled back request never
+# sends its mail and a worker never sees a task before the data it needs.
+#
+# Claiming uses SELECT ... FOR UPDATE SKIP LOCKED where the database has
+# it, so several workers can share the table; the conditional UPDATE on
+# status keeps a row with one worker elsewhere. A failed attempt goes back
+# to QUEUED with exponential backoff (plus jitter) until max_attempts, then
+# FAILED. Delivery is at-least-once: tasks must be safe to run twice.
+#
+# TASKS_EAGER = True runs each task in-process right after commit instead
+# (development without a worker); the Task row is still recorded.
+
+def task_name(func):
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def enqueue(func, user=None, delay=0, max_attempts=None, **kwargs):
+
+    task = Task.objects.create(
+        name=task_name(func),
+        kwargs=kwargs,
+        max_attempts=max_attempts or settings.TASK_MAX_ATTEMPTS,
+        run_after=timezone.now() + timedelta(seconds=delay),
+        created_by=user if user is not None and user.is_authenticated else None
+    )
+
+    if settings.TASKS_EAGER:
+        transaction.on_commit(lambda: run_next(f"eager-{os.getpid()}", task_id=task.id))
+
+    return task
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def backoff(attempts):
+
+    delay = min(
+        settings.TASK_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0),
+        settings.TASK_RETRY_MAX_SECONDS
+    )
+
+    # jitter so tasks failing together do not retry together
+    return delay * random.uniform(0.5, 1.0)
+
+
+def claim(worker, task_id=None):
+
+    now = timezone.now()
+
+    with transaction.atomic():
+
+        due = Task.objects.filter(status="QUEUED", run_after__lte=now)
+
+        if task_id:
+            due = due.filter(id=task_id)
+
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+
+        task = due.order_by("run_after").first()
+
+        if task is None:
+            return None
+
+        claimed = Task.objects.filter(id=task.id, status="QUEUED").update(
+            status="RUNNING",
+            attempts=F("attempts") + 1,
+            locked_by=worker,
+            locked_at=now
+        )
+
+    if not claimed:
+        return None
+
+    task.refresh_from_db()
+
+    return task
+
+
+def run_task(task):
+
+    try:
+        func = import_string(task.name)
+
+        # a failed attempt leaves nothing half-written
+        with transaction.atomic():
+            result = func(**task.kwargs)
+
+    except Exception:
+        error = traceback.format_exc()[-4000:]
+        now = timezone.now()
+
+        if task.attempts >= task.max_attempts:
+            Task.objects.filter(id=task.id).update(
+                status="FAILED",
+                last_error=error,
+                finished_at=now,
+                locked_by="",
+                locked_at=None
+            )
+            return "FAILED"
+
+        Task.objects.filter(id=task.id).update(
+            status="QUEUED",
+            last_error=error,
+            run_after=now + timedelta(seconds=backoff(task.attempts)),
+            locked_by="",
+            locked_at=None
+        )
+        return "RETRY"
+
+    Task.objects.filter(id=task.id).update(
+        status="SUCCEEDED",
+        result=result,
+        finished_at=timezone.now(),
+        locked_by="",
+        locked_at=None
+    )
+    return "SUCCEEDED"
+
+
+def run_next(worker, task_id=None):
+
+    task = claim(worker, task_id)
+
+    return run_task(task) if task else None
+
+
+# tasks whose worker died mid-run go back to the queue
+def requeue_stale():
+
+    cutoff = timezone.now() - timedelta(seconds=settings.TASK_LOCK_TIMEOUT_SECONDS)
+    stale = Task.objects.filter(status="RUNNING", locked_at__lt=cutoff)
+
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status="FAILED",
+        last_error="Worker stopped while running the task",
+        finished_at=timezone.now(),
+        locked_by="",
+        locked_at=None
+    )
+
+    requeued = stale.update(status="QUEUED", locked_by="", locked_at=None)
+
+    return requeued + failed
+
+
+def purge_finished(days):
+
+    cutoff = timezone.now() - timedelta(days=days)
+
+    deleted, _ = Task.objects.filter(status="SUCCEEDED", finished_at__lt=cutoff).delete()
+
+    return deleted
+
+
+def work(worker=None, burst=False, max_tasks=None, sleep=1.0, should_stop=lambda: False):
+
+    worker = worker or worker_name()
+    results = Counter()
+    last_requeue = None
+
+    while not should_stop():
+
+        if max_tasks is not None and sum(results.values()) >= max_tasks:
+            break
+
+        if last_requeue is None or time.monotonic() - last_requeue > 60:
+            requeue_stale()
+            last_requeue = time.monotonic()
+
+        outcome = run_next(worker)
+
+        if outcome:
+            results[outcome] += 1
+            continue
+
+        if burst:
+            break
+
+        time.sleep(sleep)
+
+    return dict(results)
+
+
+def task_scope(user):
+
+    if user.role == "ADMIN":
+        return Task.objects.all()
+
+    return Task.objects.filter(created_by=user)
+
+
+# ------------------------------------------------
+# TASKS
+# ------------------------------------------------
+# Called by the worker with the kwargs given to enqueue(); the return value
+# is stored as Task.result and must be JSON serialisable.
+
+def send_otp_mail(otp_id):
+
+    otp = PasswordResetOTP.objects.select_related("user").filter(id=otp_id).first()
+
+    # replaced by a newer OTP, used or expired before the worker got to it
+    if otp is None or otp.is_expired():
+        return {"sent": False}
+
+    send_mail(
+        subject="Your Password Reset OTP",
+        message=f"Hello {otp.user.username},\n\nYour OTP is: {otp.otp}\n\nValid for 10 minutes.",
+        from_email=settings.EMAIL_HOST_USER,
+        recipient_list=[otp.user.email],
+        fail_silently=False,
+    )
+
+    return {"sent": True}
+
+
+IMAGE_MODELS = {
+    "photo": SurveyPhoto,
+    "sky": SurveySkyVisibility,
+}
+
+
+def process_images(model, pk):
+
+    instance = IMAGE_MODELS[model].objects.filter(pk=pk).first()
+
+    if instance is None:
+        return {"processed": 0, "failed": 0}
+
+    results = process_instance(instance)
+
+    return {
+        "processed": len(results),
+        "failed": sum(1 for metadata in results if metadata.error)
+    }
+
+
+def parse_rinex_file(name):
+
+    metadata = index_file(name)
+
+    return {"metadata_id": metadata.id, "status": metadata.status}
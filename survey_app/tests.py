@@ -1,3 +1,2239 @@
-from django.test import TestCase
+import base64
+import csv
+import hashlib
+import json
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock, skipIf
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .models import *
+from .serializers import FullSubSiteSerializer, SurveyLocationSerializer
+from .completeness import LOCATION, refresh_completeness, sections_done
+from . import source_cache
+from .cache import get_version
+from .coverage import brute_force_nearest, compute_coverage, load_towns
+from .geography import get_snapshot
+from .images import RENDITION_SIZES, process_instance, rendition_name, renditions
+from .importers import import_geography, import_stations, parse_workbook
+from .rinex import RinexError, ecef_to_geodetic, index_file, parse_rinex
+from .source_cache import load_source
+from .spatial import station_index
+from .storage import cas
+from .tasks import backoff, claim, enqueue, requeue_stale, run_next, run_task
+from .tiles import MAP_NAMESPACE
+from .uploads import append_chunk, commit_upload
+from .workflow import transition_subsites
+
+
+def make_geography():
+
+    state = State.objects.create(name="Uttarakhand")
+    district = District.objects.create(state=state, name="Dehradun")
+    subdistrict = SubDistrict.objects.create(district=district, name="Vikasnagar")
+    town = Town.objects.create(
+        subdistrict=subdistrict,
+        name="Herbertpur",
+        latitude=30.43,
+        longitude=77.73
+    )
+
+    return state, district, subdistrict, town
+
+
+def make_user(username, role, zone="NORTH"):
+
+    return User.objects.create_user(
+        username=username,
+        password="pass1234",
+        name=username,
+        email=f"{username}@example.com",
+        mobile="9999999999",
+        role=role,
+        zone=zone,
+        is_approved=True
+    )
+
+
+def make_surveys(surveyor, count, subsites_per_survey=2, **survey_fields):
+
+    state, district, subdistrict, town = make_geography()
+
+    surveys = Survey.objects.bulk_create([
+        Survey(
+            state=state,
+            district=district,
+            subdistrict=subdistrict,
+            station=town,
+            surveyor=surveyor,
+            **survey_fields
+        )
+        for _ in range(count)
+    ])
+
+    subsites = SurveySubSite.objects.bulk_create([
+        SurveySubSite(survey=survey, location=f"Site {p}", priority=p)
+        for survey in surveys
+        for p in range(1, subsites_per_survey + 1)
+    ])
+
+    SurveyLocation.objects.bulk_create([
+        SurveyLocation(
+            survey=subsite,
+            latitude=30.43,
+            longitude=77.73,
+            address="Main road",
+            city="Herbertpur",
+            district="Dehradun",
+            state="Uttarakhand"
+        )
+        for subsite in subsites
+    ])
+
+    return surveys, subsites
+
+
+def make_image(color, name="photo.png", size=(64, 48)):
+
+    buffer = BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+class HierarchySurveyAPITest(TestCase):
+
+    def setUp(self):
+
+        self.admin = make_user("admin", "ADMIN")
+        self.surveyor = make_user("surveyor", "SURVEYOR")
+
+        make_surveys(self.surveyor, 30)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def query_count(self, params):
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/hierarchy/sites/", params)
+
+        self.assertEqual(response.status_code, 200)
+
+        return len(ctx.captured_queries), response.data
+
+    def test_cursor_walks_all_surveys_once(self):
+
+        seen = []
+        params = {"page_size": 7}
+
+        while True:
+            response = self.client.get("/api/hierarchy/sites/", params)
+            seen.extend(row["id"] for row in response.data["results"])
+
+            if not response.data["next_cursor"]:
+                break
+
+            params["cursor"] = response.data["next_cursor"]
+
+        self.assertEqual(len(seen), 30)
+        self.assertEqual(len(set(seen)), 30)
+
+    def test_unpaginated_request_keeps_bare_list(self):
+
+        response = self.client.get("/api/hierarchy/sites/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 30)
+
+    def test_query_count_constant_per_page(self):
+
+        # first request builds the in-memory station index
+        self.query_count({"page_size": 1})
+
+        small, small_data = self.query_count({"page_size": 2})
+        large, large_data = self.query_count({"page_size": 25})
+
+        self.assertEqual(len(small_data["results"]), 2)
+        self.assertEqual(len(large_data["results"]), 25)
+        self.assertEqual(small, large)
+
+    def test_fields_projection_skips_subsites(self):
+
+        full, _ = self.query_count({"page_size": 10})
+        count, data = self.query_count({"page_size": 10, "fields": "id,station,status"})
+
+        self.assertEqual(set(data["results"][0]), {"id", "station", "status"})
+        self.assertLess(count, full)
+
+    def test_invalid_field_rejected(self):
+
+        response = self.client.get("/api/hierarchy/sites/", {"fields": "password"})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class ApproverNameQueryCountTest(TestCase):
+
+    # surveys + subsites + 6 subsite sections; approver names come from
+    # the denormalized approval_summary columns
+    EXPECTED_QUERIES = 8
+
+    def setUp(self):
+
+        self.surveyor = make_user("surveyor", "SURVEYOR")
+        self.supervisor = make_user("supervisor", "SUPERVISOR")
+        self.director = make_user("director", "DIRECTOR")
+        self.zonal = make_user("zonal", "ZONAL_CHIEF")
+        self.gnrb = make_user("gnrb", "GNRB")
+
+        surveys, subsites = make_surveys(
+            self.surveyor,
+            500,
+            subsites_per_survey=1,
+            status="SUPERVISOR_APPROVED"
+        )
+
+        SurveySubSite.objects.update(status="SENT_TO_GNRB")
+
+        SurveyApproval.objects.bulk_create([
+            SurveyApproval(
+                survey_id=subsite.survey_id,
+                subsite=subsite,
+                approval_level=level,
+                approved_by=user,
+                decision="APPROVED",
+                remarks=""
+            )
+            for subsite in subsites
+            for level, user in [
+                (1, self.supervisor),
+                (2, self.director),
+                (3, self.zonal),
+            ]
+        ])
+
+        call_command("backfill_approval_summary", stdout=StringIO())
+
+        self.client = APIClient()
+
+    def get(self, user, url):
+
+        self.client.force_authenticate(user)
+
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 500)
+
+        return response.data
+
+    def test_director_list(self):
+
+        data = self.get(self.director, "/api/director/subsites/")
+
+        self.assertEqual(data[0]["supervisor_name"], "supervisor")
+
+    def test_zonal_list(self):
+
+        data = self.get(self.zonal, "/api/zonal/subsites/")
+
+        self.assertEqual(data[0]["director_name"], "director")
+
+    def test_gnrb_list(self):
+
+        data = self.get(self.gnrb, "/api/gnrb/subsites/")
+
+        self.assertEqual(data[0]["supervisor_name"], "supervisor")
+        self.assertEqual(data[0]["director_name"], "director")
+        self.assertEqual(data[0]["zonal_chief_name"], "zonal")
+
+
+class SurveyReadinessTest(TestCase):
+
+    def setUp(self):
+
+        self.surveyor = make_user("surveyor", "SURVEYOR")
+
+        surveys, _ = make_surveys(self.surveyor, 1, subsites_per_survey=20)
+        self.survey = surveys[0]
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.surveyor)
+
+    def test_readiness_is_one_query(self):
+
+        url = f"/api/survey/create_site/{self.survey.id}/readiness/"
+
+        # survey lookup + one annotated subsite query, however many subsites
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data["ready"])
+        self.assertEqual(response.data["subsite_count"], 20)
+        self.assertEqual(
+            response.data["incomplete_subsites"][0]["missing"],
+            ["Monument", "Sky Visibility", "Power", "Connectivity", "Photos"]
+        )
+
+    def test_submit_rejects_incomplete_survey(self):
+
+        url = f"/api/survey/create_site/{self.survey.id}/submit/"
+
+        response = self.client.post(url)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.data["incomplete_subsites"]), 20)
+
+        self.survey.refresh_from_db()
+        self.assertEqual(self.survey.status, "DRAFT")
+
+
+class SubsiteCompletenessTest(TestCase):
+
+    def setUp(self):
+
+        self.surveyor = make_user("surveyor", "SURVEYOR")
+
+        _, subsites = make_surveys(self.surveyor, 1)
+        self.subsite = subsites[0]
+
+        # make_surveys writes the locations directly, as the backfill would see them
+        refresh_completeness([s.id for s in subsites])
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.surveyor)
+
+    def test_section_writes_keep_bitmask(self):
+
+        url = f"/api/survey/subsite/{self.subsite.id}/location/"
+
+        self.subsite.refresh_from_db()
+        self.assertEqual(self.subsite.completeness, LOCATION)
+
+        self.client.delete(url)
+
+        self.subsite.refresh_from_db()
+        self.assertEqual(self.subsite.completeness, 0)
+
+        response = self.client.get("/api/survey/my-sites/")
+
+        progress = response.data["surveys"][0]["subsites"][0]
+        self.assertEqual(progress["id"], str(self.subsite.id))
+        self.assertIn("location", progress["missing"])
+        self.assertFalse(progress["sections"]["location"])
+
+    def test_map_location_writes_keep_bitmask(self):
+
+        location = self.subsite.surveylocation
+        data = SurveyLocationSerializer(location).data
+
+        response = self.client.delete(f"/api/survey/map/{location.id}/")
+
+        self.assertEqual(response.status_code, 204)
+        self.subsite.refresh_from_db()
+        self.assertEqual(self.subsite.completeness, 0)
+
+        data["survey"] = str(self.subsite.id)
+
+        response = self.client.post("/api/survey/map/", data, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.subsite.refresh_from_db()
+        self.assertEqual(self.subsite.completeness, LOCATION)
+
+    def test_readiness_matches_bitmask(self):
+
+        readiness = self.client.get(f"/api/survey/create_site/{self.subsite.survey_id}/readiness/").data
+
+        self.subsite.refresh_from_db()
+        sections = readiness["subsites"][0]["sections"]
+
+        self.assertTrue(sections["location"])
+        self.assertFalse(sections["photos"])
+        self.assertEqual(
+            {name for name, done in sections.items() if done and name != "all_photos"},
+            {name for name, done in sections_done(self.subsite.completeness).items() if done}
+        )
+
+
+class WorkflowTransitionTest(TestCase):
+
+    def setUp(self):
+
+        self.surveyor = make_user("surveyor", "SURVEYOR")
+        self.director = make_user("director", "DIRECTOR")
+
+        _, self.subsites = make_surveys(self.surveyor, 2, status="SUPERVISOR_APPROVED")
+
+        SurveySubSite.objects.update(status="SUPERVISOR_APPROVED")
+
+    def test_batch_moves_only_valid_rows(self):
+
+        stale = self.subsites[0]
+        SurveySubSite.objects.filter(id=stale.id).update(status="DIRECTOR_APPROVED")
+
+        moved, errors = transition_subsites(
+            "DIRECTOR", "APPROVE", [s.id for s in self.subsites], self.director, "ok"
+        )
+
+        self.assertEqual(len(moved), 3)
+        self.assertEqual(list(errors), [stale.id])
+
+        self.assertEqual(
+            SurveySubSite.objects.filter(status="DIRECTOR_APPROVED").count(), 4
+        )
+        self.assertEqual(
+            SurveyApproval.objects.filter(approval_level=2, decision="APPROVED").count(), 3
+        )
+
+        subsite = SurveySubSite.objects.get(id=moved[0])
+        self.assertEqual(subsite.approval_summary["2"]["approver_username"], "director")
+        self.assertEqual(subsite.survey.approval_summary["2"]["decision"], "APPROVED")
+
+
+
+class SupervisorRulesTest(TestCase):
+
+    def setUp(self):
+
+        self.surveyor = make_user("surveyor", "SURVEYOR")
+        self.supervisor = make_user("supervisor", "SUPERVISOR")
+
+        surveys, self.subsites = make_surveys(self.surveyor, 1, status="DRAFT")
+        self.survey = surveys[0]
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.supervisor)
+
+    def test_decision_on_any_subsite_status(self):
+
+        # as before the workflow tables: only the survey status freezes decisions
+        response = self.client.post(
+            f"/api/survey/{self.survey.id}/supervisor/",
+            {"subsite_id": str(self.subsites[0].id), "decision": "APPROVE"},
+            format="json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], "SUPERVISOR_APPROVED")
+        self.assertEqual(SurveyApproval.objects.get().approval_level, 1)
+
+    def test_send_to_director_from_any_status_but_sent(self):
+
+        SurveySubSite.objects.filter(id=self.subsites[0].id).update(status="SUPERVISOR_APPROVED")
+
+        url = f"/api/survey/{self.survey.id}/supervisor/submit/"
+
+        response = self.client.post(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Survey.objects.get().status, "SUPERVISOR_APPROVED")
+
+        response = self.client.post(url)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["message"], "Survey already submitted to Director")
+
+class BulkSubsiteDecisionTest(TestCase):
+
+    url = "/api/director/subsites/decisions/"
+
+    def setUp(self):
+
+        self.surveyor = make_user("surveyor", "SURVEYOR")
+        self.director = make_user("director", "DIRECTOR")
+
+        _, self.subsites = make_surveys(self.surveyor, 10, status="SUPERVISOR_APPROVED")
+
+        SurveySubSite.objects.update(status="SUPERVISOR_APPROVED")
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.director)
+
+    def decide(self, subsites, decision="APPROVE"):
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {
+                "decisions": [
+                    {"subsite_id": str(s.id), "decision": decision} for s in subsites
+                ],
+                "remarks": "bulk"
+            }, format="json")
+
+        return response, len(queries)
+
+    def test_queries_do_not_grow_with_batch(self):
+
+        _, few = self.decide(self.subsites[:2])
+        response, many = self.decide(self.subsites[2:], "REJECT")
+
+        self.assertEqual(few, many)
+        self.assertEqual(response.data["updated"], 18)
+        self.assertEqual(
+            SurveyApproval.objects.filter(approval_level=2, remarks="bulk").count(), 20
+        )
+
+    def test_per_id_outcomes(self):
+
+        self.decide(self.subsites[:1])
+
+        response = self.client.post(self.url, {"decisions": [
+            {"subsite_id": str(self.subsites[0].id), "decision": "APPROVE"},
+            {"subsite_id": str(self.subsites[1].id), "decision": "REJECT", "remarks": "no power"},
+            {"subsite_id": str(self.subsites[2].id), "decision": "SEND_TO_ZONAL"},
+            {"subsite_id": "not-a-uuid", "decision": "APPROVE"},
+        ]}, format="json")
+
+        results = response.data["results"]
+
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(results[0]["error"], "Invalid state. Current status is DIRECTOR_APPROVED")
+        self.assertEqual(results[1]["new_status"], "REJECTED_BY_DIRECTOR")
+        self.assertEqual(results[2]["error"], "Invalid decision")
+        self.assertEqual(results[3]["error"], "Invalid subsite_id")
+
+        self.assertEqual(
+            SurveyApproval.objects.get(subsite=self.subsites[1]).remarks, "no power"
+        )
+
+    def test_body_must_be_an_object(self):
+
+        response = self.client.post(self.url, [{"subsite_id": str(self.subsites[0].id)}], format="json")
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_remarks_coerced_and_validated(self):
+
+        response = self.client.post(self.url, {"remarks": None, "decisions": [
+            {"subsite_id": str(self.subsites[0].id), "decision": "APPROVE", "remarks": None},
+            {"subsite_id": str(self.subsites[1].id), "decision": "APPROVE", "remarks": ["x"]},
+        ]}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(response.data["results"][1]["error"], "remarks must be a string")
+        self.assertEqual(SurveyApproval.objects.get(subsite=self.subsites[0]).remarks, "")
+
+        response = self.client.post(self.url, {"remarks": 5, "decisions": [
+            {"subsite_id": str(self.subsites[2].id), "decision": "APPROVE"},
+        ]}, format="json")
+
+        self.assertEqual(response.status_code, 400)
+
+
+# There is no CI configuration in the repository. These run against the
+# PostgreSQL database of s_r_a_a_b/settings.py (python manage.py test
+# survey_app) and are skipped on SQLite.
+@skipIf(connection.vendor == "sqlite", "needs row locks and concurrent writers (PostgreSQL)")
+class ConcurrentDirectorDecisionTest(TransactionTestCase):
+
+    # parallel reviewers; every thread starts its request at the same moment
+    THREADS = 8
+
+    def setUp(self):
+
+        self.surveyor = make_user("surveyor", "SURVEYOR")
+        self.director = make_user("director", "DIRECTOR")
+
+        surveys, self.subsites = make_surveys(
+            self.surveyor, 1, subsites_per_survey=self.THREADS, status="SUPERVISOR_APPROVED"
+        )
+        self.survey = surveys[0]
+
+    def run_parallel(self, requests):
+
+        barrier = threading.Barrier(len(requests))
+
+        def run(request):
+
+            client = APIClient()
+            client.force_authenticate(self.director)
+
+            try:
+                barrier.wait()
+                return request(client).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=len(requests)) as pool:
+            return list(pool.map(run, requests))
+
+    def test_one_subsite_sent_to_zonal(self):
+
+        SurveySubSite.objects.update(status="DIRECTOR_APPROVED")
+
+        codes = self.run_parallel([
+            lambda client, s=s: client.post(f"/api/subsite/{s.id}/send-to-zonal/")
+            for s in self.subsites
+        ])
+
+        self.assertEqual(codes.count(200), 1)
+        self.assertEqual(
+            SurveySubSite.objects.filter(survey=self.survey, status="SENT_TO_ZONAL").count(), 1
+        )
+
+    def test_priority_swaps_keep_priorities_unique(self):
+
+        # every subsite asks for the priority of another one
+        codes = self.run_parallel([
+            lambda client, s=s, p=p: client.put(
+                f"/api/subsite/{s.id}/director-decision/", {"priority": p}, format="json"
+            )
+            for s, p in zip(self.subsites, [*range(2, self.THREADS + 1), 1])
+        ])
+
+        self.assertEqual(codes, [200] * self.THREADS)
+
+        priorities = list(
+            SurveySubSite.objects.filter(survey=self.survey).values_list("priority", flat=True)
+        )
+        self.assertEqual(sorted(priorities), list(range(1, self.THREADS + 1)))
+
+
+class ApprovalSummaryBackfillTest(TestCase):
+
+    def test_backfill_rebuilds_summaries_from_history(self):
+
+        surveyor = make_user("surveyor", "SURVEYOR")
+        director = make_user("director", "DIRECTOR")
+
+        _, subsites = make_surveys(surveyor, 1)
+        SurveySubSite.objects.update(status="SUPERVISOR_APPROVED")
+
+        transition_subsites("DIRECTOR", "REJECT", [subsites[0].id], director)
+
+        expected = SurveySubSite.objects.get(id=subsites[0].id).approval_summary
+        stale = timezone.now() - timedelta(days=1)
+        SurveySubSite.objects.update(approval_summary={}, updated_at=stale)
+        Survey.objects.update(approval_summary={}, updated_at=stale)
+
+        call_command("backfill_approval_summary", stdout=StringIO())
+
+        subsite = SurveySubSite.objects.get(id=subsites[0].id)
+        self.assertEqual(subsite.approval_summary, expected)
+        self.assertEqual(subsite.survey.approval_summary["2"]["decision"], "REJECTED")
+
+        # delta sync clients pick the rebuilt summaries up
+        self.assertGreater(subsite.updated_at, stale)
+        self.assertGreater(subsite.survey.updated_at, stale)
+
+
+class GeographySnapshotTest(TestCase):
+
+    def setUp(self):
+
+        # versions live in the cache, which outlives each test's rollback
+        cache.clear()
+
+        self.state, self.district, self.subdistrict, self.town = make_geography()
+
+        self.client = APIClient()
+        self.client.force_authenticate(make_user("surveyor", "SURVEYOR"))
+        self.url = f"/api/subdistricts/{self.subdistrict.id}/towns/"
+
+    def test_lookup_from_snapshot(self):
+
+        _, snapshot = get_snapshot()
+
+        self.assertEqual(snapshot["states"][0]["name"], "Uttarakhand")
+        self.assertEqual(
+            snapshot["subdistrict"][self.subdistrict.id]["towns"][0]["name"], "Herbertpur"
+        )
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["town_count"], 1)
+
+    def test_etag_not_modified(self):
+
+        etag = self.client.get(self.url)["ETag"]
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_write_invalidates_after_commit(self):
+
+        etag = self.client.get(self.url)["ETag"]
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Town.objects.create(subdistrict=self.subdistrict, name="Dakpathar")
+
+            # not visible to other requests before commit: version unchanged
+            self.assertEqual(self.client.get(self.url)["ETag"], etag)
+
+        for callback in callbacks:
+            callback()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.data["town_count"], 2)
+
+
+@override_settings(SYNC_PAGE_SIZE=3, SYNC_OVERLAP_SECONDS=0)
+class DeltaFeedTest(TestCase):
+
+    url = "/api/survey/changes/"
+
+    def setUp(self):
+
+        self.surveyor = make_user("surveyor", "SURVEYOR")
+
+        # 2 surveys + 4 subsites + 4 locations = 10 rows
+        _, self.subsites = make_surveys(self.surveyor, 2)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.surveyor)
+
+    def follow(self, token=None):
+
+        seen, pages = {}, 0
+
+        while True:
+            response = self.client.get(self.url, {"since": token} if token else {})
+            self.assertEqual(response.status_code, 200)
+
+            pages += 1
+            token = response.data["sync_token"]
+
+            for key in ("surveys", "subsites", "location_details"):
+                seen.setdefault(key, []).extend(row["id"] for row in response.data[key])
+
+            if not response.data["has_more"]:
+                return seen, pages, token
+
+    def test_full_download_is_paged(self):
+
+        seen, pages, _ = self.follow()
+
+        self.assertEqual(pages, 4)
+        self.assertEqual(len(seen["surveys"]), 2)
+        self.assertEqual(len(set(seen["subsites"])), 4)
+        self.assertEqual(len(seen["subsites"]), 4)
+        self.assertEqual(len(seen["location_details"]), 4)
+
+    def test_next_sync_returns_only_changes(self):
+
+        _, _, token = self.follow()
+
+        subsite = self.subsites[0]
+        subsite.remarks = "moved gate"
+        subsite.save()
+
+        seen, pages, _ = self.follow(token)
+
+        self.assertEqual(pages, 1)
+        self.assertEqual(seen["subsites"], [str(subsite.id)])
+        self.assertEqual(seen["surveys"], [])
+
+    def test_invalid_token(self):
+
+        response = self.client.get(self.url, {"since": "not-a-token"})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class MapExportTest(TestCase):
+
+    url = "/api/survey/map/"
+
+    def setUp(self):
+
+        self.surveyor = make_user("surveyor", "SURVEYOR")
+
+        _, self.subsites = make_surveys(self.surveyor, 1, subsites_per_survey=3)
+
+        # one site outside the Dehradun bbox
+        SurveyLocation.objects.filter(survey=self.subsites[2]).update(latitude=12.97, longitude=77.59)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.surveyor)
+
+    def export(self, **params):
+
+        response = self.client.get(self.url, params)
+
+        self.assertEqual(response.status_code, 200)
+
+        return b"".join(response.streaming_content).decode()
+
+    def test_geojson_features(self):
+
+        data = json.loads(self.export(export="geojson", bbox="77,30,78,31"))
+
+        self.assertEqual(data["type"], "FeatureCollection")
+        self.assertEqual(
+            {f["properties"]["id"] for f in data["features"]},
+            {str(s.id) for s in self.subsites[:2]}
+        )
+        self.assertEqual(data["features"][0]["geometry"]["coordinates"], [77.73, 30.43])
+        self.assertEqual(data["features"][0]["properties"]["photos"]["north"], None)
+
+    def test_csv_rows(self):
+
+        rows = list(csv.reader(StringIO(self.export(export="csv"))))
+
+        self.assertEqual(rows[0][:3], ["id", "lat", "lon"])
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[3][:3], [str(self.subsites[2].id), "12.97", "77.59"])
+
+    def test_filters_and_bad_bbox(self):
+
+        self.assertEqual(self.export(export="csv", status="FINAL_APPROVED").count("\n"), 1)
+
+        response = self.client.get(self.url, {"export": "csv", "bbox": "1,2,3"})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class MapSessionAndVersionTest(TestCase):
+
+    url = "/api/survey/map/"
+
+    def setUp(self):
+
+        cache.clear()
+
+        self.surveyor = make_user("surveyor", "SURVEYOR")
+        _, self.subsites = make_surveys(self.surveyor, 1)
+
+        self.client = APIClient(enforce_csrf_checks=True)
+        self.client.login(username="surveyor", password="pass1234")
+
+    def test_session_reads_but_does_not_write(self):
+
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        response = self.client.post(self.url, {"survey": str(self.subsites[0].id)}, format="json")
+
+        # token-only for writes: rejected as unauthenticated, not by CSRF
+        self.assertEqual(response.status_code, 401)
+
+    def test_location_write_bumps_version_after_commit(self):
+
+        version = get_version(MAP_NAMESPACE)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subsites[0].surveylocation.delete()
+            self.assertEqual(get_version(MAP_NAMESPACE), version)
+
+        self.assertNotEqual(get_version(MAP_NAMESPACE), version)
+
+
+class TownCoverageTest(TestCase):
+
+    url = "/api/coverage/gaps/"
+
+    def setUp(self):
+
+        cache.clear()
+
+        self.surveyor = make_user("surveyor", "SURVEYOR")
+        _, self.subsites = make_surveys(self.surveyor, 1, subsites_per_survey=1)
+        self.subsites[0].status = "FINAL_APPROVED"
+        self.subsites[0].save()
+
+        district = District.objects.get()
+        subdistrict = SubDistrict.objects.get()
+
+        other_state = State.objects.create(name="Karnataka")
+        other_district = District.objects.create(state=other_state, name="Bengaluru")
+        other_subdistrict = SubDistrict.objects.create(district=other_district, name="Anekal")
+
+        for n, (lat, lon) in enumerate([(30.1, 78.0), (29.5, 79.2), (31.0, 77.1)]):
+            Town.objects.create(subdistrict=subdistrict, name=f"Town {n}", latitude=lat, longitude=lon)
+
+        Town.objects.create(subdistrict=other_subdistrict, name="Far", latitude=12.8, longitude=77.7)
+
+        station_district = Districtdb.objects.create(
+            state=Statedb.objects.create(name="Uttarakhand"), name="Dehradun"
+        )
+
+        for n, (lat, lon) in enumerate([(30.3, 78.0), (29.4, 79.5), (12.9, 77.6)]):
+            Stationdb.objects.create(district=station_district, name=f"ST{n}", latitude=lat, longitude=lon)
+
+        self.district = district
+        self.other_state = other_state
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.surveyor)
+
+    def test_grid_matches_brute_force(self):
+
+        _, lats, lons = load_towns()
+        stations = station_index()
+
+        grid_idx, grid_dist = stations.nearest_arrays(lats, lons)
+        brute_idx, brute_dist = brute_force_nearest(stations, lats, lons)
+
+        self.assertEqual(grid_idx.tolist(), brute_idx.tolist())
+        self.assertTrue(np.allclose(grid_dist, brute_dist))
+
+    def test_saved_gap_is_nearest_of_station_and_survey(self):
+
+        compute_coverage()
+
+        herbertpur = TownCoverage.objects.get(town__name="Herbertpur")
+
+        # the approved subsite sits on the town
+        self.assertEqual(herbertpur.nearest_survey_id, self.subsites[0].id)
+        self.assertEqual(herbertpur.gap_km, 0.0)
+        self.assertEqual(TownCoverage.objects.count(), 5)
+
+    def test_api_filters(self):
+
+        compute_coverage()
+
+        rows = self.client.get(self.url).json()
+
+        self.assertEqual(len(rows), 5)
+        self.assertEqual([r["rank"] for r in rows], [1, 2, 3, 4, 5])
+        self.assertEqual(rows, sorted(rows, key=lambda r: -r["gap_km"]))
+
+        by_state = self.client.get(self.url, {"state": self.other_state.id}).json()
+        self.assertEqual([r["town"] for r in by_state], ["Far"])
+
+        by_district = self.client.get(self.url, {"district": self.district.id}).json()
+        self.assertEqual(len(by_district), 4)
+
+        wide = self.client.get(self.url, {"min_gap_km": 10}).json()
+        self.assertTrue(wide)
+        self.assertTrue(all(r["gap_km"] >= 10 for r in wide))
+
+        self.assertEqual(len(self.client.get(self.url, {"limit": 2}).json()), 2)
+
+    def test_bad_limit(self):
+
+        for limit in ("-1", "0", "x"):
+            response = self.client.get(self.url, {"limit": limit})
+            self.assertEqual(response.status_code, 400)
+
+
+class GeographyImportTest(TestCase):
+
+    def setUp(self):
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "towns.xlsx"
+
+        self.rows = [
+            ("UTTARAKHAND", "DEHRADUN", "VIKASNAGAR", "KODUR", 30.1, 77.1),
+            ("UTTARAKHAND", "DEHRADUN", "VIKASNAGAR", "KODUR 1", 30.2, 77.2),
+            ("UTTARAKHAND", "DEHRADUN", "VIKASNAGAR", "KODUR", 30.3, 77.3),
+            ("UTTARAKHAND", "DEHRADUN", "VIKASNAGAR", "KODUR", 30.4, 77.4),
+            ("UTTARAKHAND", "DEHRADUN", "CHAKRATA", "KODUR", 30.5, 77.5),
+        ]
+        self.write(self.rows)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, rows):
+
+        pd.DataFrame(
+            rows, columns=["STATE_UT", "DISTRICT", "SUBDISTRICT", "TOWN", "Lat", "Long"]
+        ).to_excel(self.path, index=False)
+
+    def towns(self):
+
+        return {
+            (t.subdistrict.name, t.name): (t.latitude, t.longitude)
+            for t in Town.objects.select_related("subdistrict")
+        }
+
+    def test_duplicates_are_numbered_without_collisions(self):
+
+        import_geography(self.path, cache=False)
+
+        self.assertEqual(self.towns(), {
+            ("VIKASNAGAR", "KODUR"): (30.1, 77.1),
+            ("VIKASNAGAR", "KODUR 1"): (30.2, 77.2),
+            ("VIKASNAGAR", "KODUR 2"): (30.3, 77.3),
+            ("VIKASNAGAR", "KODUR 3"): (30.4, 77.4),
+            ("CHAKRATA", "KODUR"): (30.5, 77.5),
+        })
+
+    def test_rerun_is_idempotent(self):
+
+        import_geography(self.path, cache=False)
+        result = import_geography(self.path, cache=False)
+
+        self.assertEqual(Town.objects.count(), 5)
+        self.assertEqual(
+            {level: counts["created"] for level, counts in result["changes"].items()},
+            {"states": 0, "districts": 0, "subdistricts": 0, "towns": 0}
+        )
+        self.assertEqual(result["changes"]["towns"]["unchanged"], 5)
+
+    def test_sync_updates_and_deletes(self):
+
+        import_geography(self.path, cache=False)
+
+        # one town moved, the last one dropped from the source
+        rows = list(self.rows[:-1])
+        rows[2] = rows[2][:4] + (31.0, 78.0)
+        self.write(rows)
+
+        call_command("import_geography", str(self.path), "--no-cache", stdout=StringIO())
+        self.assertEqual(Town.objects.get(name="KODUR 2").latitude, 30.3)
+
+        out = StringIO()
+        call_command("import_geography", str(self.path), "--no-cache", "--sync", "--delete", stdout=out)
+
+        self.assertEqual(Town.objects.get(name="KODUR 2").latitude, 31.0)
+        self.assertFalse(Town.objects.filter(subdistrict__name="CHAKRATA").exists())
+        self.assertIn("towns: created=0, updated=1, deleted=1, unchanged=3", out.getvalue())
+
+
+class StationImportTest(TestCase):
+
+    columns = ["Sl_No_", "NAME", "CODE", "STATE", "DISTRICT", "LATITUDE", "LONGITUDE", "E_HEIGHT"]
+
+    def setUp(self):
+
+        cache.clear()
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "stations.xlsx"
+
+        self.rows = [
+            (1, "DEHRADUN", "DDN1", "UTTARAKHAND", "DEHRADUN", 30.32, 78.03, 640.5),
+            (2, "MUSSOORIE", "MSR1", "UTTARAKHAND", "DEHRADUN", 30.45, 78.07, 2005.0),
+            (3, "HALDWANI", "HLD1", "UTTARAKHAND", "NAINITAL", 29.22, 79.51, None),
+            (4, "NO FIX", "NOF1", "UTTARAKHAND", "NAINITAL", None, None, None),
+        ]
+        self.write(self.rows)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, rows):
+        pd.DataFrame(rows, columns=self.columns).to_excel(self.path, index=False)
+
+    def test_upsert_updates_only_changed_stations(self):
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first = import_stations(self.path, cache=False)
+
+        self.assertEqual(first["skipped"], 1)
+        self.assertEqual(first["changes"]["stations"]["created"], 3)
+        self.assertEqual(Districtdb.objects.get(name="DEHRADUN").latitude, 30.32)
+
+        mussoorie = Stationdb.objects.get(name="MUSSOORIE")
+        version = get_version(MAP_NAMESPACE)
+
+        # new height for one station; sync without --delete keeps the rest
+        rows = [list(r) for r in self.rows[:3]]
+        rows[0][7] = 641.0
+        self.write(rows)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second = import_stations(self.path, cache=False, sync=True)
+
+        self.assertEqual(second["changes"]["stations"], {
+            "created": 0, "updated": 1, "deleted": 0, "unchanged": 2
+        })
+        self.assertEqual(Stationdb.objects.get(name="DEHRADUN").height, 641.0)
+        self.assertEqual(Stationdb.objects.get(name="MUSSOORIE").id, mussoorie.id)
+        self.assertNotEqual(get_version(MAP_NAMESPACE), version)
+
+        # nothing changed: no writes and the map version stays put
+        version = get_version(MAP_NAMESPACE)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            third = import_stations(self.path, cache=False, sync=True, dry_run=True)
+
+        self.assertEqual(third["changes"]["stations"]["unchanged"], 3)
+        self.assertEqual(get_version(MAP_NAMESPACE), version)
+
+    def test_sync_corrects_state_and_district_coordinates(self):
+
+        import_stations(self.path, cache=False)
+
+        state = Statedb.objects.get(name="UTTARAKHAND")
+        district = Districtdb.objects.get(name="DEHRADUN")
+
+        # the first station of a state / district moved
+        rows = [list(r) for r in self.rows]
+        rows[0][5:7] = [30.33, 78.04]
+        self.write(rows)
+
+        # without sync the parents stay as they were
+        plain = import_stations(self.path, cache=False)
+
+        self.assertEqual(plain["changes"]["states"]["updated"], 0)
+        self.assertEqual(Statedb.objects.get(id=state.id).latitude, 30.32)
+
+        result = import_stations(self.path, cache=False, sync=True)
+
+        self.assertEqual(result["changes"]["states"], {"created": 0, "updated": 1, "unchanged": 0})
+        self.assertEqual(result["changes"]["districts"], {"created": 0, "updated": 1, "unchanged": 1})
+
+        state.refresh_from_db()
+        district.refresh_from_db()
+
+        self.assertEqual((state.latitude, state.longitude), (30.33, 78.04))
+        self.assertEqual((district.latitude, district.longitude), (30.33, 78.04))
+        self.assertEqual(Districtdb.objects.get(name="NAINITAL").latitude, 29.22)
+
+        again = import_stations(self.path, cache=False, sync=True)
+
+        self.assertEqual(again["changes"]["districts"], {"created": 0, "updated": 0, "unchanged": 2})
+
+
+class SourceCacheTest(TestCase):
+
+    def setUp(self):
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "towns.xlsx"
+
+        pd.DataFrame({
+            "STATE_UT": ["UTTARAKHAND", "UTTARAKHAND", None, "KARNATAKA"],
+            "TOWN": [" KODUR ", "KODUR", "ANEKAL", None],
+            "Lat": [30.1, None, 12.8, 13.0],
+            "Code": [1, "A2", None, 4],
+        }).to_excel(self.path, index=False)
+
+        patcher = mock.patch.object(source_cache, "CACHE_DIR", Path(self.tmp.name) / "cache")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_warm_load_matches_cold(self):
+
+        cold = load_source(self.path, parse_workbook)
+        warm = load_source(self.path, parse_workbook)
+
+        pd.testing.assert_frame_equal(warm, cold)
+        pd.testing.assert_frame_equal(warm, parse_workbook(self.path))
+        self.assertEqual(warm["TOWN"][0], "KODUR")
+
+    def test_undecoded_text_stays_mapped(self):
+
+        load_source(self.path, parse_workbook)
+        warm = load_source(self.path, parse_workbook, decode=False)
+
+        towns = warm["TOWN"].array
+
+        self.assertIsInstance(towns, pd.Categorical)
+        self.assertIsInstance(towns.codes.base, np.memmap)
+        self.assertEqual(list(warm["STATE_UT"].astype(object).fillna("-")), [
+            "UTTARAKHAND", "UTTARAKHAND", "-", "KARNATAKA"
+        ])
+
+
+class ChunkedUploadTest(TestCase):
+
+    url = "/api/rinex/uploads/"
+
+    def setUp(self):
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+        media = override_settings(MEDIA_ROOT=self.tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.body = b"RINEX OBSERVATION DATA\n" * 50
+
+        self.surveyor = make_user("surveyor", "SURVEYOR")
+        self.client = APIClient()
+        self.client.force_authenticate(self.surveyor)
+
+        response = self.client.post(self.url, {
+            "filename": "site.obs",
+            "size": len(self.body),
+            "sha256": hashlib.sha256(self.body).hexdigest(),
+        }, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.upload_url = response["Location"]
+
+    def append(self, offset, data, **headers):
+
+        return self.client.generic(
+            "PATCH", self.upload_url, data,
+            content_type="application/offset+octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset),
+            **headers
+        )
+
+    def test_resume_and_commit(self):
+
+        response = self.append(0, self.body[:500])
+        self.assertEqual(response["Upload-Offset"], "500")
+
+        # a retried chunk at a stale offset is refused with the current one
+        response = self.append(0, self.body[:500])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["offset"], 500)
+
+        self.assertEqual(self.client.head(self.upload_url)["Upload-Offset"], "500")
+
+        response = self.append(500, self.body[500:])
+        self.assertEqual(response["Upload-Offset"], str(len(self.body)))
+
+        response = self.client.post(f"{self.upload_url}commit/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "COMPLETED")
+
+        rinex = RinexFile.objects.get()
+        self.assertEqual(rinex.file.read(), self.body)
+
+    def test_commit_onto_subsite_releases_previous_file_on_commit(self):
+
+        _, (subsite,) = make_surveys(self.surveyor, 1, subsites_per_survey=1)
+        subsite.rinex_file = SimpleUploadedFile("old.obs", b"old observation")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            subsite.save()
+
+        previous = subsite.rinex_file.name
+        upload = RinexUpload.objects.get()
+        upload.subsite = subsite
+        upload.save(update_fields=["subsite"])
+
+        self.append(0, self.body)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    commit_upload(self.surveyor, upload.id)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+        self.assertTrue(cas.exists(previous))
+        self.assertEqual(StoredBlob.objects.get(name=previous).ref_count, 1)
+
+        # the rolled back commit had already moved the part file away
+        upload.refresh_from_db()
+        Path(self.tmp.name, upload.path).write_bytes(self.body)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"{self.upload_url}commit/")
+
+        self.assertEqual(response.status_code, 200)
+
+        subsite.refresh_from_db()
+
+        self.assertEqual(subsite.rinex_file.read(), self.body)
+        self.assertFalse(cas.exists(previous))
+        self.assertFalse(StoredBlob.objects.filter(name=previous).exists())
+
+        # the RinexFile and the subsite each hold a reference
+        self.assertEqual(StoredBlob.objects.get(name=subsite.rinex_file.name).ref_count, 2)
+
+    def test_checksum_mismatch_keeps_offset(self):
+
+        bad = "sha256 " + base64.b64encode(hashlib.sha256(b"other").digest()).decode()
+
+        response = self.append(0, self.body[:100], HTTP_UPLOAD_CHECKSUM=bad)
+
+        self.assertEqual(response.status_code, 460)
+        self.assertEqual(RinexUpload.objects.get().offset, 0)
+        self.assertIsNone(RinexUpload.objects.get().writing_until)
+
+        good = "sha256 " + base64.b64encode(hashlib.sha256(self.body[:100]).digest()).decode()
+
+        self.assertEqual(self.append(0, self.body[:100], HTTP_UPLOAD_CHECKSUM=good)["Upload-Offset"], "100")
+
+    def test_chunk_in_progress_blocks_others(self):
+
+        upload = RinexUpload.objects.get()
+
+        # another request holds the lease
+        RinexUpload.objects.filter(id=upload.id).update(
+            writing_until=timezone.now() + timedelta(minutes=5)
+        )
+
+        self.assertEqual(self.append(0, self.body[:100]).status_code, 409)
+        self.assertEqual(self.client.delete(self.upload_url).status_code, 409)
+
+        # a lease that ran out was left by a request that died
+        RinexUpload.objects.filter(id=upload.id).update(
+            writing_until=timezone.now() - timedelta(seconds=1)
+        )
+
+        self.assertEqual(self.append(0, self.body[:100])["Upload-Offset"], "100")
+
+    def test_no_transaction_open_while_reading_the_body(self):
+
+        # TestCase's own atomic blocks are open around every test
+        depth = len(connection.savepoint_ids)
+        seen = []
+
+        class Body(BytesIO):
+            def read(self, size=-1):
+                seen.append(len(connection.savepoint_ids))
+                return super().read(size)
+
+        append_chunk(self.surveyor, RinexUpload.objects.get().id, 0, 100, Body(self.body[:100]))
+
+        self.assertTrue(seen)
+        self.assertEqual(set(seen), {depth})
+
+
+class RinexParserTest(TestCase):
+
+    testdata = Path(__file__).resolve().parent / "testdata"
+
+    def test_v2_header_and_epochs(self):
+
+        parsed = parse_rinex(self.testdata / "ddn1_v2.obs")
+
+        self.assertEqual(parsed["version"], 2.11)
+        self.assertEqual(parsed["marker_name"], "DDN1")
+        self.assertEqual(parsed["receiver_type"], "TRIMBLE NETR9")
+        self.assertEqual(parsed["antenna_type"], "TRM59800.00     NONE")
+        self.assertEqual(parsed["obs_types"], {"G": ["L1", "L2", "C1", "P1", "P2", "S1", "S2"]})
+        self.assertEqual(parsed["approx_position"], [1191612.1234, 5491102.5678, 3201245.9012])
+
+        # 14 satellites (continuation line), an event record and a
+        # cycle-slip record in between; no INTERVAL line, so the common step
+        self.assertEqual(parsed["epoch_count"], 5)
+        self.assertEqual(parsed["first_epoch"], datetime(2024, 1, 15, 0, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(parsed["last_epoch"], datetime(2024, 1, 15, 0, 3, 30, tzinfo=dt_timezone.utc))
+        self.assertEqual(parsed["interval"], 30.0)
+        self.assertEqual(parsed["gap_count"], 1)
+        self.assertEqual(parsed["gap_seconds"], 90.0)
+        self.assertEqual(parsed["max_gap_seconds"], 120.0)
+
+    def test_v3_header_and_epochs(self):
+
+        parsed = parse_rinex(self.testdata / "msr1_v3.rnx")
+
+        self.assertEqual(parsed["version"], 3.04)
+        self.assertEqual(parsed["marker_name"], "MSR1")
+        self.assertEqual(parsed["receiver_number"], "7001")
+        self.assertEqual(parsed["obs_types"], {"G": ["C1C", "L1C", "D1C", "S1C"], "R": ["C1C", "L1C"]})
+
+        self.assertEqual(parsed["epoch_count"], 4)
+        self.assertEqual(parsed["interval"], 30.0)
+        self.assertEqual(parsed["last_epoch"], datetime(2024, 1, 15, 0, 4, tzinfo=dt_timezone.utc))
+        self.assertEqual(parsed["gap_count"], 1)
+        self.assertEqual(parsed["gap_seconds"], 150.0)
+
+        lat, lon, _ = ecef_to_geodetic(*parsed["approx_position"])
+        self.assertAlmostEqual(lat, 29.908, places=3)
+        self.assertAlmostEqual(lon, 77.770, places=3)
+
+    def test_not_rinex(self):
+
+        with tempfile.NamedTemporaryFile("w", suffix=".obs") as f:
+            f.write("hello\n")
+            f.flush()
+
+            with self.assertRaises(RinexError):
+                parse_rinex(f.name)
+
+
+class RinexMetadataTest(TestCase):
+
+    testdata = Path(__file__).parent / "testdata"
+    url = "/api/rinex/metadata/"
+
+    def setUp(self):
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+        media = override_settings(MEDIA_ROOT=self.tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.north = make_user("north", "SURVEYOR", zone="NORTH")
+        self.south = make_user("south", "SURVEYOR", zone="SOUTH")
+
+        (survey,), (self.north_site,) = make_surveys(self.north, 1, subsites_per_survey=1)
+
+        survey.pk, survey.surveyor = uuid.uuid4(), self.south
+        survey.save()
+        self.south_site = SurveySubSite.objects.create(survey=survey, location="Site 1", priority=1)
+
+        self.client = APIClient()
+
+    def attach(self, subsite, fixture="ddn1_v2.obs"):
+
+        subsite.rinex_file = SimpleUploadedFile(fixture, (self.testdata / fixture).read_bytes())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            subsite.save()
+
+    def visible_to(self, user, **params):
+
+        self.client.force_authenticate(user)
+
+        return self.client.get(self.url, params)
+
+    def test_shared_blob_is_parsed_once_and_linked_everywhere(self):
+
+        self.attach(self.north_site)
+
+        self.assertEqual(Task.objects.count(), 1)
+        self.assertEqual(run_next("worker-1"), "SUCCEEDED")
+
+        metadata = RinexMetadata.objects.get()
+
+        self.assertEqual(metadata.status, "PARSED")
+        self.assertEqual(metadata.marker_name, "DDN1")
+
+        # same bytes from another zone: linked, not parsed again
+        self.attach(self.south_site)
+        self.attach(self.south_site)
+
+        uploader = make_user("uploader", "SURVEYOR", zone="EAST")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RinexFile.objects.create(
+                file=SimpleUploadedFile("copy.obs", (self.testdata / "ddn1_v2.obs").read_bytes()),
+                uploaded_by=uploader
+            )
+
+        self.assertEqual(Task.objects.count(), 1)
+        self.assertEqual(self.south_site.rinex_file.name, metadata.source_name)
+        self.assertEqual(set(metadata.subsites.all()), {self.north_site, self.south_site})
+        self.assertEqual(metadata.rinex_files.get().uploaded_by, uploader)
+
+        for user in [
+            self.north, self.south, uploader,
+            make_user("supervisor", "SUPERVISOR", zone="SOUTH"),
+            make_user("admin", "ADMIN"),
+        ]:
+            response = self.visible_to(user)
+            self.assertEqual([row["id"] for row in response.data], [metadata.id], user.username)
+
+        self.assertEqual(self.visible_to(make_user("other", "SURVEYOR", zone="WEST")).data, [])
+
+        # indexing again keeps every link
+        index_file(metadata.source_name)
+        self.assertEqual(metadata.subsites.count(), 2)
+
+    def test_replaced_file_drops_the_link(self):
+
+        self.attach(self.north_site)
+        self.attach(self.south_site)
+
+        while run_next("worker-1"):
+            pass
+
+        metadata = RinexMetadata.objects.get()
+
+        self.attach(self.south_site, "msr1_v3.rnx")
+
+        self.assertEqual(list(metadata.subsites.all()), [self.north_site])
+        self.assertEqual(Task.objects.filter(status="QUEUED").count(), 1)
+
+        run_next("worker-1")
+
+        self.assertEqual(
+            RinexMetadata.objects.get(subsites=self.south_site).marker_name, "MSR1"
+        )
+
+    def test_list_params(self):
+
+        self.attach(self.north_site)
+        run_next("worker-1")
+
+        self.assertEqual(self.visible_to(self.north, limit=-5).status_code, 400)
+        self.assertEqual(self.visible_to(self.north, limit=0).status_code, 400)
+        self.assertEqual(self.visible_to(self.north, subsite="nope").status_code, 400)
+
+        self.assertEqual(len(self.visible_to(self.north, subsite=self.north_site.id).data), 1)
+        self.assertEqual(self.visible_to(self.north, subsite=self.south_site.id).data, [])
+
+
+class ContentAddressedStorageTest(TestCase):
+
+    def setUp(self):
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+        media = override_settings(MEDIA_ROOT=self.tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def stored_files(self):
+        root = Path(self.tmp.name, "cas")
+
+        return sorted(
+            p.name for p in root.rglob("*")
+            if p.is_file() and p.relative_to(root).parts[0] != "tmp"
+        )
+
+    def test_same_bytes_share_one_blob(self):
+
+        first = cas.save("a.obs", ContentFile(b"same observation"))
+        second = cas.save("b.obs", ContentFile(b"same observation"))
+
+        blob = StoredBlob.objects.get()
+
+        self.assertEqual(first, second)
+        self.assertEqual(blob.name, first)
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(blob.digest, hashlib.sha256(b"same observation").hexdigest())
+        self.assertEqual(self.stored_files(), [Path(first).name])
+
+        # one reference goes, the file stays for the other
+        cas.delete(first)
+
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+        self.assertTrue(cas.exists(first))
+
+        cas.delete(first)
+
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertFalse(cas.exists(first))
+
+    def test_deleting_one_row_keeps_the_shared_file(self):
+
+        surveyor = make_user("surveyor", "SURVEYOR")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first, second = [
+                RinexFile.objects.create(
+                    file=SimpleUploadedFile(f"{n}.obs", b"same observation"), uploaded_by=surveyor
+                )
+                for n in range(2)
+            ]
+
+        name = first.file.name
+
+        self.assertEqual(second.file.name, name)
+        self.assertEqual(StoredBlob.objects.get(name=name).ref_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+
+        self.assertEqual(StoredBlob.objects.get(name=name).ref_count, 1)
+        self.assertEqual(second.file.read(), b"same observation")
+
+    def test_file_appearing_under_the_blob_name_is_replaced(self):
+
+        name = cas.save("a.obs", ContentFile(b"observation"))
+
+        # the blob row says "write again", but a file is there by the time
+        # FileSystemStorage opens it, so it saves under another name
+        with mock.patch.object(cas, "exists", return_value=False):
+            self.assertEqual(cas.save("b.obs", ContentFile(b"observation")), name)
+
+        self.assertEqual(self.stored_files(), [Path(name).name])
+        self.assertEqual(StoredBlob.objects.get().ref_count, 2)
+
+    def test_backfill_moves_legacy_files_into_the_store(self):
+
+        legacy = "rinex_files/site.obs"
+        path = Path(self.tmp.name, legacy)
+        path.parent.mkdir(parents=True)
+        path.write_bytes(b"legacy observation")
+
+        surveyor = make_user("surveyor", "SURVEYOR")
+        _, (subsite,) = make_surveys(surveyor, 1, subsites_per_survey=1)
+
+        rinex = RinexFile.objects.create(file=legacy, uploaded_by=surveyor)
+        SurveySubSite.objects.filter(id=subsite.id).update(rinex_file=legacy)
+        RinexMetadata.objects.create(source_name=legacy, status="PARSED")
+        RinexFile.objects.create(file="rinex_files/gone.obs", uploaded_by=surveyor)
+
+        before = SurveySubSite.objects.get(id=subsite.id).updated_at
+        out = StringIO()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("backfill_blobs", stdout=out)
+
+        digest = hashlib.sha256(b"legacy observation").hexdigest()
+        blob = StoredBlob.objects.get()
+
+        rinex.refresh_from_db()
+        subsite.refresh_from_db()
+
+        self.assertEqual(blob.digest, digest)
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual((rinex.file.name, rinex.digest), (blob.name, digest))
+        self.assertEqual(subsite.rinex_file.name, blob.name)
+        self.assertGreater(subsite.updated_at, before)
+        self.assertEqual(RinexMetadata.objects.get().source_name, blob.name)
+        self.assertFalse(path.exists())
+        self.assertEqual(cas.open(blob.name).read(), b"legacy observation")
+        self.assertIn("rinex_files/gone.obs: file is missing", out.getvalue())
+
+        # a re-upload of the same bytes is deduplicated now
+        with self.captureOnCommitCallbacks(execute=True):
+            again = RinexFile.objects.create(
+                file=SimpleUploadedFile("again.obs", b"legacy observation"), uploaded_by=surveyor
+            )
+
+        self.assertEqual(again.file.name, blob.name)
+        self.assertEqual(StoredBlob.objects.get().ref_count, 3)
+
+
+class ReplacedMediaTest(TestCase):
+
+    def setUp(self):
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+        media = override_settings(MEDIA_ROOT=self.tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.surveyor = make_user("surveyor", "SURVEYOR")
+        _, subsites = make_surveys(self.surveyor, 1, subsites_per_survey=1)
+        self.subsite = subsites[0]
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.surveyor)
+        self.url = f"/api/survey/subsite/{self.subsite.id}/photo/"
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {
+                "north_photo": make_image("red"),
+                "east_photo": make_image("green"),
+                "south_photo": make_image("blue"),
+                "west_photo": make_image("white"),
+            }, format="multipart")
+
+        self.assertEqual(response.status_code, 201)
+        self.photo = SurveyPhoto.objects.get()
+
+    def test_replacing_a_photo_releases_the_old_blob(self):
+
+        old_north = self.photo.north_photo.name
+        east = self.photo.east_photo.name
+
+        self.assertEqual(StoredBlob.objects.get(name=old_north).ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                f"{self.url}{self.photo.id}/",
+                {"north_photo": make_image("black")},
+                format="multipart"
+            )
+
+        self.assertEqual(response.status_code, 200)
+
+        self.photo.refresh_from_db()
+
+        self.assertNotEqual(self.photo.north_photo.name, old_north)
+        self.assertFalse(StoredBlob.objects.filter(name=old_north).exists())
+        self.assertFalse(cas.exists(old_north))
+
+        # untouched sides keep their reference
+        self.assertEqual(StoredBlob.objects.get(name=east).ref_count, 1)
+        self.assertEqual(StoredBlob.objects.get(name=self.photo.north_photo.name).ref_count, 1)
+
+    def test_rolled_back_replacement_keeps_the_blob(self):
+
+        old_north = self.photo.north_photo.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.photo.north_photo = make_image("black")
+                    self.photo.save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+        self.assertEqual(StoredBlob.objects.get(name=old_north).ref_count, 1)
+
+
+class ImageRenditionTest(TestCase):
+
+    def setUp(self):
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+        media = override_settings(MEDIA_ROOT=self.tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        surveyor = make_user("surveyor", "SURVEYOR")
+        _, subsites = make_surveys(surveyor, 1, subsites_per_survey=1)
+        self.subsite = subsites[0]
+
+    def jpeg_with_exif(self):
+
+        exif = Image.Exif()
+        exif[306] = "2024:01:15 10:30:00"
+        exif[0x8825] = {1: "N", 2: (30.0, 26.0, 24.0), 3: "E", 4: (77.0, 43.0, 48.0)}
+
+        buffer = BytesIO()
+        Image.new("RGB", (2000, 1000), "red").save(buffer, "JPEG", exif=exif)
+
+        return SimpleUploadedFile("north.jpg", buffer.getvalue(), content_type="image/jpeg")
+
+    def test_renditions_and_exif(self):
+
+        photo = SurveyPhoto.objects.create(
+            sub_site=self.subsite,
+            north_photo=self.jpeg_with_exif(),
+            east_photo=make_image("green"),
+            south_photo=make_image("blue"),
+            west_photo=SimpleUploadedFile("west.png", b"not an image")
+        )
+
+        processed = {m.kind: m for m in process_instance(photo)}
+
+        self.assertEqual(set(processed), {"north", "east", "south", "west"})
+
+        north = processed["north"]
+        self.assertEqual((north.width, north.height), (2000, 1000))
+        self.assertEqual(north.source_name, photo.north_photo.name)
+        self.assertEqual(north.taken_at.replace(tzinfo=None), datetime(2024, 1, 15, 10, 30))
+        self.assertAlmostEqual(north.latitude, 30.44)
+        self.assertAlmostEqual(north.longitude, 77.73)
+
+        for size_name, longest in RENDITION_SIZES.items():
+            with renditions.open(rendition_name(photo.north_photo.name, size_name)) as f, Image.open(f) as img:
+                self.assertEqual(img.format, "WEBP")
+                self.assertEqual(max(img.size), longest)
+                self.assertFalse(img.getexif())
+
+        self.assertTrue(processed["west"].error)
+        self.assertIsNone(processed["west"].width)
+
+        # nothing changed since: nothing to do
+        self.assertEqual(process_instance(photo), [])
+
+
+# task functions for TaskQueueTest (looked up by dotted path)
+def echo_task(value):
+    return {"value": value}
+
+
+def failing_task():
+    raise RuntimeError("boom")
+
+
+@override_settings(TASKS_EAGER=False, TASK_RETRY_BASE_SECONDS=30, TASK_RETRY_MAX_SECONDS=100)
+class TaskQueueTest(TestCase):
+
+    def test_status_api_limit(self):
+
+        user = make_user("surveyor", "SURVEYOR")
+        enqueue(echo_task, user=user, value=1)
+        enqueue(echo_task, user=user, value=2)
+
+        client = APIClient()
+        client.force_authenticate(user)
+
+        self.assertEqual(client.get("/api/tasks/", {"limit": -5}).status_code, 400)
+        self.assertEqual(client.get("/api/tasks/", {"limit": 0}).status_code, 400)
+
+        response = client.get("/api/tasks/", {"limit": 1})
+
+        self.assertEqual(response.data["counts"], {"QUEUED": 2})
+        self.assertEqual(len(response.data["results"]), 1)
+
+    @override_settings(TASKS_EAGER=False)
+    def test_forgot_password_mail_is_sent_by_the_worker(self):
+
+        user = make_user("surveyor", "SURVEYOR")
+        client = APIClient()
+
+        response = client.post("/api/forgot-password/", {"email": user.email}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+
+        first = Task.objects.get()
+
+        self.assertEqual(first.name, "survey_app.tasks.send_otp_mail")
+        self.assertEqual(first.kwargs, {"otp_id": PasswordResetOTP.objects.get().id})
+        self.assertEqual(mail.outbox, [])
+
+        # a second request replaces the OTP; only the newest one is mailed
+        client.post("/api/forgot-password/", {"email": user.email}, format="json")
+        otp = PasswordResetOTP.objects.get()
+
+        self.assertEqual(run_next("worker-1", task_id=first.id), "SUCCEEDED")
+        self.assertEqual(mail.outbox, [])
+
+        self.assertEqual(run_next("worker-1"), "SUCCEEDED")
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [user.email])
+        self.assertIn(otp.otp, mail.outbox[0].body)
+
+    def test_claim_runs_once(self):
+
+        task = enqueue(echo_task, value=7)
+
+        claimed = claim("worker-1")
+
+        self.assertEqual(claimed.id, task.id)
+        self.assertEqual((claimed.status, claimed.attempts, claimed.locked_by), ("RUNNING", 1, "worker-1"))
+        self.assertIsNone(claim("worker-2"))
+
+        self.assertEqual(run_task(claimed), "SUCCEEDED")
+
+        task.refresh_from_db()
+        self.assertEqual(task.result, {"value": 7})
+        self.assertEqual(task.locked_by, "")
+
+    def test_failure_retries_with_backoff_then_fails(self):
+
+        task = enqueue(failing_task, max_attempts=2)
+        before = timezone.now()
+
+        self.assertEqual(run_next("worker-1"), "RETRY")
+
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ("QUEUED", 1))
+        self.assertIn("RuntimeError: boom", task.last_error)
+        self.assertGreaterEqual(task.run_after, before + timedelta(seconds=15))
+        self.assertLessEqual(task.run_after, timezone.now() + timedelta(seconds=30))
+
+        # not due yet
+        self.assertIsNone(run_next("worker-1"))
+
+        Task.objects.filter(id=task.id).update(run_after=timezone.now())
+
+        self.assertEqual(run_next("worker-1"), "FAILED")
+
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ("FAILED", 2))
+        self.assertIsNotNone(task.finished_at)
+
+    def test_backoff_doubles_up_to_the_cap(self):
+
+        self.assertTrue(15 <= backoff(1) <= 30)
+        self.assertTrue(30 <= backoff(2) <= 60)
+        self.assertTrue(50 <= backoff(10) <= 100)
+
+    @override_settings(TASK_LOCK_TIMEOUT_SECONDS=60)
+    def test_requeue_stale(self):
+
+        stale_at = timezone.now() - timedelta(minutes=5)
+
+        retry = enqueue(echo_task, value=1)
+        spent = enqueue(echo_task, value=2, max_attempts=1)
+        running = enqueue(echo_task, value=3)
+
+        Task.objects.filter(id__in=[retry.id, spent.id]).update(
+            status="RUNNING", attempts=1, locked_by="dead-worker", locked_at=stale_at
+        )
+        Task.objects.filter(id=running.id).update(
+            status="RUNNING", attempts=1, locked_by="live-worker", locked_at=timezone.now()
+        )
+
+        self.assertEqual(requeue_stale(), 2)
+
+        statuses = dict(Task.objects.values_list("id", "status"))
+
+        self.assertEqual(statuses[retry.id], "QUEUED")
+        self.assertEqual(statuses[spent.id], "FAILED")
+        self.assertEqual(statuses[running.id], "RUNNING")
+
+        # the requeued task runs again, on its second attempt
+        self.assertEqual(run_next("worker-2"), "SUCCEEDED")
+        self.assertEqual(Task.objects.get(id=retry.id).attempts, 2)
+
+
+class AsyncTwinTest(TestCase):
+
+    def setUp(self):
+
+        cache.clear()
+
+        admin = make_user("admin", "ADMIN")
+        make_surveys(make_user("surveyor", "SURVEYOR"), 5)
+
+        token = Token.objects.create(user=admin)
+
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def assertSameBody(self, path, params=None):
+
+        sync = self.client.get(f"/api/{path}", params)
+        async_ = self.client.get(f"/api/async/{path}", params)
+
+        self.assertEqual(sync.status_code, 200)
+        self.assertEqual(async_.status_code, 200)
+        # page links point at the endpoint that served them
+        body = async_.content.decode().replace("/api/async/", "/api/")
+
+        self.assertEqual(json.loads(body), json.loads(sync.content))
+
+    def test_hierarchy_sites(self):
+
+        self.assertSameBody("hierarchy/sites/")
+        self.assertSameBody("hierarchy/sites/", {"page_size": 2})
+        self.assertSameBody("hierarchy/sites/", {"page_size": 10, "fields": "id,station,status"})
+
+    def test_geography(self):
+
+        self.assertSameBody("states/")
+        self.assertSameBody("location/")
+
+    def test_requires_a_token(self):
+
+        self.client.credentials()
+
+        self.assertEqual(self.client.get("/api/async/hierarchy/sites/").status_code, 401)
+
+
+class SentToZonalMigrationTest(TransactionTestCase):
+
+    before = [("survey_app", "0023_subsite_rejected_by_supervisor")]
+    after = [("survey_app", "0024_one_subsite_sent_to_zonal")]
+
+    def migrate(self, targets):
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_duplicates_stop_the_migration(self):
+
+        self.migrate(self.before)
+
+        _, subsites = make_surveys(make_user("surveyor", "SURVEYOR"), 1, subsites_per_survey=3)
+        SurveySubSite.objects.filter(id__in=[s.id for s in subsites[:2]]).update(status="SENT_TO_ZONAL")
+
+        with self.assertRaisesMessage(RuntimeError, str(subsites[1].id)):
+            self.migrate(self.after)
+
+        SurveySubSite.objects.filter(id=subsites[1].id).update(status="DIRECTOR_APPROVED")
+
+        self.migrate(self.after)
+
+
+class SurveySyncTest(TestCase):
+
+    url = "/api/survey/sync/"
+
+    def setUp(self):
+
+        self.surveyor = make_user("surveyor", "SURVEYOR")
+        state, district, subdistrict, town = make_geography()
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.surveyor)
+
+        self.payload = {
+            "id": str(uuid.uuid4()),
+            "state": state.id,
+            "district": district.id,
+            "subdistrict": subdistrict.id,
+            "station": town.id,
+            "subsites": [
+                {
+                    "id": str(uuid.uuid4()),
+                    "location": "Site 1",
+                    "priority": 1,
+                    "location_details": {
+                        "latitude": "30.430000",
+                        "longitude": "77.730000",
+                        "address": "Main road",
+                        "city": "Herbertpur",
+                        "district": "Dehradun",
+                        "state": "Uttarakhand",
+                    },
+                },
+                {"id": str(uuid.uuid4()), "location": "Site 2", "priority": 2},
+            ],
+        }
+
+    def sync(self, payload):
+        return self.client.post(self.url, payload, format="json")
+
+    def test_create_then_resend_is_idempotent(self):
+
+        response = self.sync(self.payload)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["survey"]["status"], "created")
+        self.assertEqual([r["status"] for r in response.data["subsites"]], ["created", "created"])
+        self.assertEqual(response.data["subsites"][0]["sections"]["location_details"]["status"], "created")
+
+        subsite = SurveySubSite.objects.get(id=self.payload["subsites"][0]["id"])
+        self.assertEqual(subsite.survey.surveyor, self.surveyor)
+        self.assertEqual(subsite.completeness, LOCATION)
+
+        self.payload["subsites"][1]["location"] = "Site 2 (moved)"
+        response = self.sync(self.payload)
+
+        self.assertEqual(response.data["survey"]["status"], "updated")
+        self.assertEqual([r["status"] for r in response.data["subsites"]], ["updated", "updated"])
+        self.assertEqual(Survey.objects.count(), 1)
+        self.assertEqual(SurveySubSite.objects.count(), 2)
+        self.assertEqual(SurveyLocation.objects.count(), 1)
+        self.assertTrue(SurveySubSite.objects.filter(location="Site 2 (moved)").exists())
+
+    def test_invalid_items_reported_beside_valid_ones(self):
+
+        self.payload["subsites"] += [
+            {"id": "not-a-uuid", "location": "Site 3", "priority": 3},
+            {"id": str(uuid.uuid4()), "location": "Site 4"},
+            {"id": str(uuid.uuid4()), "location": "Site 1", "priority": 5},
+        ]
+
+        response = self.sync(self.payload)
+
+        results = response.data["subsites"]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["status"] for r in results], ["created", "created", "error", "error", "error"])
+        self.assertIn("id", results[2]["errors"])
+        self.assertIn("priority", results[3]["errors"])
+        self.assertEqual(SurveySubSite.objects.count(), 2)
+
+    def test_survey_of_another_surveyor(self):
+
+        other = make_user("other", "SURVEYOR")
+        state, district, subdistrict, town = (
+            State.objects.get(), District.objects.get(), SubDistrict.objects.get(), Town.objects.get()
+        )
+        Survey.objects.create(
+            id=self.payload["id"], state=state, district=district,
+            subdistrict=subdistrict, station=town, surveyor=other
+        )
+
+        response = self.sync(self.payload)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(SurveySubSite.objects.exists())
+
+
+class NearestStationTest(TestCase):
+
+    url = "/api/stationsdb/nearest/"
+
+    def setUp(self):
+
+        state = Statedb.objects.create(name="Uttarakhand")
+        self.district = Districtdb.objects.create(state=state, name="Dehradun")
+
+        self.dehradun = Stationdb.objects.create(
+            district=self.district, name="Dehradun", code="DDN1", latitude=30.32, longitude=78.03
+        )
+        self.mussoorie = Stationdb.objects.create(
+            district=self.district, name="Mussoorie", code="MSR1", latitude=30.46, longitude=78.07
+        )
+        Stationdb.objects.create(
+            district=self.district, name="Roorkee", code="RRK1", latitude=29.87, longitude=77.89
+        )
+
+        surveyor = make_user("surveyor", "SURVEYOR")
+        _, self.subsites = make_surveys(surveyor, 1)
+
+        # indexes are keyed on the map version; start from a fresh one
+        cache.clear()
+
+        self.client = APIClient()
+        self.client.force_authenticate(surveyor)
+
+    def nearest(self, **params):
+        return self.client.get(self.url, {"lat": 30.43, "lon": 77.73, **params})
+
+    def test_k_bounds(self):
+
+        self.assertEqual(self.nearest(k=0).status_code, 400)
+        self.assertEqual(self.nearest(k=51).status_code, 400)
+        self.assertEqual(self.nearest(k="two").status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"lon": 77.73}).status_code, 400)
+        self.assertEqual(self.nearest(lat=91).status_code, 400)
+
+        response = self.nearest()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([s["id"] for s in response.data["stations"]], [self.dehradun.id])
+
+        response = self.nearest(k=50)
+        distances = [s["distance_km"] for s in response.data["stations"]]
+
+        self.assertEqual(len(distances), 3)
+        self.assertEqual(distances, sorted(distances))
+        self.assertEqual(len(response.data["surveys"]), 2)
+
+    def test_exclude(self):
+
+        first, second = self.subsites
+
+        response = self.nearest(k=1, exclude=str(first.id))
+
+        self.assertEqual([s["id"] for s in response.data["surveys"]], [str(second.id)])
+
+        response = self.nearest(k=2, exclude=str(first.id))
+
+        self.assertEqual([s["id"] for s in response.data["surveys"]], [str(second.id)])
+
+        response = self.nearest(k=2, exclude="not-a-subsite")
+
+        self.assertEqual(len(response.data["surveys"]), 2)
+
+    def test_index_refreshes_after_create_and_update(self):
+
+        self.assertEqual(self.nearest().data["stations"][0]["id"], self.dehradun.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/stationsdb/", {
+                "district": self.district.id,
+                "name": "Herbertpur",
+                "code": "HBP1",
+                "latitude": 30.44,
+                "longitude": 77.74,
+            }, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.nearest().data["stations"][0]["id"], response.data["id"])
+
+        # the CRUD API has no update route; a model save fires the same signal
+        self.mussoorie.latitude, self.mussoorie.longitude = 30.43, 77.73
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mussoorie.save()
+
+        hit = self.nearest().data["stations"][0]
+
+        self.assertEqual(hit["id"], self.mussoorie.id)
+        self.assertEqual(hit["distance_km"], 0)
+
+    def test_serializer_nearest_station(self):
+
+        subsite = SurveySubSite.objects.select_related("surveylocation").get(id=self.subsites[0].id)
+
+        nearest = FullSubSiteSerializer(subsite).data["nearest_station"]
+
+        self.assertEqual(nearest["id"], self.dehradun.id)
+        self.assertEqual(nearest["name"], "Dehradun")
+
+        hint = {subsite.id: {"id": self.mussoorie.id}}
+        data = FullSubSiteSerializer(subsite, context={"nearest_stations": hint}).data
+
+        self.assertEqual(data["nearest_station"], {"id": self.mussoorie.id})
+
+        SurveyLocation.objects.filter(survey=subsite).delete()
+        subsite = SurveySubSite.objects.get(id=subsite.id)
+
+        self.assertIsNone(FullSubSiteSerializer(subsite).data["nearest_station"])
+
+
+class AdminStatisticsTest(TestCase):
+
+    url = "/api/admin/statistics/"
+
+    def setUp(self):
+
+        cache.clear()
+
+        self.admin = make_user("admin", "ADMIN", zone="")
+        self.surveyor = make_user("surveyor", "SURVEYOR")
+        self.director = make_user("director", "DIRECTOR", zone="SOUTH")
+
+        pending = make_user("pending", "SURVEYOR", zone="SOUTH")
+        User.objects.filter(id=pending.id).update(is_approved=False)
+
+        _, self.subsites = make_surveys(self.surveyor, 2, status="SUPERVISOR_APPROVED")
+        SurveySubSite.objects.update(status="SUPERVISOR_APPROVED")
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def stats(self, **headers):
+        return self.client.get(self.url, **headers)
+
+    def test_counts(self):
+
+        response = self.stats()
+
+        self.assertEqual(response.status_code, 200)
+
+        surveys = response.data["surveys"]
+        self.assertEqual(surveys["total"], 2)
+        self.assertEqual(surveys["by_status"]["SUPERVISOR_APPROVED"], 2)
+        self.assertEqual(surveys["by_status"]["GNRB_APPROVED"], 0)
+        self.assertEqual(list(surveys["by_zone"]), ["NORTH"])
+        self.assertEqual(surveys["by_state"]["Uttarakhand"]["total"], 2)
+
+        subsites = response.data["subsites"]
+        self.assertEqual(subsites["total"], 4)
+        self.assertEqual(subsites["by_status"]["SUPERVISOR_APPROVED"], 4)
+        self.assertEqual(subsites["by_zone"]["NORTH"]["total"], 4)
+
+        users = response.data["users"]
+        self.assertEqual((users["total"], users["approved"], users["pending"]), (4, 3, 1))
+        self.assertEqual(users["by_role"]["SURVEYOR"]["total"], 2)
+        self.assertEqual(users["by_zone"]["SOUTH"]["pending"], 1)
+        self.assertEqual(users["by_zone"]["UNASSIGNED"]["total"], 1)
+
+        self.client.force_authenticate(self.surveyor)
+        self.assertEqual(self.stats().status_code, 403)
+
+    def test_cache_invalidated_by_save_and_transition(self):
+
+        first = self.stats()
+
+        # a bare queryset.update() is not seen: the cached counts are served
+        SurveySubSite.objects.filter(id=self.subsites[0].id).update(status="FINAL_APPROVED")
+
+        self.assertEqual(self.stats(HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+
+        subsite = self.subsites[1]
+        subsite.status = "REJECTED_BY_SUPERVISOR"
+
+        with self.captureOnCommitCallbacks(execute=True):
+            subsite.save()
+
+        second = self.stats(HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second["ETag"], first["ETag"])
+        self.assertEqual(second.data["subsites"]["by_status"]["REJECTED_BY_SUPERVISOR"], 1)
+        self.assertEqual(second.data["subsites"]["by_status"]["FINAL_APPROVED"], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            moved, _ = transition_subsites(
+                "DIRECTOR", "APPROVE", [s.id for s in self.subsites[2:]], self.director
+            )
+
+        self.assertEqual(len(moved), 2)
+
+        third = self.stats(HTTP_IF_NONE_MATCH=second["ETag"])
+
+        self.assertEqual(third.status_code, 200)
+        self.assertEqual(third.data["subsites"]["by_status"]["DIRECTOR_APPROVED"], 2)
+        self.assertEqual(third.data["subsites"]["by_status"]["SUPERVISOR_APPROVED"], 0)
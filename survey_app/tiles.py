@@ -0,0 +1,128 @@
+import math
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, FloatField
+from django.db.models.functions import Cast, Floor
+
+from .cache import get_version
+from .models import SurveyLocation, Stationdb
+
+
+MAP_NAMESPACE = "map"
+
+# cells per tile side; an 8x8 grid keeps a tile under 64 clusters per layer
+GRID_SIZE = 8
+
+# from this zoom on, tiles return the individual points
+POINTS_MIN_ZOOM = 13
+
+MAX_ZOOM = 20
+
+TILE_TIMEOUT = 60 * 60 * 24
+
+
+# ------------------------------------------------
+# MAP TILES (server-side clustering)
+# ------------------------------------------------
+# A tile is the usual slippy-map z/x/y square. Points inside it are grouped
+# on a GRID_SIZE x GRID_SIZE grid in the database (Floor of the offset from
+# the tile corner), so only one row per non-empty cell comes back. Tiles are
+# cached under the "map" version, bumped when locations or stations change.
+
+def tile_bounds(z, x, y):
+
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    west = x / n * 360 - 180
+    east = (x + 1) / n * 360 - 180
+
+    return west, lat(y + 1), east, lat(y)
+
+
+def valid_tile(z, x, y):
+
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def _in_tile(queryset, bounds):
+
+    west, south, east, north = bounds
+
+    return queryset.filter(
+        latitude__gte=south,
+        latitude__lt=north,
+        longitude__gte=west,
+        longitude__lt=east
+    )
+
+
+def _clusters(queryset, bounds):
+
+    west, south, east, north = bounds
+
+    cell_w = (east - west) / GRID_SIZE
+    cell_h = (north - south) / GRID_SIZE
+
+    # SurveyLocation stores decimals, Stationdb floats
+    lat = Cast("latitude", FloatField())
+    lon = Cast("longitude", FloatField())
+
+    cells = _in_tile(queryset, bounds).annotate(
+        cx=Floor((lon - west) / cell_w),
+        cy=Floor((lat - south) / cell_h),
+    ).values("cx", "cy").annotate(
+        count=Count("id"),
+        lat=Avg(lat),
+        lon=Avg(lon),
+    ).order_by()
+
+    return [
+        {"lat": c["lat"], "lon": c["lon"], "count": c["count"]}
+        for c in cells
+    ]
+
+
+def build_tile(z, x, y):
+
+    bounds = tile_bounds(z, x, y)
+
+    if z >= POINTS_MIN_ZOOM:
+
+        surveys = [
+            {"id": str(p["survey_id"]), "lat": float(p["latitude"]), "lon": float(p["longitude"]), "count": 1}
+            for p in _in_tile(SurveyLocation.objects, bounds).values("survey_id", "latitude", "longitude")
+        ]
+
+        stations = [
+            {"id": p["id"], "name": p["name"], "lat": p["latitude"], "lon": p["longitude"], "count": 1}
+            for p in _in_tile(Stationdb.objects, bounds).values("id", "name", "latitude", "longitude")
+        ]
+
+    else:
+        surveys = _clusters(SurveyLocation.objects, bounds)
+        stations = _clusters(Stationdb.objects, bounds)
+
+    return {
+        "z": z,
+        "x": x,
+        "y": y,
+        "surveys": surveys,
+        "stations": stations,
+    }
+
+
+def get_tile(z, x, y):
+
+    version = get_version(MAP_NAMESPACE)
+    key = f"map:tile:{version}:{z}:{x}:{y}"
+
+    tile = cache.get(key)
+
+    if tile is None:
+        tile = build_tile(z, x, y)
+        cache.set(key, tile, timeout=TILE_TIMEOUT)
+
+    return version, tile
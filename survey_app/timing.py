@@ -0,0 +1,25 @@
+import time
+from contextlib import contextmanager
+
+
+# ------------------------------------------------
+# PHASE TIMER
+# ------------------------------------------------
+# timer = Timer()
+# with timer("load"): ...
+# timer.phases -> {"load": seconds, ...}
+
+class Timer:
+
+    def __init__(self):
+        self.phases = {}
+
+    @contextmanager
+    def __call__(self, name):
+        start = time.perf_counter()
+        yield
+        self.phases[name] = time.perf_counter() - start
+
+    def report(self, stdout):
+        for phase, seconds in self.phases.items():
+            stdout.write(f"  {phase:<16} {seconds * 1000:10.1f} ms")
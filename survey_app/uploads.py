@@ -0,0 +1,313 @@
+import base64
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .models import RinexFile, RinexUpload, SurveySubSite
+from .serializers import RinexUploadSerializer
+from .storage import cas
+
+
+UPLOAD_DIR = "rinex_files"
+
+READ_SIZE = 1024 * 1024
+
+
+# ------------------------------------------------
+# CHUNKED RINEX UPLOAD (tus-style)
+# ------------------------------------------------
+# 1. init:   POST   {filename, size, sha256[, subsite]}  -> upload id
+# 2. append: PATCH  raw bytes, "Upload-Offset: <offset>" -> new offset
+#            (optional "Upload-Checksum: sha256 <base64>" for the chunk)
+# 3. status: GET / HEAD                                  -> current offset
+# 4. commit: POST .../commit/                            -> RinexFile
+#
+# Bytes go straight into MEDIA_ROOT/rinex_files/<id>.part at the given
+# offset and the row records how far the file is valid. After a dropped
+# connection the client asks for the offset and continues from there; bytes
+# that did arrive before the drop are kept. Commit checks the size and the
+# sha256 given at init, then moves the part file into the content-addressed
+# store (storage.py).
+#
+# An append takes the offset under a short row lock, setting a lease
+# (writing_until), streams the body with no transaction open and then
+# advances the offset with UPDATE ... WHERE offset = <start> AND the lease
+# is still its own. A second append while the lease runs gets 409; a lease
+# left by a request that died runs out after RINEX_CHUNK_LEASE_SECONDS.
+
+class UploadError(Exception):
+
+    def __init__(self, detail, status_code=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+def _part_name(upload_id):
+    return f"{UPLOAD_DIR}/{upload_id}.part"
+
+
+def _locked_upload(user, upload_id):
+
+    upload = RinexUpload.objects.select_for_update().filter(
+        id=upload_id,
+        uploaded_by=user
+    ).first()
+
+    if upload is None:
+        raise UploadError({"error": "Upload not found"}, 404)
+
+    return upload
+
+
+def start_upload(user, data):
+
+    serializer = RinexUploadSerializer(data=data)
+
+    if not serializer.is_valid():
+        raise UploadError(serializer.errors)
+
+    subsite = serializer.validated_data.get("subsite")
+
+    if subsite and not SurveySubSite.objects.filter(
+        id=subsite.id,
+        survey__surveyor=user
+    ).exists():
+        raise UploadError({"error": "You can only upload to your own subsites"}, 403)
+
+    upload = serializer.save(uploaded_by=user, path="")
+    upload.path = _part_name(upload.id)
+    upload.save(update_fields=["path"])
+
+    path = default_storage.path(upload.path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "wb").close()
+
+    return upload
+
+
+def _parse_checksum(header):
+
+    if not header:
+        return None
+
+    algorithm, _, value = header.partition(" ")
+
+    if algorithm.lower() != "sha256":
+        raise UploadError({"error": "Only sha256 chunk checksums are supported"})
+
+    try:
+        return base64.b64decode(value, validate=True)
+    except ValueError:
+        raise UploadError({"error": "Invalid Upload-Checksum header"})
+
+
+def _claim(user, upload_id, offset, length):
+
+    now = timezone.now()
+    lease = now + timedelta(seconds=settings.RINEX_CHUNK_LEASE_SECONDS)
+
+    # short lock: the row is only held while the lease is taken
+    with transaction.atomic():
+
+        upload = _locked_upload(user, upload_id)
+
+        if upload.status != "UPLOADING":
+            raise UploadError({"error": f"Upload is {upload.status.lower()}"}, 409)
+
+        if upload.writing_until and upload.writing_until > now:
+            raise UploadError({"error": "Another chunk is being written", "offset": upload.offset}, 409)
+
+        if offset != upload.offset:
+            raise UploadError({"error": "Offset mismatch", "offset": upload.offset}, 409)
+
+        if offset + length > upload.size:
+            raise UploadError({"error": "Chunk goes past the declared size", "offset": upload.offset})
+
+        claimed = RinexUpload.objects.filter(
+            id=upload.id,
+            status="UPLOADING",
+            offset=offset,
+            writing_until=upload.writing_until
+        ).update(writing_until=lease)
+
+        # only reachable on backends without row locks
+        if not claimed:
+            raise UploadError({"error": "Another chunk is being written", "offset": upload.offset}, 409)
+
+    upload.writing_until = lease
+
+    return upload
+
+
+def _release(upload, offset, received):
+
+    # advances only if the lease is still ours and nobody moved the offset
+    return RinexUpload.objects.filter(
+        id=upload.id,
+        offset=offset,
+        writing_until=upload.writing_until
+    ).update(offset=offset + received, writing_until=None, updated_at=timezone.now())
+
+
+def append_chunk(user, upload_id, offset, length, stream, checksum=None):
+
+    expected = _parse_checksum(checksum)
+
+    if offset is None or length is None:
+        raise UploadError({"error": "Upload-Offset and Content-Length headers are required"})
+
+    if length > settings.RINEX_MAX_CHUNK_BYTES:
+        raise UploadError(
+            {"error": f"Chunks are limited to {settings.RINEX_MAX_CHUNK_BYTES} bytes"},
+            413
+        )
+
+    upload = _claim(user, upload_id, offset, length)
+
+    # the body is read with no transaction open; the lease keeps other
+    # requests off the part file meanwhile
+    digest = hashlib.sha256()
+    received = 0
+    corrupt = False
+
+    try:
+        with open(default_storage.path(upload.path), "r+b") as f:
+
+            # drop anything a broken earlier request left past the offset
+            f.seek(offset)
+            f.truncate()
+
+            while stream is not None and received < length:
+                try:
+                    data = stream.read(min(READ_SIZE, length - received))
+                except OSError:
+                    # client went away; keep what was written
+                    break
+
+                if not data:
+                    break
+
+                f.write(data)
+                digest.update(data)
+                received += len(data)
+
+            if expected is not None and (received != length or digest.digest() != expected):
+                f.seek(offset)
+                f.truncate()
+                corrupt = True
+                received = 0
+
+    except BaseException:
+        _release(upload, offset, 0)
+        raise
+
+    if not _release(upload, offset, received):
+        raise UploadError({"error": "Upload changed while the chunk was written"}, 409)
+
+    if corrupt:
+        raise UploadError({"error": "Chunk checksum mismatch", "offset": offset}, 460)
+
+    upload.offset = offset + received
+    upload.writing_until = None
+
+    return upload
+
+
+def _file_sha256(path):
+
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(READ_SIZE), b""):
+            digest.update(data)
+
+    return digest.hexdigest()
+
+
+def commit_upload(user, upload_id):
+
+    with transaction.atomic():
+
+        upload = _locked_upload(user, upload_id)
+
+        # committing twice returns the same file
+        if upload.status == "COMPLETED":
+            return upload
+
+        if upload.status != "UPLOADING":
+            raise UploadError({"error": f"Upload is {upload.status.lower()}"}, 409)
+
+        if upload.offset != upload.size:
+            raise UploadError(
+                {"error": "Upload is incomplete", "offset": upload.offset, "size": upload.size},
+                409
+            )
+
+        part_path = default_storage.path(upload.path)
+
+        checksum_ok = _file_sha256(part_path) == upload.sha256
+
+        if not checksum_ok:
+            os.remove(part_path)
+            upload.status = "FAILED"
+            upload.save(update_fields=["status", "updated_at"])
+
+        else:
+            _complete(user, upload, part_path)
+
+    if not checksum_ok:
+        raise UploadError({"error": "Checksum mismatch, upload discarded"})
+
+    return upload
+
+
+def _complete(user, upload, part_path):
+
+    name = cas.store_path(
+        part_path,
+        upload.sha256,
+        os.path.splitext(upload.filename)[1],
+        upload.size
+    )
+
+    rinex = RinexFile.objects.create(file=name, digest=upload.sha256, uploaded_by=user)
+
+    upload.status = "COMPLETED"
+    upload.path = name
+    upload.rinex_file = rinex
+    upload.save(update_fields=["status", "path", "rinex_file", "updated_at"])
+
+    subsite = SurveySubSite.objects.filter(id=upload.subsite_id).first() if upload.subsite_id else None
+
+    if subsite:
+        # the subsite holds its own reference to the blob
+        cas.add_reference(name)
+
+        # a save (not .update()) so the signals release the previous file
+        # on commit and link the RINEX metadata (signals.py)
+        subsite.rinex_file = name
+        subsite.save(update_fields=["rinex_file", "updated_at"])
+
+
+def abort_upload(user, upload_id):
+
+    with transaction.atomic():
+
+        upload = _locked_upload(user, upload_id)
+
+        if upload.status == "COMPLETED":
+            raise UploadError({"error": "Upload is already committed"}, 409)
+
+        if upload.writing_until and upload.writing_until > timezone.now():
+            raise UploadError({"error": "A chunk is being written"}, 409)
+
+        if upload.status == "UPLOADING" and default_storage.exists(upload.path):
+            default_storage.delete(upload.path)
+
+        upload.delete()
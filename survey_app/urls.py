@@ -1,6 +1,7 @@
 from django import views
 from django.urls import path
 from .views import *
+from . import async_views
 
 
 
@@ -50,6 +51,9 @@ urlpatterns = [
     path("survey/subsite/<uuid:subsite_id>/photo/<uuid:photo_id>/",SurveyPhotoUploadAPI.as_view(),name="survey-photo-id"),
     # Submit survey (lock)
     path("survey/create_site/<uuid:survey_id>/submit/",SurveySubmitAPI.as_view(),name="survey-submit"),
+    path("survey/create_site/<uuid:survey_id>/readiness/",SurveyReadinessAPI.as_view(),name="survey-readiness"),
+    path("survey/sync/", SurveySyncAPI.as_view(), name="survey-sync"),
+    path("survey/changes/", SurveyChangesAPI.as_view(), name="survey-changes"),
 
     # -------------------------
     # APPROVAL APIs (ALL ROLES)
@@ -78,7 +82,8 @@ urlpatterns = [
     
     
     path("survey/map/", SurveyMapDataAPI.as_view()),
-    path("survey/map/<uuid:location_id>/", SurveyMapDataAPI.as_view()),
+    path("survey/map/<int:location_id>/", SurveyMapDataAPI.as_view()),
+    path("survey/map/tiles/<int:z>/<int:x>/<int:y>/", SurveyMapTileAPI.as_view(), name="survey-map-tiles"),
     path("map/", survey_map_view, name="survey-map"),
     
     
@@ -98,6 +103,13 @@ urlpatterns = [
   
     path("rinex/upload/", RinexUploadAPI.as_view(), name="rinex-upload"),
     path("rinex/upload/<uuid:file_id>/", RinexUploadAPI.as_view(), name="rinex-delete"),
+    path("rinex/uploads/", RinexChunkedUploadAPI.as_view(), name="rinex-chunked-upload"),
+    path("rinex/uploads/<uuid:upload_id>/", RinexChunkedUploadAPI.as_view(), name="rinex-chunked-upload-detail"),
+    path("rinex/uploads/<uuid:upload_id>/commit/", RinexUploadCommitAPI.as_view(), name="rinex-chunked-upload-commit"),
+    path("rinex/metadata/", RinexMetadataAPI.as_view(), name="rinex-metadata"),
+    path("rinex/metadata/<int:metadata_id>/", RinexMetadataAPI.as_view(), name="rinex-metadata-detail"),
+    path("tasks/", TaskStatusAPI.as_view(), name="task-list"),
+    path("tasks/<uuid:task_id>/", TaskStatusAPI.as_view(), name="task-detail"),
     path("hierarchy/sites/", HierarchySurveyAPI.as_view(), name="hierarchy-sites"),
     
     
@@ -109,11 +121,26 @@ urlpatterns = [
     path("districts/<int:district_id>/subdistricts/", SubDistrictByDistrictAPI.as_view()),
     path("subdistricts/<int:subdistrict_id>/towns/", TownBySubDistrictAPI.as_view()),
     path("location/", LocationHierarchyAPI.as_view()),
+
+    # async variants of the dashboard reads (async_views.py, for ASGI)
+    path("async/hierarchy/sites/", async_views.hierarchy_sites, name="async-hierarchy-sites"),
+    path("async/director/subsites/", async_views.director_subsites),
+    path("async/zonal/subsites/", async_views.zonal_subsites),
+    path("async/gnrb/subsites/", async_views.gnrb_subsites),
+    path("async/survey/map/", async_views.map_data),
+    path("async/states/", async_views.states),
+    path("async/states/<int:state_id>/", async_views.states),
+    path("async/states/<int:state_id>/districts/", async_views.districts),
+    path("async/districts/<int:district_id>/subdistricts/", async_views.subdistricts),
+    path("async/subdistricts/<int:subdistrict_id>/towns/", async_views.towns),
+    path("async/location/", async_views.location_tree),
     
     path("statesdb/", StatedbListAPI.as_view(), name="statedb"),
     path("statesdb/<int:state_id>/", StatedbListAPI.as_view(), name="state-detail"),
     path("statesdb/<int:state_id>/districtsdb/", DistrictdbByStateAPI.as_view(), name="districtsdb"),
     path("districtsdb/<int:district_id>/stationdb/", StationdbByDistrictAPI.as_view(), name="stationdb"),
+    path("stationsdb/nearest/", NearestStationAPI.as_view(), name="station-nearest"),
+    path("coverage/gaps/", CoverageGapAPI.as_view(), name="coverage-gaps"),
     
     
     
@@ -142,6 +169,11 @@ urlpatterns = [
     
     path("subsite/<uuid:subsite_id>/zonal-decision/", ZonalDecisionAPI.as_view()),
     path("subsite/<uuid:subsite_id>/gnrb-decision/", GNRBDecisionAPI.as_view()),
+
+    # bulk decisions, one list of subsites per reviewer level
+    path("director/subsites/decisions/", BulkSubsiteDecisionAPI.as_view(stage="DIRECTOR")),
+    path("zonal/subsites/decisions/", BulkSubsiteDecisionAPI.as_view(stage="ZONAL_CHIEF")),
+    path("gnrb/subsites/decisions/", BulkSubsiteDecisionAPI.as_view(stage="GNRB")),
     
     
     path("supervisor/surveys/", SupervisorSurveyListAPI.as_view()),
@@ -162,4 +194,5 @@ urlpatterns = [
     path("admin/user/<uuid:user_id>/assign-director/", AdminAssignDirectorAPI.as_view()),
     path("admin/user/<uuid:user_id>/change-role/", AdminChangeRoleAPI.as_view()),
     path("admin/surveys/", AdminSurveyListAPI.as_view()),
+    path("admin/statistics/", AdminStatisticsAPI.as_view(), name="admin-statistics"),
 ]
@@ -6,16 +6,16 @@ from rest_framework.views import APIView
 from rest_framework.response import Response 
 from rest_framework.permissions import IsAuthenticated 
 from rest_framework import status 
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from .models import *
 from .serializers import *
 from rest_framework.permissions import AllowAny
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 import random
-from django.core.mail import send_mail
+import uuid
 from django.conf import settings
 from .models import PasswordResetOTP
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.authentication import TokenAuthentication, SessionAuthentication
 from django.contrib.auth import authenticate, login, logout    
 from django.http import JsonResponse
 from .models import User
@@ -23,7 +23,57 @@ import json
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.db.models import Prefetch
+from django.db.models import Count, F, Prefetch
+from .pagination import KeysetPaginator
+from .workflow import (
+    ROLE_FLOW,
+    SUBSITE_FLOW,
+    TransitionError,
+    lock_survey,
+    transition_subsite,
+    transition_subsite_moves,
+    transition_subsites,
+    transition_survey,
+)
+from .cache import etag_matches
+from .geography import (
+    districts_lookup,
+    get_snapshot,
+    states_lookup,
+    subdistricts_lookup,
+    towns_lookup,
+    tree_lookup,
+)
+from .sync import apply_survey_sync, changes_since, SyncError
+from .exports import map_locations, map_rows, stream_map_data
+from .tiles import get_tile, valid_tile
+from .spatial import nearest_stations_for, station_index, survey_point_index
+from .readiness import survey_readiness
+from .completeness import (
+    CONNECTIVITY,
+    LOCATION,
+    MONUMENT,
+    POWER,
+    SKY_VISIBILITY,
+    set_photos,
+    set_section,
+)
+from .rinex import metadata_scope
+from .images import wants_originals
+from .listings import (
+    hierarchy_fields,
+    hierarchy_queryset,
+    hierarchy_surveys,
+    subsite_list_surveys,
+    wants_subsites,
+)
+from .stats import get_stats, site_statistics, subsite_statistics, user_statistics
+from .tasks import enqueue, send_otp_mail, task_scope
+from .uploads import abort_upload, append_chunk, commit_upload, start_upload, UploadError
+from django.http import Http404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.core.exceptions import ValidationError
 
 
 
@@ -216,16 +266,10 @@ class ForgotPasswordAPI(APIView):
         PasswordResetOTP.objects.filter(user=user).delete()
 
         # Save new OTP
-        PasswordResetOTP.objects.create(user=user, otp=otp)
-
-        # Send Email
-        send_mail(
-            subject="Your Password Reset OTP",
-            message=f"Hello {user.username},\n\nYour OTP is: {otp}\n\nValid for 10 minutes.",
-            from_email=settings.EMAIL_HOST_USER,
-            recipient_list=[user.email],
-            fail_silently=False,
-        )
+        otp_obj = PasswordResetOTP.objects.create(user=user, otp=otp)
+
+        # Send Email (task worker, tasks.py)
+        enqueue(send_otp_mail, otp_id=otp_obj.id)
 
         return Response({"message": "OTP sent to your email"})
     
@@ -290,13 +334,6 @@ class RoleWiseUsersAPI(APIView):
 def home(request):
     return render(request, "home.html")
 
-ROLE_FLOW = {
-    "SUPERVISOR": ("SUBMITTED", "SUPERVISOR_APPROVED", 1),
-    "DIRECTOR": ("SUPERVISOR_APPROVED", "DIRECTOR_APPROVED", 2),
-    "ZONAL_CHIEF": ("DIRECTOR_APPROVED", "ZONAL_CHIEF_APPROVED", 3),
-    "GNRB": ("ZONAL_CHIEF_APPROVED", "GNRB_APPROVED", 4),
-}
-
 #Create Survey (MULTIPLE SITES)
 class SurveyCreateAPI(APIView):
     permission_classes = [IsAuthenticated]
@@ -362,11 +399,13 @@ class SurveyFullDataAPI(APIView):
             "subsites": []
         }
 
+        image_context = {"originals": wants_originals(request)}
+
         for subsite in survey.subsites.all():
 
             photo_obj = getattr(subsite, "photos", None)
             photo_data = (
-                SurveyPhotoSerializer(photo_obj).data
+                SurveyPhotoSerializer(photo_obj, context=image_context).data
                 if photo_obj else None
             )
 
@@ -386,7 +425,8 @@ class SurveyFullDataAPI(APIView):
                 ).data if hasattr(subsite, "surveymonument") else None,
 
                 "sky_visibility": SurveySkyVisibilitySerializer(
-                    getattr(subsite, "surveyskyvisibility", None)
+                    getattr(subsite, "surveyskyvisibility", None),
+                    context=image_context
                 ).data if hasattr(subsite, "surveyskyvisibility") else None,
 
                 "power": SurveyPowerSerializer(
@@ -420,9 +460,9 @@ class SurveyListByUserAPI(APIView):
             surveyor=request.user
         ).select_related(
             "state", "district", "subdistrict", "station"
-        ).order_by("-created_at")
+        ).prefetch_related("subsites").order_by("-created_at")
 
-        serializer = SurveySerializer(surveys, many=True)
+        serializer = SurveyProgressSerializer(surveys, many=True)
 
         return Response({
             "count": surveys.count(),
@@ -450,9 +490,10 @@ class SurveySubmitAPI(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        subsites = survey.subsites.all()
+        # sections / photos / priorities of every subsite, one query
+        readiness = survey_readiness(survey)
 
-        if not subsites.exists():
+        if not readiness["subsite_count"]:
             return Response(
                 {"error": "No subsites found"},
                 status=status.HTTP_400_BAD_REQUEST
@@ -461,21 +502,11 @@ class SurveySubmitAPI(APIView):
         # ===============================
         # 1️⃣ Duplicate Priority Check
         # ===============================
-        priorities = list(subsites.values_list("priority", flat=True))
-
-        seen = set()
-        duplicates = set()
-
-        for p in priorities:
-            if p in seen:
-                duplicates.add(p)
-            seen.add(p)
-
-        if duplicates:
+        if readiness["duplicate_priorities"]:
             return Response(
                 {
                     "error": "Duplicate priority not allowed",
-                    "duplicate_priorities": list(duplicates)
+                    "duplicate_priorities": readiness["duplicate_priorities"]
                 },
                 status=status.HTTP_400_BAD_REQUEST
             )
@@ -483,52 +514,12 @@ class SurveySubmitAPI(APIView):
         # ===============================
         # 2️⃣ Required Data Validation
         # ===============================
-        incomplete_subsites = []
-
-        for subsite in subsites:
-            missing = []
-
-            if not hasattr(subsite, "surveylocation"):
-                missing.append("Location")
-
-            if not hasattr(subsite, "surveymonument"):
-                missing.append("Monument")
-
-            if not hasattr(subsite, "surveyskyvisibility"):
-                missing.append("Sky Visibility")
-
-            if not hasattr(subsite, "surveypower"):
-                missing.append("Power")
-
-            if not hasattr(subsite, "surveyconnectivity"):
-                missing.append("Connectivity")
-
-            photos = getattr(subsite, "photos", None)
-
-            if not photos:
-                missing.append("Photos")
-            else:
-                if not all([
-                    photos.north_photo,
-                    photos.east_photo,
-                    photos.south_photo,
-                    photos.west_photo
-                ]):
-                    missing.append("All 4 directional photos required")
-
-            if missing:
-                incomplete_subsites.append({
-                    "subsite_id": str(subsite.id),
-                    "subsite_name": subsite.location,
-                    "missing": missing
-                })
-
-        if incomplete_subsites:
+        if readiness["incomplete_subsites"]:
             return Response(
                 {
                     "error": "Survey cannot be submitted",
                     "current_status": survey.status,
-                    "incomplete_subsites": incomplete_subsites
+                    "incomplete_subsites": readiness["incomplete_subsites"]
                 },
                 status=status.HTTP_400_BAD_REQUEST
             )
@@ -536,15 +527,18 @@ class SurveySubmitAPI(APIView):
         # ===============================
         # 3️⃣ Final Submit
         # ===============================
-        survey.status = "SUBMITTED"
-
-        if hasattr(survey, "rejection_reason"):
-            survey.rejection_reason = None
-
-        survey.save(update_fields=["status"])
-
-        # 🔥 IMPORTANT: Update all subsites status
-        subsites.update(status="SUBMITTED")
+        try:
+            transition_survey("SURVEYOR", "SUBMIT", survey, request.user)
+
+            # 🔥 IMPORTANT: Update all subsites status
+            transition_subsites(
+                "SURVEYOR",
+                "SUBMIT",
+                list(survey.subsites.values_list("id", flat=True)),
+                request.user
+            )
+        except TransitionError as e:
+            return Response(e.detail, status=e.status_code)
 
         return Response(
             {
@@ -556,6 +550,21 @@ class SurveySubmitAPI(APIView):
         )
 
 
+class SurveyReadinessAPI(APIView):
+    permission_classes = [IsAuthenticated]
+
+    # what SurveySubmitAPI would reject, without submitting
+    def get(self, request, survey_id):
+
+        survey = get_object_or_404(
+            Survey,
+            id=survey_id,
+            surveyor=request.user
+        )
+
+        return Response(survey_readiness(survey), status=status.HTTP_200_OK)
+
+
 class SurveySubSiteCreateAPI(APIView):
 
     permission_classes = [IsAuthenticated]
@@ -690,6 +699,7 @@ class SurveyLocationAPI(APIView):
     #         return Response({"message": "Location created successfully", "location_id": serializer.data['id']}, status=201)
     #     else:
     #         return Response(serializer.errors, status=400)
+    @transaction.atomic
     def post(self, request, subsite_id=None):
 
         subsite = get_object_or_404(SurveySubSite, id=subsite_id)
@@ -707,6 +717,7 @@ class SurveyLocationAPI(APIView):
         serializer = SurveyLocationSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         serializer.save(survey=subsite)
+        set_section(subsite.id, LOCATION)
 
         return Response(serializer.data, status=201)
 
@@ -722,9 +733,11 @@ class SurveyLocationAPI(APIView):
             return Response(serializer.data)
         else:
             return Response(serializer.errors, status=400)
+    @transaction.atomic
     def delete(self, request, subsite_id=None):
         location = get_object_or_404(SurveyLocation, survey_id=subsite_id)
         location.delete()
+        set_section(subsite_id, LOCATION, False)
         return Response({"message": "Location deleted successfully"}, status=204)
 
 
@@ -732,6 +745,7 @@ class SurveyLocationAPI(APIView):
 class SurveyMonumentAPI(APIView):
     permission_classes = [IsAuthenticated]
 
+    @transaction.atomic
     def post(self, request, subsite_id=None):
 
         subsite = get_object_or_404(SurveySubSite, id=subsite_id)
@@ -749,6 +763,7 @@ class SurveyMonumentAPI(APIView):
         serializer = SurveyMonumentSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         serializer.save(survey=subsite)
+        set_section(subsite.id, MONUMENT)
 
         return Response(
             {
@@ -769,9 +784,11 @@ class SurveyMonumentAPI(APIView):
             return Response(serializer.data)
         else:
             return Response(serializer.errors, status=400)
+    @transaction.atomic
     def delete(self, request, subsite_id=None):
         monument = get_object_or_404(SurveyMonument, survey_id=subsite_id)
         monument.delete()
+        set_section(subsite_id, MONUMENT, False)
         return Response({"message": "Monument deleted successfully"}, status=204)
 
 class SurveySkyVisibilityAPI(APIView):
@@ -779,6 +796,7 @@ class SurveySkyVisibilityAPI(APIView):
     parser_classes = [MultiPartParser, FormParser,JSONParser]
 
     # CREATE
+    @transaction.atomic
     def post(self, request, subsite_id):
         subsite = get_object_or_404(SurveySubSite, id=subsite_id)
 
@@ -791,6 +809,7 @@ class SurveySkyVisibilityAPI(APIView):
         serializer = SurveySkyVisibilitySerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         sky = serializer.save(survey=subsite)
+        set_section(subsite.id, SKY_VISIBILITY)
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -800,7 +819,10 @@ class SurveySkyVisibilityAPI(APIView):
             SurveySkyVisibility,
             survey_id=subsite_id
         )
-        serializer = SurveySkyVisibilitySerializer(sky)
+        serializer = SurveySkyVisibilitySerializer(
+            sky,
+            context={"originals": wants_originals(request)}
+        )
         return Response(serializer.data)
 
     # UPDATE
@@ -821,12 +843,14 @@ class SurveySkyVisibilityAPI(APIView):
         return Response(serializer.data)
 
     # DELETE
+    @transaction.atomic
     def delete(self, request, subsite_id):
         sky = get_object_or_404(
             SurveySkyVisibility,
             survey_id=subsite_id
         )
         sky.delete()
+        set_section(subsite_id, SKY_VISIBILITY, False)
 
         return Response(
             {"message": "Deleted successfully"},
@@ -839,6 +863,7 @@ class SurveyPowerAPI(APIView):
     permission_classes = [IsAuthenticated]
 
     # CREATE
+    @transaction.atomic
     def post(self, request, subsite_id):
 
         subsite = get_object_or_404(SurveySubSite, id=subsite_id)
@@ -855,6 +880,7 @@ class SurveyPowerAPI(APIView):
         serializer = SurveyPowerSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         power = serializer.save(survey=subsite)
+        set_section(subsite.id, POWER)
 
         return Response(
             serializer.data,
@@ -891,6 +917,7 @@ class SurveyPowerAPI(APIView):
         return Response(serializer.data)
 
     # DELETE
+    @transaction.atomic
     def delete(self, request, subsite_id):
 
         power = get_object_or_404(
@@ -899,6 +926,7 @@ class SurveyPowerAPI(APIView):
         )
 
         power.delete()
+        set_section(subsite_id, POWER, False)
 
         return Response(
             {"message": "Power Details deleted successfully"},
@@ -910,6 +938,7 @@ class SurveyConnectivityAPI(APIView):
     permission_classes = [IsAuthenticated]
 
     # CREATE
+    @transaction.atomic
     def post(self, request, subsite_id=None):
         subsite = get_object_or_404(SurveySubSite, id=subsite_id)
 
@@ -925,6 +954,7 @@ class SurveyConnectivityAPI(APIView):
         serializer = SurveyConnectivitySerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         connectivity = serializer.save(survey=subsite)
+        set_section(subsite.id, CONNECTIVITY)
 
         return Response(
             # {
@@ -962,12 +992,14 @@ class SurveyConnectivityAPI(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     # DELETE
+    @transaction.atomic
     def delete(self, request, subsite_id=None):
         connectivity = get_object_or_404(
             SurveyConnectivity,
             survey_id=subsite_id
         )
         connectivity.delete()
+        set_section(subsite_id, CONNECTIVITY, False)
 
         return Response(
            {"message": "Connectivity details deleted successfully"},
@@ -976,6 +1008,7 @@ class SurveyConnectivityAPI(APIView):
 #UPLOAD PHOTOS
 class SurveyPhotoUploadAPI(APIView):
     permission_classes = [IsAuthenticated]
+    @transaction.atomic
     def post(self, request, subsite_id=None):
 
         subsite = get_object_or_404(SurveySubSite, id=subsite_id)
@@ -997,7 +1030,8 @@ class SurveyPhotoUploadAPI(APIView):
 
         serializer = SurveyPhotoSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save(sub_site=subsite)
+        photo = serializer.save(sub_site=subsite)
+        set_photos(subsite.id, photo)
 
         return Response(
             {
@@ -1009,23 +1043,71 @@ class SurveyPhotoUploadAPI(APIView):
     def get(self, request, subsite_id=None):
         subsite = get_object_or_404(SurveySubSite, id=subsite_id)
         photos = SurveyPhoto.objects.filter(sub_site=subsite)
-        serializer = SurveyPhotoSerializer(photos, many=True)
+        serializer = SurveyPhotoSerializer(
+            photos,
+            many=True,
+            context={"originals": wants_originals(request)}
+        )
         return Response(serializer.data)
+    @transaction.atomic
     def delete(self, request, subsite_id=None, photo_id=None):
         photo = get_object_or_404(SurveyPhoto, id=photo_id, sub_site_id=subsite_id)
         photo.delete()
+        set_photos(subsite_id)
         return Response({"message": "Photo deleted successfully"}, status=204)
     
+    @transaction.atomic
     def put(self, request, subsite_id=None, photo_id=None):
         photo = get_object_or_404(SurveyPhoto, id=photo_id, sub_site_id=subsite_id)
         serializer = SurveyPhotoSerializer(photo, data=request.data, partial=True)
         if serializer.is_valid(raise_exception=True):
-            serializer.save()
+            photo = serializer.save()
+            set_photos(subsite_id, photo)
             return Response(serializer.data)
         else:
             return Response(serializer.errors, status=400)
         
 
+# -------------------------
+# OFFLINE BULK SYNC
+# -------------------------
+
+class SurveySyncAPI(APIView):
+
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser]
+
+    def post(self, request):
+
+        try:
+            results = apply_survey_sync(request.user, request.data)
+        except SyncError as e:
+            return Response(e.detail, status=e.status_code)
+
+        return Response(results, status=status.HTTP_200_OK)
+
+
+class SurveyChangesAPI(APIView):
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+
+        data = changes_since(
+            request.user,
+            request.query_params.get("since"),
+            context={"request": request}
+        )
+
+        if data is None:
+            return Response(
+                {"error": "You are not allowed"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        return Response(data, status=status.HTTP_200_OK)
+
+
 class SurveyApprovalAPI(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -1076,18 +1158,17 @@ class SurveyApprovalAPI(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # ✅ Save approval record
-        SurveyApproval.objects.create(
-            survey=survey,
-            approval_level=level,
-            approved_by=user,
-            decision=decision,
-            remarks=remarks
-        )
-
-        # ✅ Update status
-        survey.status = next_status if decision == "APPROVED" else "REJECTED"
-        survey.save(update_fields=["status"])
+        # ✅ Update status + save approval record
+        try:
+            transition_survey(
+                user.role,
+                "APPROVE" if decision == "APPROVED" else "REJECT",
+                survey,
+                user,
+                remarks
+            )
+        except TransitionError as e:
+            return Response(e.detail, status=e.status_code)
 
         return Response(
             {
@@ -1117,10 +1198,16 @@ class SurveySubmitAPI_local(APIView):
         if not subsites.exists():
             return Response({"error": "Add at least one subsite"}, status=400)
 
-        survey.status = "SUBMITTED"
-        survey.save()
-
-        subsites.update(status="SUBMITTED")
+        try:
+            transition_survey("SURVEYOR", "SUBMIT", survey, request.user)
+            transition_subsites(
+                "SURVEYOR",
+                "SUBMIT",
+                list(subsites.values_list("id", flat=True)),
+                request.user
+            )
+        except TransitionError as e:
+            return Response(e.detail, status=e.status_code)
 
         return Response({"message": "Survey submitted successfully"})
 
@@ -1154,31 +1241,11 @@ class SupervisorApprovalAPI(APIView):
 
         subsite = get_object_or_404(SurveySubSite, id=subsite_id, survey=survey)
 
-        # -------- CHANGE DECISION --------
-        if decision == "APPROVE":
-
-            subsite.status = "SUPERVISOR_APPROVED"
-            db_decision = "APPROVED"
-
-        elif decision == "REJECT":
-
-            subsite.status = "REJECTED_BY_SUPERVISOR"
-            db_decision = "REJECTED"
-
-        else:
-            return Response({"error": "Invalid decision"}, status=400)
-
-        subsite.save()
-
-        # save decision history
-        SurveyApproval.objects.create(
-            survey=survey,
-            subsite=subsite,
-            approval_level=1,
-            approved_by=request.user,
-            decision=db_decision,
-            remarks=remarks
-        )
+        # -------- CHANGE DECISION + save decision history --------
+        try:
+            transition_subsite("SUPERVISOR", decision, subsite, request.user, remarks)
+        except TransitionError as e:
+            return Response(e.detail, status=e.status_code)
 
         return Response({
             "message": "Decision updated successfully",
@@ -1283,8 +1350,10 @@ class SupervisorSubmitSurveyAPI(APIView):
             }, status=400)
 
         # -------- SUBMIT SURVEY --------
-        survey.status = "SUPERVISOR_APPROVED"
-        survey.save()
+        try:
+            transition_survey("SUPERVISOR", "SEND_TO_DIRECTOR", survey, request.user)
+        except TransitionError as e:
+            return Response(e.detail, status=e.status_code)
 
         return Response({
             "message": "Survey successfully submitted to Director",
@@ -1305,7 +1374,6 @@ class DirectorSubsiteDecisionAPI(APIView):
             return Response({"error": "Unauthorized"}, status=403)
 
         subsite = get_object_or_404(SurveySubSite, id=subsite_id)
-        survey = subsite.survey
 
         decision = request.data.get("decision")
         remarks = request.data.get("remarks", "")
@@ -1313,27 +1381,10 @@ class DirectorSubsiteDecisionAPI(APIView):
         if subsite.status != "SUPERVISOR_APPROVED":
             return Response({"error": "Invalid state"}, status=400)
 
-        if decision == "APPROVE":
-            subsite.status = "DIRECTOR_APPROVED"
-            db_decision = "APPROVED"
-
-        elif decision == "REJECT":
-            subsite.status = "REJECTED_BY_DIRECTOR"
-            db_decision = "REJECTED"
-
-        else:
-            return Response({"error": "Invalid decision"}, status=400)
-
-        subsite.save()
-
-        SurveyApproval.objects.create(
-            survey=survey,
-            subsite=subsite,
-            approval_level=2,
-            approved_by=request.user,
-            decision=db_decision,
-            remarks=remarks
-        )
+        try:
+            transition_subsite("DIRECTOR", decision, subsite, request.user, remarks)
+        except TransitionError as e:
+            return Response(e.detail, status=e.status_code)
 
         return Response({
             "message": "Director decision saved"
@@ -1351,6 +1402,11 @@ class DirectorSubsiteDecisionAPI(APIView):
 
         subsite = get_object_or_404(SurveySubSite, id=subsite_id)
 
+        # priority swaps within one survey run one at a time; re-read the
+        # subsite once the survey row is locked
+        lock_survey(subsite.survey_id)
+        subsite = SurveySubSite.objects.select_for_update().get(id=subsite.id)
+
         new_priority = request.data.get("priority")
         remarks = request.data.get("remarks")
         noc_file = request.FILES.get("noc")
@@ -1375,8 +1431,8 @@ class DirectorSubsiteDecisionAPI(APIView):
                     status=400
                 )
 
-            existing = SurveySubSite.objects.filter(
-                survey=subsite.survey,
+            existing = SurveySubSite.objects.select_for_update().filter(
+                survey_id=subsite.survey_id,
                 priority=new_priority
             ).exclude(
                 id=subsite.id
@@ -1388,7 +1444,7 @@ class DirectorSubsiteDecisionAPI(APIView):
             if existing:
                 old_priority = subsite.priority
                 existing.priority = old_priority
-                existing.save(update_fields=["priority"])
+                existing.save(update_fields=["priority", "updated_at"])
 
             subsite.priority = new_priority
 
@@ -1434,7 +1490,10 @@ class DirectorSendToZonalAPI(APIView):
             return Response({"error": "Unauthorized"}, status=403)
 
         subsite = get_object_or_404(SurveySubSite, id=subsite_id)
-        survey = subsite.survey
+
+        # sends of one survey run one at a time, each sees the previous one
+        survey = lock_survey(subsite.survey_id)
+        subsite.refresh_from_db(fields=["status"])
 
         if subsite.status != "DIRECTOR_APPROVED":
             return Response({
@@ -1451,8 +1510,15 @@ class DirectorSendToZonalAPI(APIView):
                 "error": "Another subsite from this survey already sent to Zonal"
             }, status=400)
 
-        subsite.status = "SENT_TO_ZONAL"
-        subsite.save()
+        try:
+            transition_subsite("DIRECTOR", "SEND_TO_ZONAL", subsite, request.user)
+        except TransitionError as e:
+            return Response(e.detail, status=e.status_code)
+        except IntegrityError:
+            # one_subsite_sent_to_zonal, for writers that skip the lock
+            return Response({
+                "error": "Another subsite from this survey already sent to Zonal"
+            }, status=400)
 
         return Response({
             "message": "Subsite successfully sent to Zonal Chief"
@@ -1465,7 +1531,6 @@ class ZonalDecisionAPI(APIView):
     def post(self, request, subsite_id):
 
         subsite = get_object_or_404(SurveySubSite, id=subsite_id)
-        survey = subsite.survey
 
         decision = request.data.get("decision")
         remarks = request.data.get("remarks", "")
@@ -1473,27 +1538,10 @@ class ZonalDecisionAPI(APIView):
         if subsite.status != "SENT_TO_ZONAL":
             return Response({"error": "Invalid state"}, status=400)
 
-        if decision == "APPROVE":
-            subsite.status = "SENT_TO_GNRB"
-            db_decision = "APPROVED"
-
-        elif decision == "REJECT":
-            subsite.status = "REJECTED_BY_ZONAL"
-            db_decision = "REJECTED"
-
-        else:
-            return Response({"error": "Invalid decision"}, status=400)
-
-        subsite.save()
-
-        SurveyApproval.objects.create(
-            survey=survey,
-            subsite=subsite,
-            approval_level=3,
-            approved_by=request.user,
-            decision=db_decision,
-            remarks=remarks
-        )
+        try:
+            transition_subsite("ZONAL_CHIEF", decision, subsite, request.user, remarks)
+        except TransitionError as e:
+            return Response(e.detail, status=e.status_code)
 
         return Response({"message": "Zonal decision saved"})
 
@@ -1503,7 +1551,6 @@ class GNRBDecisionAPI(APIView):
     def post(self, request, subsite_id):
 
         subsite = get_object_or_404(SurveySubSite, id=subsite_id)
-        survey = subsite.survey
 
         decision = request.data.get("decision")
         remarks = request.data.get("remarks", "")
@@ -1511,31 +1558,116 @@ class GNRBDecisionAPI(APIView):
         if subsite.status != "SENT_TO_GNRB":
             return Response({"error": "Invalid state"}, status=400)
 
-        if decision == "APPROVE":
-            subsite.status = "FINAL_APPROVED"
-            survey.status = "GNRB_APPROVED"
-            db_decision = "APPROVED"
+        # approving also moves the survey to GNRB_APPROVED
+        try:
+            transition_subsite("GNRB", decision, subsite, request.user, remarks)
+        except TransitionError as e:
+            return Response(e.detail, status=e.status_code)
 
-        elif decision == "REJECT":
-            subsite.status = "REJECTED_BY_GNRB"
-            db_decision = "REJECTED"
+        return Response({"message": "Final decision saved"})
 
-        else:
-            return Response({"error": "Invalid decision"}, status=400)
 
-        subsite.save()
-        survey.save()
+# -------------------------
+# BULK SUBSITE DECISIONS
+# -------------------------
+# One request for many subsites of the reviewer's level:
+# {"decisions": [{"subsite_id", "decision", "remarks"}], "remarks": default}
+# States of all ids are checked with one locked query, then each decision
+# is one UPDATE and the approval rows one INSERT (workflow.py). Ids that
+# cannot move are reported and skipped.
 
-        SurveyApproval.objects.create(
-            survey=survey,
-            subsite=subsite,
-            approval_level=4,
-            approved_by=request.user,
-            decision=db_decision,
-            remarks=remarks
-        )
+class BulkSubsiteDecisionAPI(APIView):
+
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser]
+
+    stage = None
+
+    def post(self, request):
+
+        if request.user.role != self.stage:
+            return Response({"error": "Unauthorized"}, status=403)
+
+        if not isinstance(request.data, dict):
+            return Response({"error": "Body must be a JSON object"}, status=400)
+
+        items = request.data.get("decisions")
+        default_remarks = request.data.get("remarks") or ""
+
+        if not isinstance(items, list) or not items:
+            return Response({"error": "decisions must be a non-empty list"}, status=400)
+
+        if not isinstance(default_remarks, str):
+            return Response({"error": "remarks must be a string"}, status=400)
+
+        if len(items) > settings.BULK_DECISION_MAX_ITEMS:
+            return Response({
+                "error": f"At most {settings.BULK_DECISION_MAX_ITEMS} decisions per request"
+            }, status=400)
+
+        results = []
+        moves = []
+        seen = set()
+
+        for item in items:
+
+            item = item if isinstance(item, dict) else {}
+            result = {"subsite_id": item.get("subsite_id")}
+            results.append(result)
+
+            try:
+                subsite_id = uuid.UUID(str(item.get("subsite_id")))
+            except ValueError:
+                result.update(status="error", error="Invalid subsite_id")
+                continue
+
+            if subsite_id in seen:
+                result.update(status="error", error="Duplicate subsite_id")
+                continue
+
+            seen.add(subsite_id)
+
+            # sending to zonal stays one subsite at a time
+            if item.get("decision") not in ("APPROVE", "REJECT"):
+                result.update(status="error", error="Invalid decision")
+                continue
+
+            remarks = item.get("remarks") or default_remarks
+
+            if not isinstance(remarks, str):
+                result.update(status="error", error="remarks must be a string")
+                continue
+
+            result["id"] = subsite_id
+            moves.append((subsite_id, item.get("decision"), remarks))
+
+        try:
+            moved, errors = transition_subsite_moves(self.stage, moves, request.user)
+        except TransitionError as e:
+            return Response(e.detail, status=e.status_code)
+
+        moved = set(moved)
+        new_status = {
+            subsite_id: SUBSITE_FLOW[self.stage][action][1]
+            for subsite_id, action, _ in moves
+            if subsite_id in moved
+        }
+
+        for result in results:
+
+            subsite_id = result.pop("id", None)
+
+            if subsite_id in moved:
+                result.update(status="ok", new_status=new_status[subsite_id])
+            elif subsite_id is not None:
+                result.update(status="error", error=errors[subsite_id])
+
+        return Response({
+            "updated": len(moved),
+            "failed": len(results) - len(moved),
+            "results": results
+        })
 
-        return Response({"message": "Final decision saved"})
 
 class SupervisorSurveyListAPI(APIView):
     permission_classes = [IsAuthenticated]
@@ -1565,7 +1697,11 @@ class SupervisorSurveyListAPI(APIView):
             "subsites__photos"
         )
 
-        serializer = SupervisorSurveySerializer(surveys, many=True)
+        serializer = SupervisorSurveySerializer(
+            surveys,
+            many=True,
+            context={"originals": wants_originals(request)}
+        )
 
         return Response(serializer.data)
 
@@ -1578,50 +1714,12 @@ class DirectorSubsiteListAPI(APIView):
         if request.user.role != "DIRECTOR":
             return Response({"error": "Unauthorized"}, status=403)
 
-        # surveys that contain relevant subsites
-        surveys = Survey.objects.filter(
-            subsites__status__in=[
-                "SUPERVISOR_APPROVED",
-                "DIRECTOR_APPROVED",
-                "SENT_TO_ZONAL",
-                "SENT_TO_GNRB",
-                "FINAL_APPROVED",
-                "REJECTED_BY_DIRECTOR",
-                "REJECTED_BY_ZONAL",
-                "REJECTED_BY_GNRB"
-            ]
-        ).distinct().select_related(
-            "station",
-            "surveyor"
-        ).prefetch_related(
-
-            Prefetch(
-                "subsites",
-                queryset=SurveySubSite.objects.filter(
-                    status__in=[
-                        "SUPERVISOR_APPROVED",
-                        "DIRECTOR_APPROVED",
-                        "SENT_TO_ZONAL",
-                        "SENT_TO_GNRB",
-                        "FINAL_APPROVED",
-                        "REJECTED_BY_DIRECTOR",
-                        "REJECTED_BY_ZONAL",
-                        "REJECTED_BY_GNRB"
-                    ]
-                ).prefetch_related(
-                    "surveylocation",
-                    "surveymonument",
-                    "surveyskyvisibility",
-                    "surveypower",
-                    "surveyconnectivity",
-                    "photos"
-                )
-            )
-
+        serializer = DirectorSurveySerializer(
+            subsite_list_surveys("DIRECTOR"),
+            many=True,
+            context={"originals": wants_originals(request)}
         )
 
-        serializer = DirectorSurveySerializer(surveys, many=True)
-
         return Response(serializer.data)
 
 class ZonalSubsiteListAPI(APIView):
@@ -1633,38 +1731,12 @@ class ZonalSubsiteListAPI(APIView):
         if request.user.role != "ZONAL_CHIEF":
             return Response({"error": "Unauthorized"}, status=403)
 
-        allowed_status = [
-            "DIRECTOR_APPROVED",
-            "SENT_TO_ZONAL",
-            "REJECTED_BY_ZONAL",
-            "SENT_TO_GNRB",
-            "FINAL_APPROVED",
-            "REJECTED_BY_GNRB",
-        ]
-
-        surveys = (
-            Survey.objects
-            .filter(subsites__status__in=allowed_status)
-            .distinct()
-            .select_related("station", "surveyor")
-            .prefetch_related(
-                Prefetch(
-                    "subsites",
-                    queryset=SurveySubSite.objects
-                        .filter(status__in=allowed_status)
-                        .prefetch_related(
-                            "surveylocation",
-                            "surveymonument",
-                            "surveyskyvisibility",
-                            "surveypower",
-                            "surveyconnectivity",
-                            "photos"
-                        )
-                )
-            )
+        serializer = ZonalSurveySerializer(
+            subsite_list_surveys("ZONAL_CHIEF"),
+            many=True,
+            context={"originals": wants_originals(request)}
         )
 
-        serializer = ZonalSurveySerializer(surveys, many=True)
         return Response(serializer.data)
 
 class GNRBSubsiteListAPI(APIView):
@@ -1676,38 +1748,12 @@ class GNRBSubsiteListAPI(APIView):
         if request.user.role != "GNRB":
             return Response({"error": "Unauthorized"}, status=403)
 
-        allowed_status = [
-            "SENT_TO_GNRB",
-            "FINAL_APPROVED",
-            "REJECTED_BY_GNRB"
-        ]
-
-        surveys = Survey.objects.filter(
-            subsites__status__in=allowed_status
-        ).distinct().select_related(
-            "station",
-            "surveyor"
-        ).prefetch_related(
-
-            Prefetch(
-                "subsites",
-                queryset=SurveySubSite.objects.filter(
-                    status__in=allowed_status
-                ).prefetch_related(
-                    "surveylocation",
-                    "surveymonument",
-                    "surveyskyvisibility",
-                    "surveypower",
-                    "surveyconnectivity",
-                    "photos"
-                )
-
-            )
-
+        serializer = GNRBSurveySerializer(
+            subsite_list_surveys("GNRB"),
+            many=True,
+            context={"originals": wants_originals(request)}
         )
 
-        serializer = GNRBSurveySerializer(surveys, many=True)
-
         return Response(serializer.data)
 
 #__________________________________________________________________     
@@ -1837,42 +1883,55 @@ def logout_view(request):
 def survey_map_view(request):
     return render(request, "map.html")
 
+# Session login for reads only: map.html fetches with the session cookie,
+# while writes stay token-only and so are not subject to CSRF checks.
+class ReadOnlySessionAuthentication(SessionAuthentication):
+
+    def authenticate(self, request):
+
+        if request.method not in ("GET", "HEAD", "OPTIONS"):
+            return None
+
+        return super().authenticate(request)
+
+
 class SurveyMapDataAPI(APIView):
 
+    # also read by map.html (session login)
+    authentication_classes = [TokenAuthentication, ReadOnlySessionAuthentication]
+
+    # ?export=geojson|csv streams the rows; ?bbox=min_lon,min_lat,max_lon,max_lat
+    # &status=SENT_TO_GNRB,FINAL_APPROVED&zone=NORTH filter them
     def get(self, request):
-        data = []
 
-        locations = SurveyLocation.objects.select_related("survey")
+        locations = map_locations(request.query_params)
 
-        for loc in locations:
-            try:
-                photos = loc.survey.photos
-            except SurveyPhoto.DoesNotExist:
-                photos = None
-
-            data.append({
-                "id": str(loc.survey.id),
-                "lat": float(loc.latitude),
-                "lon": float(loc.longitude),
-                "address": loc.address,
-                "city": loc.city,
-                "district": loc.district,
-                "state": loc.state,
-                "photos": {
-                    "north": photos.north_photo.url if photos and photos.north_photo else None,
-                    "east": photos.east_photo.url if photos and photos.east_photo else None,
-                    "south": photos.south_photo.url if photos and photos.south_photo else None,
-                    "west": photos.west_photo.url if photos and photos.west_photo else None,
-                }
-            })
+        export = request.query_params.get("export")
 
-        return Response(data, status=status.HTTP_200_OK)
+        if export in ["geojson", "csv"]:
+            return stream_map_data(locations, export)
+
+        if export:
+            return Response(
+                {"error": "export must be geojson or csv"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(list(map_rows(locations)), status=status.HTTP_200_OK)
     
+    @transaction.atomic
     def post(self, request):
         serializer = SurveyLocationSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        subsite = serializer.validated_data["survey"]
+        # the serializer does not take the subsite; it comes as "survey"
+        try:
+            subsite = SurveySubSite.objects.get(id=request.data.get("survey"))
+        except (SurveySubSite.DoesNotExist, ValidationError, ValueError):
+            return Response(
+                {"error": "survey must be the id of an existing subsite"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
         # ✅ Prevent duplicate
         if hasattr(subsite, "surveylocation"):
@@ -1884,7 +1943,8 @@ class SurveyMapDataAPI(APIView):
                 status=status.HTTP_200_OK
             )
 
-        location = serializer.save()
+        location = serializer.save(survey=subsite)
+        set_section(subsite.id, LOCATION)
 
         return Response(
             {
@@ -1912,15 +1972,46 @@ class SurveyMapDataAPI(APIView):
             status=status.HTTP_200_OK
         )
         
+    @transaction.atomic
     def delete(self, request, location_id):
         location = get_object_or_404(SurveyLocation, id=location_id)
         location.delete()
+        set_section(location.survey_id, LOCATION, False)
 
         return Response(
             {"message": "Location deleted successfully"},
             status=status.HTTP_204_NO_CONTENT
         )
 
+class SurveyMapTileAPI(APIView):
+
+    # map.html is a session-authenticated page
+    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    # clusters per z/x/y tile; ETag is the map version, so unchanged tiles are 304
+    def get(self, request, z, x, y):
+
+        if not valid_tile(z, x, y):
+            return Response(
+                {"error": "Invalid tile"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        version, tile = get_tile(z, x, y)
+        etag = f'"map-{version}-{z}-{x}-{y}"'
+
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(tile)
+
+        response["ETag"] = etag
+        response["Cache-Control"] = "no-cache"
+
+        return response
+
+
 class RinexUploadAPI(APIView):
     permission_classes = [IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser]
@@ -1936,19 +2027,23 @@ class RinexUploadAPI(APIView):
 
         uploaded_file = request.FILES["file"]
 
-        # Duplicate check (same user + same filename)
-        if RinexFile.objects.filter(
+        # Duplicate check (same user + same content), digest hashed during upload
+        digest = getattr(uploaded_file, "sha256", "")
+
+        duplicate = RinexFile.objects.filter(
             uploaded_by=request.user,
-            file__endswith=uploaded_file.name
-        ).exists():
+            digest=digest
+        ).values_list("id", flat=True).first() if digest else None
+
+        if duplicate:
             return Response(
-                {"message": "This file already exists"},
+                {"message": "This file already exists", "rinex_id": duplicate},
                 status=status.HTTP_200_OK
             )
 
         serializer = RinexFileSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        rinex = serializer.save(uploaded_by=request.user)
+        rinex = serializer.save(uploaded_by=request.user, digest=digest)
 
         return Response(
             {
@@ -1999,7 +2094,7 @@ class RinexUploadAPI(APIView):
             partial=True
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        serializer.save(digest=getattr(request.FILES["file"], "sha256", ""))
 
         return Response(
             {
@@ -2029,207 +2124,338 @@ class RinexUploadAPI(APIView):
             status=status.HTTP_204_NO_CONTENT
         )
 
-class HierarchySurveyAPI(APIView):
+def _int_header(request, name):
+
+    try:
+        return int(request.META[name])
+    except (KeyError, ValueError):
+        return None
+
+
+def _upload_response(upload, status_code=status.HTTP_200_OK):
+
+    response = Response(RinexUploadSerializer(upload).data, status=status_code)
+    response["Upload-Offset"] = str(upload.offset)
+    response["Upload-Length"] = str(upload.size)
+    response["Cache-Control"] = "no-store"
+
+    return response
+
+
+# chunked / resumable upload, see uploads.py for the protocol
+class RinexChunkedUploadAPI(APIView):
     permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser]
 
-    def get(self, request):
+    def post(self, request):
 
-        user = request.user
-        role = user.role
-        zone = user.zone
+        try:
+            upload = start_upload(request.user, request.data)
+        except UploadError as e:
+            return Response(e.detail, status=e.status_code)
 
-        if role == "SURVEYOR":
-            surveys = Survey.objects.filter(surveyor=user)
+        response = _upload_response(upload, status.HTTP_201_CREATED)
+        response["Location"] = f"/api/rinex/uploads/{upload.id}/"
+
+        return response
 
-        elif role == "SUPERVISOR":
-            surveys = Survey.objects.filter(
-                surveyor__zone=zone,
-                status="SUBMITTED"
+    def get(self, request, upload_id=None):
+
+        if upload_id is None:
+            uploads = RinexUpload.objects.filter(
+                uploaded_by=request.user,
+                status="UPLOADING"
+            ).order_by("-created_at")
+            return Response(RinexUploadSerializer(uploads, many=True).data)
+
+        upload = get_object_or_404(
+            RinexUpload,
+            id=upload_id,
+            uploaded_by=request.user
+        )
+
+        return _upload_response(upload)
+
+    # body is the raw chunk; request.data is never touched
+    def patch(self, request, upload_id):
+
+        try:
+            upload = append_chunk(
+                request.user,
+                upload_id,
+                offset=_int_header(request, "HTTP_UPLOAD_OFFSET"),
+                length=_int_header(request, "CONTENT_LENGTH"),
+                stream=request.stream,
+                checksum=request.META.get("HTTP_UPLOAD_CHECKSUM")
             )
+        except UploadError as e:
+            return Response(e.detail, status=e.status_code)
+
+        return _upload_response(upload)
+
+    def delete(self, request, upload_id):
+
+        try:
+            abort_upload(request.user, upload_id)
+        except UploadError as e:
+            return Response(e.detail, status=e.status_code)
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class RinexUploadCommitAPI(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, upload_id):
+
+        try:
+            upload = commit_upload(request.user, upload_id)
+        except UploadError as e:
+            return Response(e.detail, status=e.status_code)
+
+        return _upload_response(upload)
+
+
+class RinexMetadataAPI(APIView):
+    permission_classes = [IsAuthenticated]
 
-        elif role == "DIRECTOR":
-            surveys = Survey.objects.filter(
-                surveyor__zone=zone,
-                status="SUPERVISOR_APPROVED"
+    # parsed header / epoch summaries (python manage.py parse_rinex)
+    def get(self, request, metadata_id=None):
+
+        scope = metadata_scope(request.user)
+
+        if scope is None:
+            return Response(
+                {"error": "You are not allowed"},
+                status=status.HTTP_403_FORBIDDEN
             )
 
-        elif role == "ZONAL_CHIEF":
-            surveys = Survey.objects.filter(
-                surveyor__zone=zone,
-                status="DIRECTOR_APPROVED"
+        # the scope joins the linked files / subsites
+        rows = RinexMetadata.objects.filter(scope).distinct()
+
+        if metadata_id:
+            metadata = get_object_or_404(rows, id=metadata_id)
+            return Response(RinexMetadataSerializer(metadata).data)
+
+        params = request.query_params
+
+        try:
+            limit = min(int(params.get("limit", 100)), 1000)
+        except ValueError:
+            return Response(
+                {"error": "limit must be integer"},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-        elif role == "GNRB":
-            surveys = Survey.objects.filter(
-                surveyor__zone=zone,
-                status="ZONAL_CHIEF_APPROVED"
+        if limit < 1:
+            return Response(
+                {"error": "limit must be at least 1"},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-        elif role == "ADMIN":
-            surveys = Survey.objects.all()
+        since = parse_datetime(params["since"]) if params.get("since") else None
+        until = parse_datetime(params["until"]) if params.get("until") else None
 
-        else:
+        if (params.get("since") and not since) or (params.get("until") and not until):
             return Response(
-                {"error": "You are not allowed"},
-                status=status.HTTP_403_FORBIDDEN
+                {"error": "since/until must be ISO datetimes"},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-        surveys = surveys.select_related(
-            "surveyor",
-            "state",
-            "district",
-            "subdistrict",
-            "station"
-        ).prefetch_related(
-            "subsites__surveylocation",
-            "subsites__surveymonument",
-            "subsites__surveyskyvisibility",
-            "subsites__surveypower",
-            "subsites__surveyconnectivity",
-            "subsites__photos",
-        ).order_by("-created_at")
+        if params.get("marker"):
+            rows = rows.filter(marker_name__icontains=params["marker"])
 
-        serializer = FullHierarchySurveySerializer(surveys, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if params.get("status"):
+            rows = rows.filter(status=params["status"].upper())
 
-class StateListAPI(APIView):
-    def get(self, request, state_id=None):
+        try:
+            if params.get("subsite"):
+                rows = rows.filter(subsites=params["subsite"])
 
-        # 🔹 If specific state requested
-        if state_id:
-            state = get_object_or_404(State, id=state_id)
-            return Response({
-                "id": state.id,
-                "name": state.name,
-                # "latitude": state.latitude,
-                # "longitude": state.longitude
-            })
+            if params.get("rinex_file"):
+                rows = rows.filter(rinex_files=params["rinex_file"])
+        except ValidationError:
+            return Response(
+                {"error": "subsite and rinex_file must be UUIDs"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        # 🔹 If no state_id → return all states
-        states = State.objects.all().order_by("name")
+        if params.get("receiver"):
+            rows = rows.filter(receiver_type__icontains=params["receiver"])
 
-        return Response([
-            {
-                "id": s.id,
-                "name": s.name,
-            }
-            for s in states
-        ])
-           
-class DistrictByStateAPI(APIView):
+        if params.get("antenna"):
+            rows = rows.filter(antenna_type__icontains=params["antenna"])
 
-    def get(self, request, state_id):
+        # observation span overlapping [since, until]
+        if since:
+            rows = rows.filter(last_epoch__gte=since)
 
-        # 🔹 Get state
-        state = get_object_or_404(State, id=state_id)
+        if until:
+            rows = rows.filter(first_epoch__lte=until)
 
-        # 🔹 Get districts of that state
-        districts = District.objects.filter(state_id=state_id)
+        rows = rows.order_by(F("first_epoch").desc(nulls_last=True), "id").prefetch_related(
+            "subsites", "rinex_files"
+        )[:limit]
 
-        district_list = [
-            {
-                "district_id": d.id,
-                "district_name": d.name
-            }
-            for d in districts
-        ]
+        return Response(RinexMetadataSerializer(rows, many=True).data)
 
-        return Response({
-            "state_id": state.id,
-            "state_name": state.name,
-            "district_count": districts.count(),
-            "districts": district_list
-        })
 
-class SubDistrictByDistrictAPI(APIView):
+# -------------------------
+# BACKGROUND TASKS (status)
+# -------------------------
+# Own tasks for everyone, all tasks for ADMIN; the list also returns the
+# queue depth per status.
 
-    def get(self, request, district_id):
+class TaskStatusAPI(APIView):
+    permission_classes = [IsAuthenticated]
 
-        # 🔹 Get district
-        district = get_object_or_404(District.objects.select_related("state"), id=district_id)
+    def get(self, request, task_id=None):
 
-        # 🔹 Get subdistricts
-        subs = SubDistrict.objects.filter(district_id=district_id)
+        tasks = task_scope(request.user)
 
-        sub_list = [
-            {
-                "subdistrict_id": s.id,
-                "subdistrict_name": s.name
-            }
-            for s in subs
-        ]
+        if task_id:
+            task = get_object_or_404(tasks, id=task_id)
+            return Response(TaskSerializer(task).data)
+
+        params = request.query_params
+
+        try:
+            limit = min(int(params.get("limit", 100)), 1000)
+        except ValueError:
+            return Response(
+                {"error": "limit must be integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if limit < 1:
+            return Response(
+                {"error": "limit must be at least 1"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        counts = {
+            row["status"]: row["count"]
+            for row in tasks.order_by().values("status").annotate(count=Count("id"))
+        }
+
+        if params.get("status"):
+            tasks = tasks.filter(status=params["status"].upper())
+
+        if params.get("name"):
+            tasks = tasks.filter(name__icontains=params["name"])
+
+        tasks = tasks.order_by("-created_at")[:limit]
 
         return Response({
-            "state_id": district.state.id,
-            "state_name": district.state.name,
-            "district_id": district.id,
-            "district_name": district.name,
-            "subdistrict_count": subs.count(),
-            "subdistricts": sub_list
+            "counts": counts,
+            "results": TaskSerializer(tasks, many=True).data
         })
 
-class TownBySubDistrictAPI(APIView):
 
-    def get(self, request, subdistrict_id):
+class HierarchySurveyAPI(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+
+        surveys = hierarchy_surveys(request.user)
 
-        subdistrict = get_object_or_404(
-            SubDistrict.objects.select_related("district__state"),
-            id=subdistrict_id
+        if surveys is None:
+            return Response(
+                {"error": "You are not allowed"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        # -------- FIELD PROJECTION --------
+        fields, invalid = hierarchy_fields(request.query_params.get("fields"))
+
+        if invalid:
+            return Response(
+                {"error": f"Invalid field(s): {invalid}. Allowed: {FullHierarchySurveySerializer.Meta.fields}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        surveys = hierarchy_queryset(surveys, fields)
+
+        # -------- KEYSET PAGINATION --------
+        paginator = KeysetPaginator(request)
+        page = paginator.paginate(surveys)
+
+        context = {"request": request}
+
+        if wants_subsites(fields):
+            context["nearest_stations"] = nearest_stations_for(
+                subsite for survey in page for subsite in survey.subsites.all()
+            )
+
+        serializer = FullHierarchySurveySerializer(
+            page,
+            many=True,
+            fields=fields,
+            context=context
+        )
+
+        return Response(
+            paginator.get_response_data(serializer.data),
+            status=status.HTTP_200_OK
         )
 
-        towns = Town.objects.filter(subdistrict_id=subdistrict_id)
+# -------------------------
+# GEOGRAPHY LOOKUPS (cached snapshot + ETag)
+# -------------------------
+# All lookups are served from geography.get_snapshot(). The ETag is the
+# snapshot version plus the resource, so a client holding the current
+# version gets 304 without the server building a body.
 
-        town_list = []
+def geography_response(request, resource, build):
 
-        for t in towns:
-            town_list.append({
-                "town_id": t.id,
-                "town_name": t.name,   # ✅ Direct name field
-                "latitude": t.latitude,
-                "longitude": t.longitude
-            })
+    version, snapshot = get_snapshot()
+    etag = f'"geo-{version}-{resource}"'
 
-        return Response({
-            "state_id": subdistrict.district.state.id,
-            "state_name": subdistrict.district.state.name,
+    if etag_matches(request, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(build(snapshot))
 
-            "district_id": subdistrict.district.id,
-            "district_name": subdistrict.district.name,
+    response["ETag"] = etag
+    response["Cache-Control"] = "no-cache"
 
-            "subdistrict_id": subdistrict.id,
-            "subdistrict_name": subdistrict.name,
+    return response
 
-            "town_count": towns.count(),
-            "towns": town_list
-        })
+
+class StateListAPI(APIView):
+    def get(self, request, state_id=None):
+        return geography_response(request, *states_lookup(state_id))
+           
+class DistrictByStateAPI(APIView):
+
+    def get(self, request, state_id):
+        return geography_response(request, *districts_lookup(state_id))
+
+class SubDistrictByDistrictAPI(APIView):
+
+    def get(self, request, district_id):
+        return geography_response(request, *subdistricts_lookup(district_id))
+
+class TownBySubDistrictAPI(APIView):
+
+    def get(self, request, subdistrict_id):
+        return geography_response(request, *towns_lookup(subdistrict_id))
 
 class LocationHierarchyAPI(APIView):
 
     def get(self, request):
 
-        state_id = request.query_params.get("state_id")
-        district_id = request.query_params.get("district_id")
+        return geography_response(request, *tree_lookup(
+            state_id=request.query_params.get("state_id"),
+            district_id=request.query_params.get("district_id")
+        ))
 
-        # 🔹 If district_id provided
-        if district_id:
-            district = District.objects.filter(id=district_id).first()
-            if not district:
-                return Response({"error": "District not found"})
-            serializer = DistrictSerializer(district)
-            return Response(serializer.data)
 
-        # 🔹 If state_id provided
-        if state_id:
-            state = State.objects.filter(id=state_id).first()
-            if not state:
-                return Response({"error": "State not found"})
-            serializer = StateSerializer(state)
-            return Response(serializer.data)
-
-        # 🔹 If nothing provided → return all
-        states = State.objects.all()
-        serializer = StateSerializer(states, many=True)
-        return Response(serializer.data)
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
 
 class StatedbListAPI(APIView):
     def get(self, request, state_id=None):
@@ -2354,6 +2580,128 @@ class StationdbByDistrictAPI(APIView):
             "station": sub_list
         })
 
+class NearestStationAPI(APIView):
+
+    # ?lat=&lon=&k=5 -> k nearest CORS stations and proposed survey sites;
+    # &exclude=<subsite id> leaves the subsite itself out of "surveys"
+    def get(self, request):
+
+        try:
+            lat = float(request.query_params["lat"])
+            lon = float(request.query_params["lon"])
+            k = int(request.query_params.get("k", 1))
+        except (KeyError, ValueError):
+            return Response(
+                {"error": "lat and lon (numbers) are required, k must be integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180) or not 1 <= k <= 50:
+            return Response(
+                {"error": "lat/lon out of range or k not in 1..50"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        exclude = request.query_params.get("exclude")
+
+        surveys = [
+            hit for hit in survey_point_index().nearest(lat, lon, k + (1 if exclude else 0))
+            if hit["id"] != exclude
+        ][:k]
+
+        return Response({
+            "stations": station_index().nearest(lat, lon, k),
+            "surveys": surveys,
+        })
+
+
+class CoverageGapAPI(APIView):
+
+    # towns ranked by distance to the nearest station / approved site
+    # (python manage.py compute_town_coverage fills TownCoverage)
+    def get(self, request):
+
+        params = request.query_params
+
+        try:
+            limit = min(int(params.get("limit", 100)), 1000)
+            min_gap = float(params["min_gap_km"]) if params.get("min_gap_km") else None
+        except ValueError:
+            return Response(
+                {"error": "limit must be integer and min_gap_km a number"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if limit < 1:
+            return Response(
+                {"error": "limit must be at least 1"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        gaps = TownCoverage.objects.all()
+
+        state_id = _int_or_none(params.get("state"))
+        district_id = _int_or_none(params.get("district"))
+
+        if state_id:
+            gaps = gaps.filter(town__subdistrict__district__state_id=state_id)
+
+        if district_id:
+            gaps = gaps.filter(town__subdistrict__district_id=district_id)
+
+        if min_gap is not None:
+            gaps = gaps.filter(gap_km__gte=min_gap)
+
+        # towns with nothing nearby at all (gap_km null) come first
+        rows = gaps.order_by(F("gap_km").desc(nulls_first=True), "town_id").values(
+            "town_id",
+            "town__name",
+            "town__latitude",
+            "town__longitude",
+            "town__subdistrict__name",
+            "town__subdistrict__district_id",
+            "town__subdistrict__district__name",
+            "town__subdistrict__district__state_id",
+            "town__subdistrict__district__state__name",
+            "nearest_station_id",
+            "nearest_station__name",
+            "station_distance_km",
+            "nearest_survey_id",
+            "survey_distance_km",
+            "gap_km",
+            "computed_at",
+        )[:limit]
+
+        results = [
+            {
+                "rank": n,
+                "town_id": r["town_id"],
+                "town": r["town__name"],
+                "latitude": r["town__latitude"],
+                "longitude": r["town__longitude"],
+                "subdistrict": r["town__subdistrict__name"],
+                "district_id": r["town__subdistrict__district_id"],
+                "district": r["town__subdistrict__district__name"],
+                "state_id": r["town__subdistrict__district__state_id"],
+                "state": r["town__subdistrict__district__state__name"],
+                "nearest_station": {
+                    "id": r["nearest_station_id"],
+                    "name": r["nearest_station__name"],
+                    "distance_km": r["station_distance_km"],
+                } if r["nearest_station_id"] else None,
+                "nearest_survey": {
+                    "id": r["nearest_survey_id"],
+                    "distance_km": r["survey_distance_km"],
+                } if r["nearest_survey_id"] else None,
+                "gap_km": r["gap_km"],
+                "computed_at": r["computed_at"],
+            }
+            for n, r in enumerate(rows, start=1)
+        ]
+
+        return Response(results, status=status.HTTP_200_OK)
+
+
 class StationdbCRUDAPI(APIView):
 
     # 🔹 READ (All or Single)
@@ -2418,10 +2766,7 @@ class AdminUserListAPI(APIView):
 
         users = User.objects.select_related("director").all()
 
-        total_users = users.count()
-        approved_users = users.filter(is_approved=True).count()
-        pending_users = users.filter(is_approved=False).count()
-        rejected_users = users.filter(is_active=False).count()
+        _, stats = get_stats()
 
         user_list = []
 
@@ -2450,12 +2795,7 @@ class AdminUserListAPI(APIView):
             })
 
         return Response({
-            "user_statistics": {
-                "total_users": total_users,
-                "approved_users": approved_users,
-                "pending_users": pending_users,
-                "rejected_users": rejected_users
-            },
+            "user_statistics": user_statistics(stats),
             "users": user_list
         })
 # class AdminUserListAPI(APIView):
@@ -2783,44 +3123,49 @@ class AdminSurveyListAPI(APIView):
             "station"
         ).prefetch_related("subsites")
 
-        # -------- SITE (SURVEY) COUNTS --------
-        total_sites = surveys.count()
-        approved_sites = surveys.filter(status="GNRB_APPROVED").count()
-        rejected_sites = surveys.filter(status="REJECTED").count()
+        # -------- SITE / SUBSITE COUNTS (stats.py) --------
+        _, stats = get_stats()
 
-        # -------- SUBSITE COUNTS --------
-        subsites = SurveySubSite.objects.all()
+        serializer = AdminSurveySerializer(
+            surveys,
+            many=True,
+            context={"originals": wants_originals(request)}
+        )
 
-        total_subsites = subsites.count()
+        return Response({
 
-        approved_subsites = subsites.filter(
-            status__in=["FINAL_APPROVED"]
-        ).count()
+            "site_statistics": site_statistics(stats),
 
-        rejected_subsites = subsites.filter(
-            status__in=[
-                "REJECTED_BY_SUPERVISOR",
-                "REJECTED_BY_DIRECTOR",
-                "REJECTED_BY_ZONAL",
-                "REJECTED_BY_GNRB"
-            ]
-        ).count()
+            "subsite_statistics": subsite_statistics(stats),
 
-        serializer = AdminSurveySerializer(surveys, many=True)
+            "sites": serializer.data
+        })
 
-        return Response({
 
-            "site_statistics": {
-                "total_sites": total_sites,
-                "approved_sites": approved_sites,
-                "rejected_sites": rejected_sites
-            },
+# -------------------------
+# ADMIN STATISTICS (stats.py)
+# -------------------------
+# Cached per-status counts for the admin landing page; 304 while the
+# client's copy is current.
 
-            "subsite_statistics": {
-                "total_subsites": total_subsites,
-                "approved_subsites": approved_subsites,
-                "rejected_subsites": rejected_subsites
-            },
+class AdminStatisticsAPI(APIView):
 
-            "sites": serializer.data
-        })
\ No newline at end of file
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+
+        if request.user.role != "ADMIN":
+            return Response({"error": "Unauthorized"}, status=403)
+
+        version, stats = get_stats()
+        etag = f'"stats-{version}-{stats["generated_at"]}"'
+
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(stats)
+
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+
+        return response
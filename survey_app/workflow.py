@@ -0,0 +1,234 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .approvals import record_approvals
+from .models import Survey, SurveyApproval, SurveySubSite
+from .stats import stats_changed
+
+
+# ------------------------------------------------
+# APPROVAL WORKFLOW
+# ------------------------------------------------
+# Every status change of the review flow, as data: per stage (the role
+# that acts) and action, the statuses a row may be in, the status it moves
+# to and the SurveyApproval level / decision recorded for it (None for
+# moves that are not decisions).
+#
+# Rows move with a conditional UPDATE ... WHERE status IN (<from>), any
+# number of rows in one statement, after a locked read that reports which
+# ids are not in a valid state. If the UPDATE still moves fewer rows than
+# the read found (a concurrent request got there first, on backends
+# without row locks) the whole transition is rolled back with 409.
+#
+# Approval rows are inserted with bulk_create (approvals.record_approvals).
+
+# (re)submitting a survey resets every subsite, whatever its status; the
+# supervisor's subsite decisions are not limited by status either (the
+# view refuses them once the survey has gone to the director)
+ANY_SUBSITE_STATUS = [s for s, _ in SurveySubSite.SUBSITE_STATUS_CHOICES]
+
+# the supervisor sends a survey on unless it already was
+NOT_SENT_TO_DIRECTOR = [s for s, _ in Survey.STATUS_CHOICES if s != "SUPERVISOR_APPROVED"]
+
+# stage -> action -> (from statuses, to status, approval level, decision)
+SUBSITE_FLOW = {
+    "SURVEYOR": {
+        "SUBMIT": (ANY_SUBSITE_STATUS, "SUBMITTED", None, None),
+    },
+    "SUPERVISOR": {
+        # the supervisor may change a decision until the survey goes to the director
+        "APPROVE": (ANY_SUBSITE_STATUS, "SUPERVISOR_APPROVED", 1, "APPROVED"),
+        "REJECT": (ANY_SUBSITE_STATUS, "REJECTED_BY_SUPERVISOR", 1, "REJECTED"),
+    },
+    "DIRECTOR": {
+        "APPROVE": (["SUPERVISOR_APPROVED"], "DIRECTOR_APPROVED", 2, "APPROVED"),
+        "REJECT": (["SUPERVISOR_APPROVED"], "REJECTED_BY_DIRECTOR", 2, "REJECTED"),
+        "SEND_TO_ZONAL": (["DIRECTOR_APPROVED"], "SENT_TO_ZONAL", None, None),
+    },
+    "ZONAL_CHIEF": {
+        "APPROVE": (["SENT_TO_ZONAL"], "SENT_TO_GNRB", 3, "APPROVED"),
+        "REJECT": (["SENT_TO_ZONAL"], "REJECTED_BY_ZONAL", 3, "REJECTED"),
+    },
+    "GNRB": {
+        "APPROVE": (["SENT_TO_GNRB"], "FINAL_APPROVED", 4, "APPROVED"),
+        "REJECT": (["SENT_TO_GNRB"], "REJECTED_BY_GNRB", 4, "REJECTED"),
+    },
+}
+
+# subsite status -> status its survey moves to with it
+SURVEY_FOLLOWS = {
+    "FINAL_APPROVED": "GNRB_APPROVED",
+}
+
+SURVEY_FLOW = {
+    "SURVEYOR": {
+        "SUBMIT": (["DRAFT", "REJECTED"], "SUBMITTED", None, None),
+    },
+    "SUPERVISOR": {
+        "APPROVE": (["SUBMITTED"], "SUPERVISOR_APPROVED", 1, "APPROVED"),
+        "REJECT": (["SUBMITTED"], "REJECTED", 1, "REJECTED"),
+        # hand the approved subsites to the director, no decision row
+        "SEND_TO_DIRECTOR": (NOT_SENT_TO_DIRECTOR, "SUPERVISOR_APPROVED", None, None),
+    },
+    "DIRECTOR": {
+        "APPROVE": (["SUPERVISOR_APPROVED"], "DIRECTOR_APPROVED", 2, "APPROVED"),
+        "REJECT": (["SUPERVISOR_APPROVED"], "REJECTED", 2, "REJECTED"),
+    },
+    "ZONAL_CHIEF": {
+        "APPROVE": (["DIRECTOR_APPROVED"], "ZONAL_CHIEF_APPROVED", 3, "APPROVED"),
+        "REJECT": (["DIRECTOR_APPROVED"], "REJECTED", 3, "REJECTED"),
+    },
+    "GNRB": {
+        "APPROVE": (["ZONAL_CHIEF_APPROVED"], "GNRB_APPROVED", 4, "APPROVED"),
+        "REJECT": (["ZONAL_CHIEF_APPROVED"], "REJECTED", 4, "REJECTED"),
+    },
+}
+
+# role -> (required survey status, status after approval, approval level)
+ROLE_FLOW = {
+    role: (actions["APPROVE"][0][0], actions["APPROVE"][1], actions["APPROVE"][2])
+    for role, actions in SURVEY_FLOW.items()
+    if "APPROVE" in actions
+}
+
+
+class TransitionError(Exception):
+
+    def __init__(self, detail, status_code=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+@transaction.atomic
+def _transition(model, flow, stage, moves, user):
+
+    is_subsite = model is SurveySubSite
+    survey_field = "survey_id" if is_subsite else "id"
+
+    # moves: [(id, action, remarks)]; a repeated id keeps its first move
+    first = {}
+    for move in moves:
+        first.setdefault(move[0], move)
+    moves = list(first.values())
+
+    rows = {
+        row["id"]: row
+        for row in model.objects.select_for_update().filter(
+            id__in=[obj_id for obj_id, _, _ in moves]
+        ).values("id", "status", survey_field)
+    }
+
+    errors = {}
+    groups = {}
+
+    for obj_id, action, remarks in moves:
+
+        rule = flow.get(stage, {}).get(action)
+        row = rows.get(obj_id)
+
+        if rule is None:
+            errors[obj_id] = "Invalid decision"
+        elif row is None:
+            errors[obj_id] = "Not found"
+        elif row["status"] not in rule[0]:
+            errors[obj_id] = f"Invalid state. Current status is {row['status']}"
+        else:
+            groups.setdefault(action, []).append((row, remarks))
+
+    moved = []
+    approvals = []
+
+    # one UPDATE per action, whatever the number of rows
+    for action, group in groups.items():
+
+        sources, target, level, decision = flow[stage][action]
+        group_ids = [row["id"] for row, _ in group]
+
+        updated = model.objects.filter(
+            id__in=group_ids,
+            status__in=sources
+        ).update(status=target, updated_at=timezone.now())
+
+        if updated != len(group_ids):
+            raise TransitionError(
+                {"error": "Status was changed by another request, please retry"},
+                status_code=409
+            )
+
+        if is_subsite and target in SURVEY_FOLLOWS:
+            Survey.objects.filter(
+                id__in={row[survey_field] for row, _ in group}
+            ).update(status=SURVEY_FOLLOWS[target], updated_at=timezone.now())
+
+        if level is not None:
+            approvals += [
+                SurveyApproval(
+                    survey_id=row[survey_field],
+                    subsite_id=row["id"] if is_subsite else None,
+                    approval_level=level,
+                    approved_by=user,
+                    decision=decision,
+                    remarks=remarks
+                )
+                for row, remarks in group
+            ]
+
+        moved += group_ids
+
+    record_approvals(approvals)
+
+    # queryset.update() sends no post_save
+    if moved:
+        stats_changed()
+
+    return moved, errors
+
+
+# Moves the subsites that are in a valid state; returns (moved ids, {id: error}).
+def transition_subsites(stage, action, subsite_ids, user, remarks=""):
+    return _transition(
+        SurveySubSite, SUBSITE_FLOW, stage, [(i, action, remarks) for i in subsite_ids], user
+    )
+
+
+# Same, with its own action and remarks per subsite: [(id, action, remarks)].
+def transition_subsite_moves(stage, moves, user):
+    return _transition(SurveySubSite, SUBSITE_FLOW, stage, moves, user)
+
+
+def transition_surveys(stage, action, survey_ids, user, remarks=""):
+    return _transition(
+        Survey, SURVEY_FLOW, stage, [(i, action, remarks) for i in survey_ids], user
+    )
+
+
+# Changes that span several subsites of one survey (priority swaps, the
+# single send to zonal) lock the survey row first, so they run one at a
+# time per survey while other surveys proceed.
+def lock_survey(survey_id):
+    return Survey.objects.select_for_update().get(id=survey_id)
+
+
+def _single(model, flow, stage, action, obj, user, remarks):
+
+    moved, errors = _transition(model, flow, stage, [(obj.id, action, remarks)], user)
+
+    if not moved:
+        raise TransitionError({"error": errors[obj.id]})
+
+    obj.status = flow[stage][action][1]
+
+    if model is SurveySubSite and obj.status in SURVEY_FOLLOWS:
+        obj.survey.status = SURVEY_FOLLOWS[obj.status]
+
+    return obj
+
+
+# single-row forms; raise TransitionError instead of reporting per id
+def transition_subsite(stage, action, subsite, user, remarks=""):
+    return _single(SurveySubSite, SUBSITE_FLOW, stage, action, subsite, user, remarks)
+
+
+def transition_survey(stage, action, survey, user, remarks=""):
+    return _single(Survey, SURVEY_FLOW, stage, action, survey, user, remarks)